@@ -21,6 +21,87 @@ class Settings:
     PORT = int(os.getenv("PORT", 8000))
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     
+    # Capa compartida de descarga HTTP (sitios objetivo)
+    HTTP_HEDGING_ENABLED = os.getenv("HTTP_HEDGING_ENABLED", "False").lower() == "true"
+    HTTP_HEDGE_PERCENTILE = float(os.getenv("HTTP_HEDGE_PERCENTILE", 0.95))
+    HTTP_HEDGE_BUDGET = float(os.getenv("HTTP_HEDGE_BUDGET", 0.05))  # Máx. 5% de requests extra
+    HTTP_HEDGE_MIN_SAMPLES = int(os.getenv("HTTP_HEDGE_MIN_SAMPLES", 20))
+    HTTP_MAX_BODY_BYTES = int(os.getenv("HTTP_MAX_BODY_BYTES", 512 * 1024))  # Tope de descarga por página
+    
+    # Circuit breakers por upstream (facebook.com, sitios objetivo)
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5))
+    CIRCUIT_RECOVERY_SECONDS = float(os.getenv("CIRCUIT_RECOVERY_SECONDS", 60))
+    
+    # Base de firmas (patrones y catálogo de hosts), recargable en caliente
+    SIGNATURES_FILE = os.getenv("SIGNATURES_FILE", os.path.join(os.path.dirname(__file__), "data", "signatures.json"))
+    SIGNATURES_RELOAD_SECONDS = float(os.getenv("SIGNATURES_RELOAD_SECONDS", 5))
+    SIGNATURE_MAX_WIDTH = int(os.getenv("SIGNATURE_MAX_WIDTH", 512))  # Longitud máx. de una coincidencia
+    SIGNATURE_CPU_BUDGET_MS = float(os.getenv("SIGNATURE_CPU_BUDGET_MS", 250))  # CPU máx. de matching por documento
+
+    # Reglas de scoring declarativas (pesos, umbrales, boosts), recargables en caliente
+    SCORING_RULES_FILE = os.getenv("SCORING_RULES_FILE", os.path.join(os.path.dirname(__file__), "data", "scoring_rules.json"))
+    SCORING_RULES_RELOAD_SECONDS = float(os.getenv("SCORING_RULES_RELOAD_SECONDS", 5))
+
+    # Pre-clasificador de la home que decide si lanzar las etapas caras del detector ultra
+    PRECLASSIFIER_MODE = os.getenv("PRECLASSIFIER_MODE", "shadow").lower()  # off | shadow | gate
+    PRECLASSIFIER_MIN_RECALL = float(os.getenv("PRECLASSIFIER_MIN_RECALL", 0.98))  # Al elegir el umbral al entrenar
+
+    # Caché compartida de ads.txt / app-ads.txt (por host, revalidada con ETag)
+    ADS_TXT_CACHE_TTL = float(os.getenv("ADS_TXT_CACHE_TTL", 6 * 3600))
+    ADS_TXT_CACHE_MAX_HOSTS = int(os.getenv("ADS_TXT_CACHE_MAX_HOSTS", 5000))
+    ADS_TXT_MAX_BYTES = int(os.getenv("ADS_TXT_MAX_BYTES", 4 * 1024 * 1024))
+
+    # Crawler de sitemaps (límites por host y caché)
+    SITEMAP_MAX_FILES = int(os.getenv("SITEMAP_MAX_FILES", 20))
+    SITEMAP_MAX_URLS = int(os.getenv("SITEMAP_MAX_URLS", 50000))
+    SITEMAP_MAX_BYTES = int(os.getenv("SITEMAP_MAX_BYTES", 20 * 1024 * 1024))  # Descomprimidos, total por host
+    SITEMAP_CONCURRENCY = int(os.getenv("SITEMAP_CONCURRENCY", 4))
+    SITEMAP_CACHE_TTL = float(os.getenv("SITEMAP_CACHE_TTL", 6 * 3600))
+    SITEMAP_CACHE_MAX_HOSTS = int(os.getenv("SITEMAP_CACHE_MAX_HOSTS", 2000))
+
+    # Sondeo de landing pages comunes (rutas separadas por comas)
+    LANDING_PAGE_PATHS = [
+        path.strip() for path in os.getenv(
+            "LANDING_PAGE_PATHS",
+            "/landing,/lp,/campaign,/promo,/offer,/sale,/deals,/signup,/register,/demo"
+        ).split(",") if path.strip()
+    ]
+    LANDING_PROBE_CONCURRENCY = int(os.getenv("LANDING_PROBE_CONCURRENCY", 5))
+    LANDING_PROBE_TIMEOUT = float(os.getenv("LANDING_PROBE_TIMEOUT", 5))
+
+    # Caché compartida de análisis de scripts de terceros (gtm.js, fbevents.js...)
+    SCRIPT_CACHE_TTL = float(os.getenv("SCRIPT_CACHE_TTL", 3600))
+    SCRIPT_FAILURE_TTL = float(os.getenv("SCRIPT_FAILURE_TTL", 300))  # Scripts que no se pudieron descargar
+    SCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", 5000))
+    SCRIPT_MAX_BYTES = int(os.getenv("SCRIPT_MAX_BYTES", 2 * 1024 * 1024))
+    SCRIPT_MAX_PER_PAGE = int(os.getenv("SCRIPT_MAX_PER_PAGE", 10))
+
+    # Datos persistentes en disco (índices, almacenes)
+    DATA_DIR = os.getenv("DATA_DIR", "data")
+    ID_INDEX_PATH = os.getenv("ID_INDEX_PATH", os.path.join(DATA_DIR, "tracking_ids.sqlite3"))
+    FEATURE_STORE_PATH = os.getenv("FEATURE_STORE_PATH", os.path.join(DATA_DIR, "features.sqlite3"))
+    RESULT_STORE_PATH = os.getenv("RESULT_STORE_PATH", os.path.join(DATA_DIR, "results.sqlite3"))
+    PRECLASSIFIER_MODEL_PATH = os.getenv("PRECLASSIFIER_MODEL_PATH", os.path.join(DATA_DIR, "preclassifier.json"))
+    RESCAN_STATE_PATH = os.getenv("RESCAN_STATE_PATH", os.path.join(DATA_DIR, "rescan_state.sqlite3"))
+
+    # Horas que vale el vínculo píxel -> página de Facebook verificada (después hay que volver a verificarla)
+    ID_INDEX_VERIFIED_TTL_HOURS = float(os.getenv("ID_INDEX_VERIFIED_TTL_HOURS", 24 * 7))
+
+    # Re-escaneo incremental (rescan.py): TTL de la transparencia de Facebook y antigüedad máxima de las features
+    RESCAN_FACEBOOK_TTL_HOURS = float(os.getenv("RESCAN_FACEBOOK_TTL_HOURS", 24))
+    RESCAN_MAX_AGE_DAYS = float(os.getenv("RESCAN_MAX_AGE_DAYS", 30))
+
+    # Watchlist de anunciantes con re-escaneo periódico (worker junto a la API o watchlist.py run)
+    WATCHLIST_PATH = os.getenv("WATCHLIST_PATH", os.path.join(DATA_DIR, "watchlist.sqlite3"))
+    WATCHLIST_ENABLED = os.getenv("WATCHLIST_ENABLED", "False").lower() == "true"  # Arrancar el worker con la API
+    WATCHLIST_DEFAULT_INTERVAL_HOURS = float(os.getenv("WATCHLIST_DEFAULT_INTERVAL_HOURS", 24 * 7))
+    WATCHLIST_JITTER = float(os.getenv("WATCHLIST_JITTER", 0.1))  # ±10% del intervalo
+    WATCHLIST_CONCURRENCY = int(os.getenv("WATCHLIST_CONCURRENCY", 5))
+    WATCHLIST_POLL_SECONDS = float(os.getenv("WATCHLIST_POLL_SECONDS", 60))
+    WATCHLIST_RETRY_SECONDS = float(os.getenv("WATCHLIST_RETRY_SECONDS", 300))  # Primer reintento tras un fallo
+    WATCHLIST_LEASE_SECONDS = float(os.getenv("WATCHLIST_LEASE_SECONDS", 1800))  # Reserva de un dominio mientras se escanea
+    WATCHLIST_DEADLINE_MS = int(os.getenv("WATCHLIST_DEADLINE_MS")) if os.getenv("WATCHLIST_DEADLINE_MS") else None
+    
     # Seguridad
     ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "").split(",") if os.getenv("ALLOWED_HOSTS") else ["*"]
     
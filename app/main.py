@@ -5,8 +5,13 @@ from dotenv import load_dotenv
 import os
 
 from .routers.unified_simple import router as unified_router
+from .routers.results_router import router as results_router
+from .routers.watchlist_router import router as watchlist_router
 from .models import ErrorResponse
 from .config import settings
+from .services.signature_db import get_signature_db
+from .services.scoring_rules import get_scoring_rules
+from .services.watchlist import get_watchlist_scheduler
 
 # Cargar variables de entorno
 load_dotenv()
@@ -32,6 +37,32 @@ app.add_middleware(
 # Incluir router unificado simple
 app.include_router(unified_router)
 
+# Consultas de solo lectura sobre los resultados guardados
+app.include_router(results_router)
+
+# Watchlist de anunciantes con re-escaneo periódico
+app.include_router(watchlist_router)
+
+
+@app.on_event("startup")
+async def compile_rules():
+    """Compila firmas y reglas de scoring al arrancar (un fichero inválido impide arrancar)"""
+    get_signature_db()
+    get_scoring_rules()
+
+
+@app.on_event("startup")
+async def start_watchlist_worker():
+    """Arranca el worker de la watchlist junto a la API (WATCHLIST_ENABLED=true)"""
+    if settings.WATCHLIST_ENABLED:
+        get_watchlist_scheduler().start()
+
+
+@app.on_event("shutdown")
+async def stop_watchlist_worker():
+    if settings.WATCHLIST_ENABLED:
+        await get_watchlist_scheduler().stop()
+
 
 @app.get("/")
 async def root():
@@ -54,6 +85,18 @@ async def root():
                 "descripcion": "APIs oficiales + transparencia Facebook",
                 "incluye": "Datos exactos Google & Meta",
                 "costo": "Pagado"
+            },
+            "resultados": {
+                "url": "GET /api/v1/results",
+                "input": "filtros (days, min_score, priority...), orden y página",
+                "descripcion": "Consulta de los análisis guardados, sin volver a analizar",
+                "costo": "Gratuito"
+            },
+            "watchlist": {
+                "url": "GET|POST /api/v1/watchlist",
+                "input": "dominios e intervalo de re-escaneo (horas)",
+                "descripcion": "Re-escaneo periódico con eventos de cambio (GET /api/v1/watchlist/events)",
+                "costo": "Gratuito"
             }
         },
         "input_examples": {
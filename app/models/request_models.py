@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class DomainRequest(BaseModel):
@@ -8,6 +8,12 @@ class DomainRequest(BaseModel):
     country_code: Optional[str] = "anywhere"
 
 
+class WatchlistRequest(BaseModel):
+    """Dominios a vigilar y su intervalo de re-escaneo"""
+    domains: List[str]
+    interval_hours: Optional[float] = None
+
+
 class ErrorResponse(BaseModel):
     """Modelo para respuestas de error"""
     error: str
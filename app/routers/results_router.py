@@ -0,0 +1,118 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from ..services.result_store import MAX_PAGE_SIZE, SORT_COLUMNS, get_result_store
+from ..services.result_delta import DEFAULT_DELTA_FIELDS, DELTA_FIELDS, run_delta
+from datetime import datetime
+import json
+import time
+
+router = APIRouter(prefix="/api/v1/results", tags=["results"])
+# Endpoints síncronos (def): FastAPI los ejecuta en su threadpool, así que las consultas
+# a SQLite no bloquean el event loop
+
+
+@router.get("")
+def query_results(
+    days: Optional[float] = Query(None, description="Solo dominios analizados en los últimos N días"),
+    since: Optional[datetime] = Query(None, description="Analizados desde (ISO 8601)"),
+    until: Optional[datetime] = Query(None, description="Analizados hasta (ISO 8601)"),
+    min_score: Optional[float] = Query(None, description="Score mínimo"),
+    max_score: Optional[float] = Query(None, description="Score máximo"),
+    priority: Optional[str] = Query(None, description="Prioridad (CRITICAL, HIGH, MEDIUM, LOW)"),
+    has_ads: Optional[bool] = Query(None, description="Solo con / sin anuncios detectados"),
+    pipeline: Optional[str] = Query(None, description="Pipeline: 'basic', 'ultra' o 'unified'"),
+    run_id: Optional[str] = Query(None, description="Solo un run"),
+    all_analyses: bool = Query(False, description="Incluir análisis anteriores (no solo el último por dominio)"),
+    sort_by: str = Query("score", description=f"Orden: {', '.join(SORT_COLUMNS)}"),
+    order: str = Query("desc", description="'asc' o 'desc'"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Resultados por página"),
+    offset: int = Query(0, ge=0, description="Desplazamiento de la página")
+):
+    """
+    📚 RESULTADOS GUARDADOS (solo lectura, sin red)
+
+    Consulta paginada de los análisis ya hechos, filtrados y ordenados en
+    el almacén de resultados. Por ejemplo, el top 500 por ultra_score de
+    los últimos 7 días:
+
+    GET /api/v1/results?days=7&sort_by=ultra_score&limit=500
+    """
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order debe ser 'asc' o 'desc'")
+    if days is not None:
+        since_ts = time.time() - days * 86400
+    else:
+        since_ts = since.timestamp() if since else None
+
+    try:
+        return get_result_store().query(
+            since=since_ts,
+            until=until.timestamp() if until else None,
+            min_score=min_score,
+            max_score=max_score,
+            priority=priority,
+            likely_has_ads=has_ads,
+            pipeline=pipeline,
+            run_id=run_id,
+            latest_only=not all_analyses,
+            sort_by=sort_by,
+            descending=order == "desc",
+            limit=limit,
+            offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/delta")
+def results_delta(
+    run_id: str = Query(..., description="Run actual"),
+    base_run_id: Optional[str] = Query(None, description="Run con el que comparar"),
+    as_of: Optional[datetime] = Query(None, description="Comparar con el estado guardado en esta fecha (ISO 8601)"),
+    fields: str = Query(",".join(DEFAULT_DELTA_FIELDS), description=f"Campos a comparar: {', '.join(DELTA_FIELDS)}"),
+    score_tolerance: float = Query(0.0, ge=0, description="Diferencia mínima de score que cuenta como cambio"),
+    include_removed: Optional[bool] = Query(
+        None, description="Incluir dominios que no están en el run actual (default: solo con base_run_id)"
+    )
+):
+    """
+    🔀 DELTA ENTRE RUNS (JSON Lines, en streaming)
+
+    Solo los dominios añadidos, eliminados o cambiados respecto a otro run
+    (`base_run_id`), al estado guardado en `as_of` o, por defecto, a lo que
+    se sabía antes de empezar el run (mismo pipeline). Una línea por cambio
+    con los valores antes y después.
+    """
+    if base_run_id and as_of:
+        raise HTTPException(status_code=400, detail="Use base_run_id o as_of, no ambos")
+    try:
+        changes = run_delta(
+            get_result_store(), run_id, base_run_id=base_run_id,
+            as_of=as_of.timestamp() if as_of else None,
+            fields=[name.strip() for name in fields.split(",") if name.strip()],
+            score_tolerance=score_tolerance, include_removed=include_removed
+        )
+        first = next(changes, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    def lines():
+        if first is not None:
+            yield json.dumps(first, ensure_ascii=False) + "\n"
+        for change in changes:
+            yield json.dumps(change, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/{domain}")
+def domain_history(
+    domain: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE, description="Análisis a devolver")
+):
+    """Análisis guardados de un dominio, del más reciente al más antiguo"""
+    history = get_result_store().history(domain, limit)
+    if not history:
+        raise HTTPException(status_code=404, detail=f"Dominio sin análisis guardados: {domain}")
+    return {"domain": history[0]["domain"], "analyses": history}
@@ -1,7 +1,10 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Optional
 from ..services.ultra_detector import UltraAdvancedDetector
+from ..services import batch_scoring
+from ..services.result_store import get_result_store
 from datetime import datetime
+import asyncio
 
 router = APIRouter(prefix="/api/v1/ultra", tags=["ultra-advanced-detection"])
 
@@ -57,7 +60,8 @@ async def analyze_domain_ultra_advanced(
 async def batch_analyze_ultra_advanced(
     domains: List[str],
     max_concurrent: Optional[int] = Query(3, description="Máximo procesos concurrentes"),
-    top_n: Optional[int] = Query(None, description="Retornar solo los top N dominios")
+    top_n: Optional[int] = Query(None, description="Retornar solo los top N dominios"),
+    include_details: Optional[bool] = Query(False, description="Incluir análisis detallado completo")
 ):
     """
     🔥 ANÁLISIS ULTRA-AVANZADO EN LOTE para múltiples dominios
@@ -86,7 +90,12 @@ async def batch_analyze_ultra_advanced(
         # Limitar concurrencia para no sobrecargar
         max_concurrent = min(max_concurrent, 5)
         
-        results = await ultra_detector.batch_analyze_ultra(domains, max_concurrent)
+        results = await ultra_detector.batch_analyze_ultra(
+            domains, max_concurrent, as_records=True, include_details=include_details
+        )
+        
+        # Todos los análisis al almacén consultable (/api/v1/results)
+        await asyncio.to_thread(get_result_store().record_domains, f"api-{datetime.now():%Y%m%d}", results)
         
         # Retornar solo top N si se especifica
         if top_n:
@@ -96,14 +105,8 @@ async def batch_analyze_ultra_advanced(
             'total_analyzed': len(results),
             'analysis_timestamp': datetime.now().isoformat(),
             'analysis_type': 'ultra_advanced_batch',
-            'results': results,
-            'summary': {
-                'critical_priority': len([r for r in results if r.get('final_assessment', {}).get('priority') == 'CRITICAL']),
-                'high_priority': len([r for r in results if r.get('final_assessment', {}).get('priority') == 'HIGH']),
-                'medium_priority': len([r for r in results if r.get('final_assessment', {}).get('priority') == 'MEDIUM']),
-                'low_priority': len([r for r in results if r.get('final_assessment', {}).get('priority') == 'LOW']),
-                'average_score': sum(r.get('final_assessment', {}).get('ultra_score', 0) for r in results) / len(results) if results else 0
-            }
+            'results': [r.to_dict() for r in results],
+            'summary': batch_scoring.ultra_priority_summary([r.assessment() for r in results])
         }
         
     except HTTPException:
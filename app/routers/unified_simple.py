@@ -3,6 +3,17 @@ from typing import List, Optional, Union
 from ..services.ultra_detector import UltraAdvancedDetector
 from ..services.facebook_transparency_advanced import FacebookTransparencyAdvanced
 from ..services.ads_aggregator_service import AdsAggregatorService
+from ..services.deadline import Deadline
+from ..services.http_fetcher import http_fetcher
+from ..services.circuit_breaker import breakers_snapshot
+from ..services.signature_db import get_signature_db
+from ..services.ads_txt import ads_txt_cache
+from ..services.script_analyzer import script_analyzer
+from ..services.id_index import VERIFIED_MIN_CONFIDENCE, get_id_index
+from ..services.feature_store import extract_features, get_feature_store
+from ..services.result_store import get_result_store
+from ..services import scoring
+from ..services.scoring_rules import get_scoring_rules
 from datetime import datetime
 import asyncio
 import re
@@ -33,11 +44,15 @@ def extract_domain_from_facebook_url(facebook_url: str) -> str:
 @router.post("/without-apis")
 async def analyze_without_apis(
     input_data: Union[str, dict],
-    include_details: Optional[bool] = Query(False, description="Incluir análisis detallado completo")
+    include_details: Optional[bool] = Query(False, description="Incluir análisis detallado completo"),
+    deadline_ms: Optional[int] = Query(None, ge=1, description="Presupuesto total de tiempo en ms (respuesta parcial si se agota)")
 ):
     """
     🚀 ANÁLISIS COMPLETO SIN APIs PAGADAS
     
+    Con `deadline_ms` la respuesta llega en tiempo acotado: las etapas que no
+    terminan a tiempo se cancelan y se listan en `signals.timed_out`.
+    
     Input puede ser:
     - Solo dominio: "nike.com" (busca Facebook automáticamente)
     - Solo Facebook: "https://facebook.com/nike" (extrae dominio automáticamente)
@@ -91,19 +106,44 @@ async def analyze_without_apis(
             page_name = extract_domain_from_facebook_url(facebook_url)
             domain = f"{page_name}.com" if page_name else None
         
-        # Ejecutar análisis ultra-avanzado
-        ultra_result = None
-        if domain:
-            ultra_result = await ultra_detector.analyze_domain_ultra(domain)
+        deadline = Deadline(deadline_ms)
+        
+        async def run_ultra():
+            if domain:
+                return await ultra_detector.analyze_domain_ultra(domain, deadline)
+            return None
         
         # SIEMPRE ejecutar transparencia de Facebook
-        fb_result = None
-        if facebook_url:
-            # Si tenemos URL específica, usarla directamente
-            fb_result = await fb_transparency._check_page_transparency(facebook_url, domain)
-        elif domain:
-            # Búsqueda automática solo si tenemos dominio
-            fb_result = await fb_transparency.search_page_transparency(domain)
+        async def run_fb_transparency():
+            if facebook_url:
+                # Si tenemos URL específica, usarla directamente
+                return await fb_transparency._check_page_transparency(facebook_url, domain)
+            elif domain:
+                # Píxel ya ligado a una página verificada: se revisa esa página sin buscar
+                ids = await asyncio.to_thread(get_id_index().ids_for, domain)
+                verified = await asyncio.to_thread(get_id_index().verified_page_for, ids)
+                if verified:
+                    fb_check = await fb_transparency._check_page_transparency(verified['page_url'], domain)
+                    if fb_check:
+                        fb_check['verified_page'] = verified
+                        return fb_check
+                # Búsqueda automática solo si tenemos dominio
+                return await fb_transparency.search_page_transparency(domain)
+            return None
+        
+        # Ejecutar análisis ultra-avanzado y transparencia de Facebook en paralelo
+        ultra_result, fb_result = await asyncio.gather(
+            run_ultra(),
+            deadline.run('facebook_transparency', run_fb_transparency())
+        )
+        
+        # Página de Facebook encontrada con anuncios: ligar los píxeles del sitio a ella
+        if (domain and fb_result and fb_result.get('page_found') and fb_result.get('has_ads_in_circulation')
+                and fb_result.get('page_url') and fb_result.get('confidence', 0) >= VERIFIED_MIN_CONFIDENCE):
+            await asyncio.to_thread(get_id_index().mark_verified, domain, fb_result['page_url'], fb_result['confidence'])
+        
+        # Reglas de scoring con las que se combina este resultado
+        rules = get_scoring_rules()
         
         # Estructura JSON unificada y simplificada
         result = {
@@ -123,7 +163,8 @@ async def analyze_without_apis(
                 "page_found": fb_result.get('page_found', False) if fb_result else False,
                 "ads_in_circulation": fb_result.get('has_ads_in_circulation', False) if fb_result else False,
                 "confidence": fb_result.get('confidence', 0) if fb_result else 0,
-                "evidence": fb_result.get('evidence', []) if fb_result else []
+                "evidence": fb_result.get('evidence', []) if fb_result else [],
+                "skipped": fb_result.get('skipped') if fb_result else None
             },
             "website_analysis": {
                 "tracking_detected": False,
@@ -136,7 +177,10 @@ async def analyze_without_apis(
                 "google_transparency": False
             },
             "recommendation": "",
-            "next_steps": []
+            "next_steps": [],
+            "signals": {},
+            "signatures_version": get_signature_db().version,
+            "rules_version": rules.version
         }
         
         # Procesar resultados del análisis ultra
@@ -152,6 +196,7 @@ async def analyze_without_apis(
             facebook_ads = False
             google_ads = False
             tracking_detected = False
+            tracking_score = 0
             
             if basic_detection:
                 detailed = basic_detection.get('detailed_analysis', {})
@@ -167,22 +212,11 @@ async def analyze_without_apis(
                 # Website tracking
                 website_tracking = detailed.get('website_tracking', {})
                 tracking_score = website_tracking.get('probability_score', 0)
-                tracking_detected = tracking_score > 20
+                tracking_detected = tracking_score > rules.tracking_detected_threshold
             
-            # LÓGICA INTELIGENTE: Has ads si CUALQUIERA de estas condiciones:
-            # 1. Facebook Ad Library detectó ads (FUERTE)
-            # 2. Google Transparency detectó ads (FUERTE)  
-            # 3. Score ultra >= 15% (MODERADO)
-            # 4. Tracking muy fuerte (>60%) (MODERADO)
+            # LÓGICA INTELIGENTE (smart_OR): Facebook/Google detectaron ads, score ultra o tracking muy fuerte
             ultra_has_ads = final_assessment.get('likely_has_ads', False)
-            strong_tracking = tracking_score > 60 if basic_detection else False
-            
-            final_has_ads = (
-                facebook_ads or           # Facebook API detectó ads
-                google_ads or            # Google detectó ads  
-                ultra_has_ads or         # Score ultra alto
-                strong_tracking          # Tracking muy fuerte
-            )
+            final_has_ads = scoring.smart_or(facebook_ads, google_ads, ultra_has_ads, tracking_score, rules)
             
             # Crear lista de fuentes que detectaron ads
             sources_detected = []
@@ -217,7 +251,7 @@ async def analyze_without_apis(
                 
                 # Website tracking
                 website_tracking = detailed.get('website_tracking', {})
-                result["website_analysis"]["tracking_detected"] = website_tracking.get('probability_score', 0) > 20  # Reducido de 30
+                result["website_analysis"]["tracking_detected"] = website_tracking.get('probability_score', 0) > rules.tracking_detected_threshold  # Reducido de 30
                 
                 # Facebook Ad Library
                 fb_library = detailed.get('facebook_ad_library', {})
@@ -245,11 +279,8 @@ async def analyze_without_apis(
         
         # Boost si Facebook transparency detectó algo
         if result["facebook_transparency"]["ads_in_circulation"]:
-            result["detection_summary"]["overall_score"] = min(100, result["detection_summary"]["overall_score"] + 20)
+            result["detection_summary"] = scoring.facebook_transparency_boost(result["detection_summary"], True, rules)
             result["detection_summary"]["sources_detected"].append("facebook_transparency")
-            if result["detection_summary"]["overall_score"] >= 50:
-                result["detection_summary"]["has_ads_detected"] = True
-                result["detection_summary"]["confidence_level"] = "high"
         
         # Agregar fuentes detectadas
         if result["website_analysis"]["tracking_detected"]:
@@ -265,6 +296,43 @@ async def analyze_without_apis(
         if result["website_analysis"]["third_party_ads"]:
             result["detection_summary"]["sources_detected"].append("third_party_ads")
         
+        # Señales calculadas vs. las que no llegaron a tiempo
+        result["signals"] = deadline.report()
+        
+        def persist():
+            # Features crudas al feature store (run diario de la API) para poder re-puntuar sin red
+            if ultra_result and 'ultra_analysis' in ultra_result:
+                ultra_analysis = ultra_result['ultra_analysis']
+                store = get_feature_store()
+                store.record(
+                    store.start_run('api', f"api-{datetime.now():%Y%m%d}"),
+                    domain,
+                    extract_features(
+                        'unified', ultra_analysis.get('basic_detection'), ultra_analysis.get('advanced_detection'),
+                        fb_result or {}, result["signals"],
+                        ultra_result.get('analysis_metadata', {}).get('preclassifier')
+                    )
+                )
+            
+            # Resultado al almacén consultable (/api/v1/results), sin el detalle completo
+            summary = result["detection_summary"]
+            final_assessment = (ultra_result or {}).get('final_assessment', {})
+            get_result_store().record(
+                f"api-{datetime.now():%Y%m%d}", domain, 'unified',
+                score=summary["overall_score"],
+                likely_has_ads=summary["has_ads_detected"],
+                summary=result,
+                ultra_score=final_assessment.get('ultra_score'),
+                basic_score=final_assessment.get('basic_score'),
+                priority=summary["priority"],
+                confidence_level=summary["confidence_level"],
+                rules_version=rules.version
+            )
+        
+        # Las escrituras en SQLite (commits síncronos) fuera del event loop
+        if domain:
+            await asyncio.to_thread(persist)
+        
         # Incluir detalles completos solo si se solicita
         if include_details:
             result["detailed_analysis"] = ultra_result
@@ -450,6 +518,18 @@ async def analyze_with_apis(
             detail=f"Error en análisis con APIs: {str(e)}"
         )
 
+@router.get("/tracking-ids/{id_value}")
+def lookup_tracking_id(id_value: str):
+    """
+    Dominios en los que se ha visto un ID de píxel / conversión / contenedor
+    (p. ej. "AW-123456789", "GTM-ABC123" o el ID numérico de un píxel de Meta)
+    y la página de Facebook verificada a la que está ligado, si la hay.
+    """
+    matches = get_id_index().lookup(id_value.strip())
+    if not matches:
+        raise HTTPException(status_code=404, detail=f"ID no encontrado: {id_value}")
+    return {"id_value": id_value, "matches": matches}
+
 @router.get("/health")
 async def health_check():
     """Estado del sistema unificado"""
@@ -471,5 +551,11 @@ async def health_check():
             "domain_string",
             "facebook_url",
             "json_object"
-        ]
+        ],
+        "http_fetcher": http_fetcher.stats(),
+        "circuit_breakers": breakers_snapshot(),
+        "ads_txt_cache": ads_txt_cache.stats(),
+        "script_cache": script_analyzer.stats(),
+        "signatures_version": get_signature_db().version,
+        "rules_version": get_scoring_rules().version
     }
\ No newline at end of file
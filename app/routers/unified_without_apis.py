@@ -3,6 +3,7 @@ from typing import List, Optional
 from ..services.ultra_detector import UltraAdvancedDetector
 from ..services.facebook_transparency_advanced import FacebookTransparencyAdvanced
 from ..models import BatchAnalysisRequest
+from ..services.result_store import get_result_store
 from datetime import datetime
 import asyncio
 
@@ -117,7 +118,8 @@ async def batch_analyze_without_apis(
     method: Optional[str] = Query("ultra", description="Método: 'ultra', 'basic'"),
     max_concurrent: Optional[int] = Query(3, description="Procesos concurrentes"),
     top_n: Optional[int] = Query(None, description="Top N resultados"),
-    min_score: Optional[float] = Query(None, description="Score mínimo para incluir")
+    min_score: Optional[float] = Query(None, description="Score mínimo para incluir"),
+    include_details: Optional[bool] = Query(False, description="Incluir análisis detallado completo")
 ):
     """
     🔥 ANÁLISIS MASIVO SIN APIs PAGADAS
@@ -138,30 +140,34 @@ async def batch_analyze_without_apis(
                 detail="Máximo 100 dominios por solicitud"
             )
         
+        # Registros compactos: el detalle completo solo se guarda si se pide
         if method == "ultra":
-            results = await ultra_detector.batch_analyze_ultra(domains, max_concurrent)
+            results = await ultra_detector.batch_analyze_ultra(
+                domains, max_concurrent, as_records=True, include_details=include_details
+            )
         elif method == "basic":
-            results = await ultra_detector.basic_detector.batch_analyze_domains(domains, max_concurrent)
+            results = await ultra_detector.basic_detector.batch_analyze_domains(
+                domains, max_concurrent, as_records=True, include_details=include_details
+            )
         else:
             raise HTTPException(status_code=400, detail="Método no válido")
         
+        # Todos los análisis al almacén consultable (/api/v1/results), antes de filtrar
+        await asyncio.to_thread(get_result_store().record_domains, f"api-{datetime.now():%Y%m%d}", results)
+        
         # Filtrar por score mínimo si se especifica
         if min_score is not None:
-            if method == "ultra":
-                results = [r for r in results if r.get('final_assessment', {}).get('ultra_score', 0) >= min_score]
-            else:
-                results = [r for r in results if r.get('probability_score', 0) >= min_score]
+            results = [r for r in results if r.score >= min_score]
         
         # Limitar a top N si se especifica
         if top_n:
             results = results[:top_n]
         
         # Generar estadísticas
+        scores = [r.score for r in results]
         if method == "ultra":
-            scores = [r.get('final_assessment', {}).get('ultra_score', 0) for r in results]
-            priorities = [r.get('final_assessment', {}).get('priority', 'UNKNOWN') for r in results]
+            priorities = [r.priority for r in results]
         else:
-            scores = [r.get('probability_score', 0) for r in results]
             priorities = ['HIGH' if s >= 70 else 'MEDIUM' if s >= 30 else 'LOW' for s in scores]
         
         summary = {
@@ -181,7 +187,7 @@ async def batch_analyze_without_apis(
         return {
             'analysis_timestamp': datetime.now().isoformat(),
             'summary': summary,
-            'results': results
+            'results': [r.to_dict() for r in results]
         }
         
     except HTTPException:
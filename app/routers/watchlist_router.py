@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Optional
+from ..models import WatchlistRequest
+from ..services.watchlist import WATCHED_FIELDS, get_watchlist, get_watchlist_scheduler
+from ..config import settings
+import time
+
+router = APIRouter(prefix="/api/v1/watchlist", tags=["watchlist"])
+# Endpoints síncronos (def): FastAPI los ejecuta en su threadpool, así que las consultas
+# a SQLite no bloquean el event loop
+
+
+@router.get("")
+def list_watchlist(
+    limit: int = Query(100, ge=1, le=1000, description="Dominios por página"),
+    offset: int = Query(0, ge=0, description="Desplazamiento de la página")
+):
+    """Dominios vigilados (por orden del próximo escaneo) y estado del worker"""
+    return {
+        "scheduler": get_watchlist_scheduler().stats(),
+        "domains": get_watchlist().entries(limit, offset)
+    }
+
+
+@router.post("")
+def add_to_watchlist(request: WatchlistRequest):
+    """
+    👀 AÑADIR DOMINIOS A LA WATCHLIST
+
+    Se re-escanean cada `interval_hours` (± jitter) con el re-escaneo
+    incremental; el primer escaneo se reparte dentro del primer intervalo.
+    Si un dominio ya está, solo se cambia su intervalo.
+    """
+    interval_hours = request.interval_hours or settings.WATCHLIST_DEFAULT_INTERVAL_HOURS
+    if interval_hours <= 0:
+        raise HTTPException(status_code=400, detail="interval_hours debe ser mayor que 0")
+    added = get_watchlist().add(request.domains, interval_hours * 3600)
+    return {"domains": added, "interval_hours": interval_hours}
+
+
+@router.get("/events")
+def change_events(
+    days: Optional[float] = Query(None, description="Solo eventos de los últimos N días"),
+    domain: Optional[str] = Query(None, description="Solo un dominio"),
+    field: Optional[str] = Query(None, description=f"Campo: {', '.join(WATCHED_FIELDS)}"),
+    limit: int = Query(100, ge=1, le=1000, description="Eventos a devolver")
+):
+    """Cambios de `has_ads_detected` o de prioridad, del más reciente al más antiguo"""
+    if field is not None and field not in WATCHED_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field debe ser uno de: {', '.join(WATCHED_FIELDS)}")
+    since = time.time() - days * 86400 if days is not None else None
+    return {"events": get_watchlist().events(since, domain, field, limit)}
+
+
+@router.delete("/{domain}")
+def remove_from_watchlist(domain: str):
+    """Deja de vigilar un dominio (sus eventos se conservan)"""
+    if not get_watchlist().remove(domain):
+        raise HTTPException(status_code=404, detail=f"Dominio no vigilado: {domain}")
+    return {"removed": domain}
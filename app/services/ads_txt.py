@@ -0,0 +1,228 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from ..config import settings
+from .deadline import Deadline
+from .http_fetcher import http_fetcher
+
+logger = logging.getLogger(__name__)
+
+ADS_TXT = 'ads.txt'
+APP_ADS_TXT = 'app-ads.txt'
+
+# Respuestas que significan que el fichero no existe (se cachean como 'not_found')
+NOT_FOUND_STATUS_CODES = (404, 410)
+
+# Variables válidas de la especificación IAB (CONTACT=..., OWNERDOMAIN=...)
+_VARIABLES = {'contact', 'subdomain', 'inventorypartnerdomain', 'ownerdomain', 'managerdomain'}
+
+
+class AdsTxtRecord(NamedTuple):
+    """Una línea de datos de ads.txt: sistema de ads, publisher id, relación y cert id"""
+    ad_system: str
+    publisher_id: str
+    relationship: str  # 'DIRECT' o 'RESELLER'
+    cert_id: Optional[str] = None
+
+
+class AdsTxtParser:
+    """
+    Parser incremental de ads.txt / app-ads.txt: recibe el fichero por
+    trozos de bytes (mismo contrato que `SignatureScanner.feed`) y construye
+    los registros indexados por sistema de ads en una sola pasada, sin
+    guardar el texto completo.
+    """
+
+    budget_exhausted = False  # Compatibilidad con HttpFetcher.scan
+
+    def __init__(self):
+        self.records: Dict[str, List[AdsTxtRecord]] = {}
+        self.variables: Dict[str, List[str]] = {}
+        self.line_count = 0
+        self.invalid_lines = 0
+        self._tail = b''
+
+    def accepts(self, status_code: int, headers) -> bool:
+        """Solo se parsea un 200 que no sea HTML (un soft-404 no se descarga)"""
+        return status_code == 200 and 'html' not in headers.get('content-type', '').lower()
+
+    def feed(self, chunk) -> bool:
+        """Procesa las líneas completas del trozo; nunca pide cortar la descarga"""
+        data = self._tail + bytes(chunk)
+        lines = data.split(b'\n')
+        self._tail = lines.pop()
+        self.parse_lines(line.decode('utf-8', errors='replace') for line in lines)
+        return False
+
+    def close(self):
+        """
+        Procesa la última línea (sin salto de línea final). Solo se llama si
+        se leyó el fichero entero: si se cortó, la última línea está a medias
+        y se descarta.
+        """
+        if self._tail:
+            self.parse_lines([self._tail.decode('utf-8', errors='replace')])
+            self._tail = b''
+
+    def parse_lines(self, lines: Iterable[str]):
+        for raw in lines:
+            self.line_count += 1
+            line = raw.split('#', 1)[0].strip()
+            if not line:
+                continue
+
+            fields = [field.strip() for field in line.split(',')]
+            if len(fields) == 1 and '=' in line:
+                key, _, value = line.partition('=')
+                if key.strip().lower() in _VARIABLES:
+                    self.variables.setdefault(key.strip().upper(), []).append(value.strip())
+                    continue
+
+            if len(fields) < 3 or not fields[0] or not fields[1]:
+                self.invalid_lines += 1
+                continue
+
+            relationship = fields[2].upper()
+            if relationship not in ('DIRECT', 'RESELLER'):
+                self.invalid_lines += 1
+                continue
+
+            record = AdsTxtRecord(
+                ad_system=fields[0].lower(),
+                publisher_id=fields[1],
+                relationship=relationship,
+                cert_id=fields[3] if len(fields) > 3 and fields[3] else None
+            )
+            self.records.setdefault(record.ad_system, []).append(record)
+
+
+class AdsTxtFile:
+    """ads.txt (o app-ads.txt) de un host, tal y como está en la caché"""
+
+    def __init__(self, host: str, filename: str, status: str, parser: Optional[AdsTxtParser] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None, truncated: bool = False):
+        self.host = host
+        self.filename = filename
+        self.status = status  # 'ok', 'not_found' o 'error'
+        self.records = parser.records if parser else {}
+        self.variables = parser.variables if parser else {}
+        self.line_count = parser.line_count if parser else 0
+        self.invalid_lines = parser.invalid_lines if parser else 0
+        self.etag = etag
+        self.last_modified = last_modified
+        self.truncated = truncated  # Cortado en ADS_TXT_MAX_BYTES: faltan registros del final
+        self.fetched_at = time.monotonic()
+
+    def records_for(self, ad_systems: Iterable[str]) -> List[AdsTxtRecord]:
+        """Registros de los sistemas de ads indicados"""
+        found = []
+        for ad_system in ad_systems:
+            found.extend(self.records.get(ad_system, ()))
+        return found
+
+    def summary(self) -> Dict:
+        direct = sum(1 for records in self.records.values() for r in records if r.relationship == 'DIRECT')
+        total = sum(len(records) for records in self.records.values())
+        return {
+            'status': self.status,
+            'records': total,
+            'direct': direct,
+            'reseller': total - direct,
+            'ad_systems': len(self.records),
+            'invalid_lines': self.invalid_lines,
+            'truncated': self.truncated
+        }
+
+
+class AdsTxtCache:
+    """
+    Caché compartida de ads.txt y app-ads.txt por host. Pasado el TTL la
+    entrada se revalida con If-None-Match / If-Modified-Since: un 304
+    reutiliza los registros ya parseados sin volver a descargar el fichero.
+    También se cachea la ausencia del fichero (404/410 o HTML de soft-404);
+    cualquier otra respuesta es un fallo temporal que no se cachea (se
+    devuelve la entrada anterior si la hay).
+    """
+
+    def __init__(self, ttl: float = settings.ADS_TXT_CACHE_TTL,
+                 max_hosts: int = settings.ADS_TXT_CACHE_MAX_HOSTS,
+                 max_bytes: int = settings.ADS_TXT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_hosts * 2  # ads.txt + app-ads.txt por host
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], AdsTxtFile]' = OrderedDict()
+        self.counters = {'hits': 0, 'revalidated': 0, 'downloads': 0, 'errors': 0}
+
+    async def get(self, host: str, filename: str = ADS_TXT, deadline: Optional[Deadline] = None) -> AdsTxtFile:
+        key = (host.lower(), filename)
+        cached = self._entries.get(key)
+        if cached and time.monotonic() - cached.fetched_at < self.ttl:
+            self._entries.move_to_end(key)
+            self.counters['hits'] += 1
+            return cached
+
+        entry = await self._fetch(key[0], filename, cached, deadline or Deadline())
+        if entry.status != 'error':
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    async def get_all(self, host: str, deadline: Optional[Deadline] = None) -> Dict[str, AdsTxtFile]:
+        """ads.txt y app-ads.txt del host, en paralelo"""
+        ads, app_ads = await asyncio.gather(self.get(host, ADS_TXT, deadline), self.get(host, APP_ADS_TXT, deadline))
+        return {ADS_TXT: ads, APP_ADS_TXT: app_ads}
+
+    async def _fetch(self, host: str, filename: str, cached: Optional[AdsTxtFile], deadline: Deadline) -> AdsTxtFile:
+        headers = {'Accept': 'text/plain,*/*;q=0.5'}
+        if cached and cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached and cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+        parser = AdsTxtParser()
+        try:
+            result = await http_fetcher.scan(
+                f"https://{host}/{filename}", parser, headers=headers,
+                timeout=deadline.timeout(10), max_bytes=self.max_bytes, keep_body=False
+            )
+        except Exception as e:
+            logger.debug(f"No se pudo descargar {filename} de {host}: {e}")
+            self.counters['errors'] += 1
+            # Mejor un fichero algo antiguo que ninguno
+            return cached or AdsTxtFile(host, filename, 'error')
+
+        if result.status_code == 304 and cached:
+            cached.fetched_at = time.monotonic()
+            self.counters['revalidated'] += 1
+            return cached
+
+        if result.stop_reason == 'rejected':
+            if result.status_code in NOT_FOUND_STATUS_CODES or result.status_code == 200:
+                self.counters['downloads'] += 1
+                return AdsTxtFile(host, filename, 'not_found')  # 404/410 o HTML de soft-404
+            # 5xx, 403, 429, redirección a un login...: fallo temporal, no se cachea
+            logger.debug(f"{filename} de {host} respondió HTTP {result.status_code}")
+            self.counters['errors'] += 1
+            return cached or AdsTxtFile(host, filename, 'error')
+
+        self.counters['downloads'] += 1
+
+        # HttpFetcher.scan ya cerró el parser si el fichero se leyó entero
+        return AdsTxtFile(
+            host, filename, 'ok', parser,
+            etag=result.headers.get('etag'),
+            last_modified=result.headers.get('last-modified'),
+            truncated=result.truncated
+        )
+
+    def stats(self) -> Dict:
+        return {'entries': len(self._entries), **self.counters}
+
+
+# Caché compartida por todos los detectores
+ads_txt_cache = AdsTxtCache()
@@ -2,11 +2,23 @@ import asyncio
 import aiohttp
 import re
 import json
+import time
 from urllib.parse import urlparse, urljoin
-from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 from typing import Dict, List, Set, Optional
 import logging
+from .deadline import Deadline
+from .dom_features import DomFeatures, extract_dom_features
+from .signature_db import get_signature_db
+from .signatures import CpuBudget
+from .sitemap_crawler import sitemap_crawler
+from .landing_probe import landing_prober
+from .http_fetcher import ScanResult, http_fetcher, replay
+from .script_analyzer import script_analyzer
+from .tracking_ids import create_id_scanner, extract_ids, merge_ids
+from . import scoring
+from .scoring_rules import get_scoring_rules
+from ..config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -15,69 +27,38 @@ class AdvancedAdsDetector:
     
     def __init__(self):
         self.ua = UserAgent()
-        
-        # Dominios conocidos de advertising y tracking
-        self.ad_domains = {
-            'google_ads': [
-                'googleadservices.com', 'googlesyndication.com', 'googletagmanager.com',
-                'googletagservices.com', 'google-analytics.com', 'googleads.g.doubleclick.net',
-                'doubleclick.net', 'adsystem.com', 'adsense.com'
-            ],
-            'facebook_ads': [
-                'facebook.com/tr', 'connect.facebook.net', 'fbcdn.net',
-                'facebook.net', 'instagram.com/embed.js'
-            ],
-            'other_ads': [
-                'amazon-adsystem.com', 'adsystem.com', 'adnxs.com', 'adsafeprotected.com',
-                'moatads.com', 'scorecardresearch.com', 'outbrain.com', 'taboola.com',
-                'criteo.com', 'rlcdn.com', 'bidswitch.net', 'casalemedia.com'
-            ]
-        }
-        
-        # Herramientas de A/B testing y personalización
-        self.ab_testing_tools = [
-            'optimizely.com', 'google-analytics.com/gtm', 'hotjar.com',
-            'fullstory.com', 'mixpanel.com', 'segment.com', 'amplitude.com',
-            'heap.com', 'crazyegg.com', 'vwo.com', 'unbounce.com'
-        ]
-        
-        # Keywords que indican actividad publicitaria
-        self.ad_keywords = {
-            'high_confidence': [
-                'utm_campaign', 'utm_source', 'utm_medium', 'gclid', 'fbclid',
-                'google_ads', 'facebook_ads', 'adwords', 'remarketing',
-                'conversion_tracking', 'retargeting', 'audience_pixel'
-            ],
-            'medium_confidence': [
-                'landing_page', 'campaign', 'promotion', 'offer', 'deal',
-                'discount', 'sale', 'limited_time', 'cta', 'call_to_action'
-            ]
-        }
+    
+    # Catálogos leídos de la base de firmas vigente (se recarga en caliente)
+    @property
+    def ad_domains(self) -> Dict[str, List[str]]:
+        """Dominios conocidos de advertising y tracking"""
+        catalog = get_signature_db().host_catalog
+        return {category: catalog[category] for category in ('google_ads', 'facebook_ads', 'other_ads')}
+    
+    @property
+    def ab_testing_tools(self) -> List[str]:
+        """Herramientas de A/B testing y personalización"""
+        return get_signature_db().host_catalog['ab_testing']
+    
+    @property
+    def ad_keywords(self) -> Dict[str, List[str]]:
+        """Keywords que indican actividad publicitaria"""
+        return get_signature_db().ad_keywords
 
-    async def analyze_domain_advanced(self, domain: str) -> Dict:
-        """Análisis avanzado de un dominio"""
+    async def analyze_domain_advanced(self, domain: str, deadline: Optional[Deadline] = None,
+                                      page: Optional[ScanResult] = None) -> Dict:
+        """Análisis avanzado de un dominio (`page`: home ya descargada, si la hay)"""
+        deadline = deadline or Deadline()
         try:
             results = {
                 'domain': domain,
                 'advanced_analysis': {},
                 'confidence_factors': [],
                 'risk_score': 0.0,
-                'evidence_strength': 'low'
+                'evidence_strength': 'low',
+                'signatures_version': get_signature_db().version
             }
             
-            # Ejecutar todos los análisis en paralelo
-            tasks = [
-                self.analyze_sitemap(domain),
-                self.analyze_robots_txt(domain),
-                self.analyze_main_page_advanced(domain),
-                self.analyze_common_landing_pages(domain),
-                self.detect_third_party_integrations(domain),
-                self.analyze_javascript_events(domain),
-                self.check_structured_data(domain)
-            ]
-            
-            analysis_results = await asyncio.gather(*tasks, return_exceptions=True)
-            
             # Procesar resultados
             analysis_names = [
                 'sitemap_analysis', 'robots_analysis', 'main_page_analysis',
@@ -85,15 +66,33 @@ class AdvancedAdsDetector:
                 'javascript_analysis', 'structured_data_analysis'
             ]
             
-            total_score = 0
-            valid_analyses = 0
+            # La home se descarga una sola vez para el análisis de la página y el de scripts
+            home = asyncio.ensure_future(self._fetch_home(domain, deadline, page))
+            home.add_done_callback(lambda task: task.cancelled() or task.exception())  # Error ya recogido
+            
+            # Ejecutar todos los análisis en paralelo dentro del presupuesto de tiempo
+            tasks = [
+                self.analyze_sitemap(domain, deadline),
+                self.analyze_robots_txt(domain),
+                self.analyze_main_page_advanced(domain, home),
+                self.analyze_common_landing_pages(domain),
+                self.detect_third_party_integrations(domain),
+                self.analyze_javascript_events(domain, home),
+                self.check_structured_data(domain)
+            ]
+            
+            try:
+                analysis_results = await asyncio.gather(
+                    *[deadline.run(name, task) for name, task in zip(analysis_names, tasks)],
+                    return_exceptions=True
+                )
+            finally:
+                home.cancel()
             
             for i, result in enumerate(analysis_results):
                 if not isinstance(result, Exception) and result:
                     results['advanced_analysis'][analysis_names[i]] = result
                     score = result.get('confidence_score', 0)
-                    total_score += score
-                    valid_analyses += 1
                     
                     # Agregar factores de confianza
                     if score > 50:
@@ -101,17 +100,13 @@ class AdvancedAdsDetector:
                             result.get('evidence', [])
                         )
             
-            # Calcular score final
-            if valid_analyses > 0:
-                results['risk_score'] = min(100, total_score / valid_analyses * 1.2)
-            
-            # Determinar fuerza de evidencia
-            if results['risk_score'] >= 70:
-                results['evidence_strength'] = 'high'
-            elif results['risk_score'] >= 40:
-                results['evidence_strength'] = 'medium'
-            else:
-                results['evidence_strength'] = 'low'
+            # Calcular score final y fuerza de evidencia
+            rules = get_scoring_rules()
+            results['risk_score'] = scoring.advanced_risk_score(
+                (analysis.get('confidence_score', 0) for analysis in results['advanced_analysis'].values()), rules
+            )
+            results['evidence_strength'] = scoring.evidence_strength(results['risk_score'], rules)
+            results['rules_version'] = rules.version
             
             return results
             
@@ -124,59 +119,31 @@ class AdvancedAdsDetector:
                 'evidence_strength': 'error'
             }
 
-    async def analyze_sitemap(self, domain: str) -> Dict:
-        """Analiza sitemap.xml para detectar estructura de campañas"""
+    async def analyze_sitemap(self, domain: str, deadline: Optional[Deadline] = None) -> Dict:
+        """Analiza los sitemaps (incluidos índices y .xml.gz) para detectar estructura de campañas"""
         try:
-            sitemap_urls = [
-                f'https://{domain}/sitemap.xml',
-                f'https://{domain}/sitemap_index.xml',
-                f'https://www.{domain}/sitemap.xml'
-            ]
-            
             evidence = []
             score = 0
             
-            async with aiohttp.ClientSession() as session:
-                for url in sitemap_urls:
-                    try:
-                        async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                            if response.status == 200:
-                                content = await response.text()
-                                
-                                # Buscar patrones de landing pages de campañas
-                                campaign_patterns = [
-                                    r'/landing[_-]?page',
-                                    r'/campaign',
-                                    r'/promo',
-                                    r'/offer',
-                                    r'/deals?',
-                                    r'/sale',
-                                    r'/utm_',
-                                    r'/lp/',
-                                    r'/landing/'
-                                ]
-                                
-                                for pattern in campaign_patterns:
-                                    matches = re.findall(pattern, content, re.IGNORECASE)
-                                    if matches:
-                                        evidence.append(f"Landing pages detectadas: {pattern}")
-                                        score += 15
-                                
-                                # Contar URLs con parámetros de campaña
-                                utm_count = len(re.findall(r'utm_', content))
-                                if utm_count > 0:
-                                    evidence.append(f"URLs con UTM parameters: {utm_count}")
-                                    score += min(30, utm_count * 5)
-                                
-                                break
-                                
-                    except Exception:
-                        continue
+            # Parseo en streaming con límites y caché por host
+            stats = await sitemap_crawler.crawl(domain, deadline)
+            
+            # Patrones de landing pages de campañas contados durante el parseo
+            for pattern, count in stats['campaign_paths'].items():
+                evidence.append(f"Landing pages detectadas: {pattern} ({count})")
+                score += 15
+            
+            # URLs con parámetros de campaña
+            utm_count = stats['utm_urls']
+            if utm_count > 0:
+                evidence.append(f"URLs con UTM parameters: {utm_count}")
+                score += min(30, utm_count * 5)
             
             return {
-                'has_sitemap': len(evidence) > 0,
+                'has_sitemap': stats['found'],
                 'evidence': evidence,
                 'confidence_score': min(100, score),
+                'sitemap_stats': stats,
                 'analysis_type': 'sitemap'
             }
             
@@ -196,33 +163,17 @@ class AdvancedAdsDetector:
                         if response.status == 200:
                             content = await response.text()
                             
-                            # Buscar rutas relacionadas con ads y tracking
-                            ad_paths = [
-                                r'/ads?/',
-                                r'/tracking/',
-                                r'/analytics/',
-                                r'/conversion/',
-                                r'/pixel/',
-                                r'/retargeting/',
-                                r'/remarketing/',
-                                r'/campaign/',
-                                r'/utm_'
-                            ]
+                            db = get_signature_db()
                             
-                            for pattern in ad_paths:
-                                if re.search(pattern, content, re.IGNORECASE):
+                            # Buscar rutas relacionadas con ads y tracking
+                            for pattern, compiled in db.page_patterns['robots_ad_paths']:
+                                if compiled.search(content):
                                     evidence.append(f"Ruta de ads detectada: {pattern}")
                                     score += 20
                             
                             # Buscar sitemaps específicos de campañas
-                            sitemap_patterns = [
-                                r'sitemap[_-]?campaign',
-                                r'sitemap[_-]?promo',
-                                r'sitemap[_-]?landing'
-                            ]
-                            
-                            for pattern in sitemap_patterns:
-                                if re.search(pattern, content, re.IGNORECASE):
+                            for pattern, compiled in db.page_patterns['robots_campaign_sitemaps']:
+                                if compiled.search(content):
                                     evidence.append(f"Sitemap de campañas: {pattern}")
                                     score += 25
                             
@@ -239,152 +190,144 @@ class AdvancedAdsDetector:
         except Exception as e:
             return {'error': str(e), 'confidence_score': 0}
 
-    async def analyze_main_page_advanced(self, domain: str) -> Dict:
-        """Análisis avanzado de la página principal"""
-        try:
-            url = f'https://{domain}'
-            evidence = []
-            score = 0
-            
+    async def _fetch_home(self, domain: str, deadline: Optional[Deadline] = None,
+                          page: Optional[ScanResult] = None) -> Dict:
+        """
+        Descarga de la home compartida por el análisis de la página y el de
+        scripts: respuesta, features del DOM (un único recorrido) e IDs del
+        HTML (fbq init, AW-...) escaneados mientras se descarga. Con un
+        `deadline`, el timeout se acota a lo que queda del presupuesto; con
+        `page` (home ya descargada) no se vuelve a descargar.
+        """
+        page_scanner = create_id_scanner()
+        if page is not None:
+            page = replay(page, page_scanner)
+        else:
+            deadline = deadline or Deadline()
             headers = {
                 'User-Agent': self.ua.random,
                 'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
                 'Accept-Language': 'en-US,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
                 'Cache-Control': 'no-cache'
             }
+            page = await http_fetcher.scan(
+                f'https://{domain}', page_scanner, headers=headers, timeout=deadline.timeout(15)
+            )
+        return {'page': page, 'features': extract_dom_features(page.text), 'ids': extract_ids(page_scanner)}
+    
+    async def _home(self, domain: str, home: Optional[asyncio.Future]) -> Dict:
+        # shield: si una etapa se queda sin tiempo, la descarga sigue para la otra
+        return await asyncio.shield(home) if home is not None else await self._fetch_home(domain)
+
+    async def analyze_main_page_advanced(self, domain: str, home: Optional[asyncio.Future] = None) -> Dict:
+        """Análisis avanzado de la página principal"""
+        try:
+            evidence = []
+            score = 0
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
-                    content = await response.text()
-                    soup = BeautifulSoup(content, 'html.parser')
-                    
-                    # 1. Análisis de headers HTTP
-                    response_headers = dict(response.headers)
-                    ad_headers = [
-                        'x-google-ads', 'x-fb-ads', 'x-ads-enabled',
-                        'x-conversion-tracking', 'x-remarketing'
-                    ]
-                    
-                    for header in ad_headers:
-                        if any(h.lower().find(header) != -1 for h in response_headers.keys()):
-                            evidence.append(f"Header de ads detectado: {header}")
-                            score += 20
-                    
-                    # 2. Detectar third-party domains en recursos
-                    third_party_score = await self._analyze_third_party_resources(soup, domain)
-                    score += third_party_score['score']
-                    evidence.extend(third_party_score['evidence'])
-                    
-                    # 3. Análisis de JavaScript avanzado
-                    js_score = await self._analyze_javascript_advanced(soup)
-                    score += js_score['score']
-                    evidence.extend(js_score['evidence'])
-                    
-                    # 4. Detectar structured data para e-commerce
-                    structured_score = await self._analyze_structured_data(soup)
-                    score += structured_score['score']
-                    evidence.extend(structured_score['evidence'])
-                    
-                    # 5. Análisis de formularios y CTAs
-                    form_score = await self._analyze_forms_and_ctas(soup)
-                    score += form_score['score']
-                    evidence.extend(form_score['evidence'])
+            fetched = await self._home(domain, home)
+            features = fetched['features']
+            
+            # 1. Análisis de headers HTTP
+            response_headers = dict(fetched['page'].headers)
+            ad_headers = [
+                'x-google-ads', 'x-fb-ads', 'x-ads-enabled',
+                'x-conversion-tracking', 'x-remarketing'
+            ]
+            
+            for header in ad_headers:
+                if any(h.lower().find(header) != -1 for h in response_headers.keys()):
+                    evidence.append(f"Header de ads detectado: {header}")
+                    score += 20
+            
+            # 2. Detectar third-party domains en recursos
+            third_party_score = await self._analyze_third_party_resources(features, domain)
+            score += third_party_score['score']
+            evidence.extend(third_party_score['evidence'])
+            
+            # 3. Análisis de JavaScript avanzado
+            js_score = await self._analyze_javascript_advanced(features)
+            score += js_score['score']
+            evidence.extend(js_score['evidence'])
+            
+            # 4. Detectar structured data para e-commerce
+            structured_score = await self._analyze_structured_data(features)
+            score += structured_score['score']
+            evidence.extend(structured_score['evidence'])
+            
+            # 5. Análisis de formularios y CTAs
+            form_score = await self._analyze_forms_and_ctas(features)
+            score += form_score['score']
+            evidence.extend(form_score['evidence'])
             
             return {
                 'analysis_completed': True,
                 'evidence': evidence,
                 'confidence_score': min(100, score),
+                'dom_features': features.to_dict(),
                 'analysis_type': 'main_page_advanced'
             }
             
         except Exception as e:
             return {'error': str(e), 'confidence_score': 0}
 
-    async def _analyze_third_party_resources(self, soup: BeautifulSoup, domain: str) -> Dict:
+    async def _analyze_third_party_resources(self, features: DomFeatures, domain: str) -> Dict:
         """Analiza recursos de terceros que indican advertising"""
         evidence = []
         score = 0
         
-        # Buscar scripts, iframes, images de dominios de ads
-        all_domains = []
-        all_domains.extend(self.ad_domains['google_ads'])
-        all_domains.extend(self.ad_domains['facebook_ads'])
-        all_domains.extend(self.ad_domains['other_ads'])
-        all_domains.extend(self.ab_testing_tools)
-        
-        for tag in soup.find_all(['script', 'iframe', 'img', 'link']):
-            src = tag.get('src') or tag.get('href') or ''
+        # Buscar scripts, iframes, images de dominios de ads (trie de sufijos: O(etiquetas) por recurso)
+        hosts = get_signature_db().hosts
+        for _, src in features.resource_urls:
             if src:
                 parsed_url = urlparse(src)
                 if parsed_url.netloc and parsed_url.netloc != domain:
-                    for ad_domain in all_domains:
-                        if ad_domain in parsed_url.netloc:
-                            evidence.append(f"Recurso de ads: {ad_domain}")
-                            score += 15
-                            break
+                    match = hosts.classify_url(parsed_url)
+                    if match:
+                        evidence.append(f"Recurso de ads: {match[1]}")
+                        score += 15
         
         return {'evidence': evidence, 'score': min(50, score)}
 
-    async def _analyze_javascript_advanced(self, soup: BeautifulSoup) -> Dict:
+    async def _analyze_javascript_advanced(self, features: DomFeatures) -> Dict:
         """Análisis avanzado de JavaScript para detectar tracking"""
         evidence = []
         score = 0
         
-        # Patrones de JavaScript de advertising
-        js_patterns = {
-            'conversion_tracking': [
-                r'gtag\s*\(\s*[\'"]event[\'"]',
-                r'fbq\s*\(\s*[\'"]track[\'"]',
-                r'conversion[_-]?tracking',
-                r'track[_-]?conversion'
-            ],
-            'remarketing': [
-                r'google_remarketing',
-                r'facebook_remarketing',
-                r'retargeting[_-]?pixel',
-                r'audience[_-]?pixel'
-            ],
-            'ab_testing': [
-                r'optimizely',
-                r'google[_-]?optimize',
-                r'vwo[_-]?api',
-                r'ab[_-]?test'
-            ]
-        }
+        # Patrones de JavaScript de advertising (precompilados en la base de firmas)
+        js_patterns = get_signature_db().page_patterns['javascript']
+        budget = CpuBudget()
         
-        scripts = soup.find_all('script')
-        for script in scripts:
-            script_content = script.string or ''
-            
+        for script_content in features.inline_scripts:
+            # Presupuesto de CPU por documento: un script patológico no bloquea el worker
+            if budget.exhausted:
+                evidence.append("JS: presupuesto de CPU agotado, scripts restantes sin analizar")
+                break
+            started = time.perf_counter()
             for category, patterns in js_patterns.items():
-                for pattern in patterns:
-                    if re.search(pattern, script_content, re.IGNORECASE):
+                for pattern, compiled in patterns:
+                    if compiled.search(script_content):
                         evidence.append(f"JS {category}: {pattern}")
                         score += 10
+            budget.charge(started)
         
         return {'evidence': evidence, 'score': min(40, score)}
 
-    async def _analyze_structured_data(self, soup: BeautifulSoup) -> Dict:
+    async def _analyze_structured_data(self, features: DomFeatures) -> Dict:
         """Analiza structured data que indica actividad e-commerce"""
         evidence = []
         score = 0
         
-        # Buscar JSON-LD structured data
-        json_scripts = soup.find_all('script', type='application/ld+json')
+        # Tipos que indican actividad comercial
+        commercial_types = get_signature_db().commercial_schema_types
         
-        for script in json_scripts:
+        # Buscar JSON-LD structured data
+        for script_content in features.json_ld:
             try:
-                data = json.loads(script.string)
+                data = json.loads(script_content)
                 if isinstance(data, dict):
                     schema_type = data.get('@type', '').lower()
                     
-                    # Tipos que indican actividad comercial
-                    commercial_types = [
-                        'product', 'offer', 'store', 'organization',
-                        'localbusiness', 'e-commercesite'
-                    ]
-                    
                     if any(t in schema_type for t in commercial_types):
                         evidence.append(f"Schema comercial: {schema_type}")
                         score += 15
@@ -394,58 +337,41 @@ class AdvancedAdsDetector:
         
         return {'evidence': evidence, 'score': min(30, score)}
 
-    async def _analyze_forms_and_ctas(self, soup: BeautifulSoup) -> Dict:
+    async def _analyze_forms_and_ctas(self, features: DomFeatures) -> Dict:
         """Analiza formularios y CTAs que indican campañas"""
         evidence = []
         score = 0
         
-        # Buscar formularios con parámetros de tracking
-        forms = soup.find_all('form')
-        for form in forms:
-            # Inputs hidden con valores de tracking
-            hidden_inputs = form.find_all('input', type='hidden')
-            for inp in hidden_inputs:
-                name = inp.get('name', '').lower()
-                if any(keyword in name for keyword in ['utm_', 'campaign', 'source', 'medium']):
-                    evidence.append(f"Form tracking: {name}")
-                    score += 10
+        # Buscar formularios con parámetros de tracking (inputs hidden)
+        for name in features.hidden_form_inputs:
+            if any(keyword in name for keyword in ['utm_', 'campaign', 'source', 'medium']):
+                evidence.append(f"Form tracking: {name}")
+                score += 10
         
         # Buscar botones/links con clases que indican CTAs
-        cta_classes = ['cta', 'call-to-action', 'btn-primary', 'buy-now', 'sign-up']
-        for class_name in cta_classes:
-            elements = soup.find_all(class_=re.compile(class_name, re.IGNORECASE))
-            if elements:
+        for class_name, compiled in get_signature_db().cta_classes:
+            if any(compiled.search(value) for value in features.class_values):
                 evidence.append(f"CTA elements: {class_name}")
                 score += 5
         
         return {'evidence': evidence, 'score': min(25, score)}
 
     async def analyze_common_landing_pages(self, domain: str) -> Dict:
-        """Analiza páginas comunes que suelen ser landing pages"""
-        common_paths = [
-            '/landing', '/lp', '/campaign', '/promo', '/offer',
-            '/sale', '/deals', '/signup', '/register', '/demo'
-        ]
-        
+        """Analiza páginas comunes que suelen ser landing pages (sondeo concurrente con HEAD)"""
         evidence = []
         score = 0
         
-        async with aiohttp.ClientSession() as session:
-            for path in common_paths:
-                try:
-                    url = f'https://{domain}{path}'
-                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as response:
-                        if response.status == 200:
-                            evidence.append(f"Landing page encontrada: {path}")
-                            score += 10
-                            
-                except Exception:
-                    continue
+        # Rutas configurables (LANDING_PAGE_PATHS); descarta soft-404 de sitios catch-all
+        probe = await landing_prober.probe(domain)
+        for path in probe['found']:
+            evidence.append(f"Landing page encontrada: {path}")
+            score += 10
         
         return {
             'landing_pages_found': len(evidence),
             'evidence': evidence,
             'confidence_score': min(60, score),
+            'soft_404_site': probe['soft_404_site'],
             'analysis_type': 'landing_pages'
         }
 
@@ -459,13 +385,43 @@ class AdvancedAdsDetector:
             'analysis_type': 'third_party_integrations'
         }
 
-    async def analyze_javascript_events(self, domain: str) -> Dict:
-        """Analiza eventos de JavaScript relacionados con conversión"""
-        return {
-            'events_detected': [],
-            'confidence_score': 0,
-            'analysis_type': 'javascript_events'
-        }
+    async def analyze_javascript_events(self, domain: str, home: Optional[asyncio.Future] = None) -> Dict:
+        """
+        Analiza los scripts externos de tracking de la página (gtm.js,
+        fbevents.js, gtag/js...) buscando IDs de conversión y de píxel.
+        El análisis de cada script se comparte entre todos los dominios.
+        """
+        try:
+            fetched = await self._home(domain, home)
+            page = fetched['page']
+            script_urls = []
+            for src in fetched['features'].script_srcs:
+                script_url = urljoin(page.url, src)
+                if script_url not in script_urls and script_analyzer.is_tracking_script(script_url):
+                    script_urls.append(script_url)
+            script_urls = script_urls[:settings.SCRIPT_MAX_PER_PAGE]
+            
+            scripts = await script_analyzer.analyze_many(script_urls)
+            ids = merge_ids([fetched['ids']] + [script['ids'] for script in scripts])
+            
+            evidence = []
+            score = 0
+            for id_type, values in ids.items():
+                evidence.append(f"IDs {id_type}: {', '.join(values[:3])}")
+                # Los IDs de conversión/píxel pesan más que los de analítica
+                score += 25 if id_type in ('google_ads', 'meta_pixel') else 5
+            
+            return {
+                'events_detected': [f"{id_type}:{value}" for id_type, values in ids.items() for value in values],
+                'tracking_ids': ids,
+                'scripts_analyzed': [script['url'] for script in scripts],
+                'evidence': evidence,
+                'confidence_score': min(60, score),
+                'analysis_type': 'javascript_events'
+            }
+            
+        except Exception as e:
+            return {'error': str(e), 'confidence_score': 0, 'analysis_type': 'javascript_events'}
 
     async def check_structured_data(self, domain: str) -> Dict:
         """Verifica structured data adicional"""
@@ -0,0 +1,158 @@
+"""
+Motor de scoring vectorizado: empaqueta las features de un lote de dominios
+en arrays de NumPy y calcula todos los scores, prioridades y niveles de
+confianza en una sola pasada. Evalúa las mismas reglas compiladas
+(`scoring_rules`) que la API escalar de `scoring`, que sigue siendo la de
+las peticiones individuales, así que ambos dan los mismos resultados.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .scoring_rules import ScoringRules, get_scoring_rules
+
+PIPELINES = ('basic', 'ultra', 'unified')
+
+
+class FeatureBatch:
+    """
+    Acumula las features de muchos dominios en columnas numéricas. Las
+    columnas de tracking salen de las reglas con las que se creó el lote,
+    y con ellas mismas se puntúa (`score_batch`).
+    """
+
+    def __init__(self, rules: Optional[ScoringRules] = None):
+        self.rules = rules or get_scoring_rules()
+        self.tracking_columns = tuple(self.rules.tracking_family_points) + tuple(self.rules.tracking_count_points)
+        columns = self.tracking_columns + (
+            'facebook_has_ads', 'facebook_advertiser', 'facebook_confidence',
+            'google_has_ads', 'google_advertiser', 'google_confidence',
+            'advanced_sum', 'advanced_count', 'pipeline', 'transparency_ads'
+        )
+        self._columns: Dict[str, List[float]] = {name: [] for name in columns}
+
+    def __len__(self) -> int:
+        return len(self._columns['pipeline'])
+
+    def add(self, features: Dict):
+        """Añade las features crudas de un dominio (formato de `feature_store.extract_features`)"""
+        columns = self._columns
+        tracking = features.get('tracking') or {}
+        for name in self.tracking_columns:
+            columns[name].append(tracking.get(name, 0))
+
+        for prefix, key in (('facebook', 'facebook_library'), ('google', 'google_transparency')):
+            library = features.get(key) or {}
+            columns[f'{prefix}_has_ads'].append(bool(library.get('has_ads')))
+            columns[f'{prefix}_advertiser'].append(bool(library.get('advertiser_found')))
+            columns[f'{prefix}_confidence'].append(library.get('confidence') or 0)
+
+        analysis_scores = ((features.get('advanced') or {}).get('analysis_scores') or {}).values()
+        columns['advanced_sum'].append(sum(analysis_scores))
+        columns['advanced_count'].append(len(analysis_scores))
+        columns['pipeline'].append(PIPELINES.index(features.get('pipeline', 'basic')))
+        columns['transparency_ads'].append(
+            bool((features.get('facebook_transparency') or {}).get('ads_in_circulation'))
+        )
+
+    def extend(self, features_list: Iterable[Dict]):
+        for features in features_list:
+            self.add(features)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        return {name: np.asarray(values, dtype=np.float64) for name, values in self._columns.items()}
+
+
+def _library_scores(has_ads: np.ndarray, advertiser: np.ndarray, confidence: np.ndarray, points: Dict) -> np.ndarray:
+    base = np.where(advertiser > 0, points['advertiser'], points['no_advertiser'])
+    return np.where(has_ads > 0, np.minimum(base + confidence * points['confidence_weight'], 100), 0.0)
+
+
+def score_batch(batch: FeatureBatch) -> Dict[str, np.ndarray]:
+    """
+    Puntúa un lote entero con sus reglas. Devuelve arrays alineados con el
+    lote: scores de cada etapa, códigos de prioridad y de confianza (índices
+    en `rules.ultra_priority_names`, `rules.basic_priority_names` y
+    `rules.confidence_names`) y la decisión final de cada dominio según su
+    pipeline.
+    """
+    rules = batch.rules
+    columns = batch.arrays()
+
+    # Tracking detector
+    tracking = np.zeros_like(columns['pipeline'])
+    for name, points in rules.tracking_family_points.items():
+        tracking += points * (columns[name] > 0)
+    for name, points in rules.tracking_count_points.items():
+        tracking += points * columns[name]
+    tracking = np.minimum(tracking, rules.tracking_max_score)
+
+    # Detector básico
+    facebook = _library_scores(columns['facebook_has_ads'], columns['facebook_advertiser'],
+                               columns['facebook_confidence'], rules.library_points['facebook'])
+    google = _library_scores(columns['google_has_ads'], columns['google_advertiser'],
+                             columns['google_confidence'], rules.library_points['google'])
+    weights = rules.basic_weights
+    basic = np.round(tracking * weights['tracking'] + facebook * weights['facebook'] + google * weights['google'], 1)
+
+    # Detector avanzado y combinación ultra
+    count = columns['advanced_count']
+    advanced = np.where(count > 0, np.minimum(100, columns['advanced_sum'] / np.maximum(count, 1) * rules.advanced_multiplier), 0.0)
+    ultra = basic * rules.ultra_weights['basic'] + advanced * rules.ultra_weights['advanced']
+    both_high = (basic >= rules.concordance_high) & (advanced >= rules.concordance_high)
+    both_low = (basic <= rules.concordance_low) & (advanced <= rules.concordance_low)
+    ultra = np.where(both_high, np.minimum(100, ultra * rules.concordance_high_multiplier), np.where(both_low, np.maximum(0, ultra * rules.concordance_low_multiplier), ultra))
+    confidence = np.where(both_high, 2, np.where(both_low, 1, 0))
+    priority = np.searchsorted(rules.ultra_thresholds, ultra, side='right')
+    ultra_likely = ultra >= rules.ultra_likely_threshold
+    ultra_rounded = np.round(ultra, 1)
+
+    # Endpoint unificado: smart_OR + boost de transparencia de Facebook
+    smart_or = ((columns['facebook_has_ads'] > 0) | (columns['google_has_ads'] > 0) | ultra_likely |
+                (tracking > rules.strong_tracking_threshold))
+    transparency = columns['transparency_ads'] > 0
+    overall = np.where(transparency, np.minimum(100, ultra_rounded + rules.facebook_transparency_boost), ultra_rounded)
+    boosted = transparency & (overall >= rules.facebook_transparency_min_score)
+
+    pipeline = columns['pipeline']
+    is_basic = pipeline == PIPELINES.index('basic')
+    is_unified = pipeline == PIPELINES.index('unified')
+    likely = np.where(is_basic, basic >= rules.basic_likely_threshold,
+                      np.where(is_unified, smart_or | boosted, ultra_likely))
+
+    return {
+        'tracking_score': tracking,
+        'facebook_score': facebook,
+        'google_score': google,
+        'basic_score': basic,
+        'basic_priority': np.searchsorted(rules.basic_thresholds, basic, side='right'),
+        'advanced_score': np.round(advanced, 1),
+        'ultra_score': ultra_rounded,
+        'overall_score': overall,
+        'priority': priority,
+        'confidence': np.where(is_unified & boosted, 3, confidence),
+        'likely_has_ads': likely
+    }
+
+
+def basic_priority_distribution(scores: np.ndarray, rules: Optional[ScoringRules] = None) -> Dict[str, int]:
+    """Dominios por nivel de prioridad del detector básico (un solo recorrido)"""
+    rules = rules or get_scoring_rules()
+    names = rules.basic_priority_names
+    counts = np.bincount(np.searchsorted(rules.basic_thresholds, scores, side='right'), minlength=len(names))
+    return {name: int(counts[i]) for i, name in reversed(list(enumerate(names)))}
+
+
+def ultra_priority_summary(assessments: List[Dict], rules: Optional[ScoringRules] = None) -> Dict:
+    """Resumen de un lote ultra (lista de `final_assessment`): dominios por prioridad y score medio"""
+    names = (rules or get_scoring_rules()).ultra_priority_names
+    unknown = len(names)
+    codes = np.fromiter(
+        (names.index(a.get('priority')) if a.get('priority') in names else unknown for a in assessments),
+        dtype=np.int64, count=len(assessments)
+    )
+    scores = np.fromiter((a.get('ultra_score', 0) for a in assessments), dtype=np.float64, count=len(assessments))
+    counts = np.bincount(codes, minlength=unknown + 1)
+    summary = {f'{name.lower()}_priority': int(counts[i]) for i, name in reversed(list(enumerate(names)))}
+    summary['average_score'] = float(scores.mean()) if len(scores) else 0
+    return summary
@@ -0,0 +1,127 @@
+import time
+from typing import Dict, Optional
+
+from ..config import settings
+
+# Upstream compartido por todos los scrapers de Facebook
+FACEBOOK_UPSTREAM = 'facebook.com'
+
+# Marcador que devuelven las etapas omitidas por un circuito abierto
+UPSTREAM_UNAVAILABLE = 'upstream_unavailable'
+
+# Códigos HTTP que indican que el upstream nos está limitando o está caído
+FAILURE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Se lanza cuando el circuito de un upstream está abierto"""
+
+    def __init__(self, upstream: str):
+        super().__init__(f"Circuito abierto para {upstream}")
+        self.upstream = upstream
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por upstream con estados closed / open / half_open.
+
+    - closed: las peticiones pasan; `failure_threshold` fallos seguidos abren el circuito.
+    - open: las peticiones fallan rápido durante `recovery_timeout` segundos.
+    - half_open: se deja pasar una petición de prueba; si va bien se cierra,
+      si falla se vuelve a abrir.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = settings.CIRCUIT_FAILURE_THRESHOLD,
+                 recovery_timeout: float = settings.CIRCUIT_RECOVERY_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_started_at: Optional[float] = None
+        self.last_failure_reason: Optional[str] = None
+        self.times_opened = 0
+        self.rejected_calls = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self.trial_started_at = None
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Indica si se puede llamar al upstream (y reserva la prueba en half_open)"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Una sola prueba a la vez; si la prueba se pierde, se permite otra tras el timeout
+            now = time.monotonic()
+            if self.trial_started_at is None or now - self.trial_started_at >= self.recovery_timeout:
+                self.trial_started_at = now
+                return True
+        self.rejected_calls += 1
+        return False
+
+    def record_success(self):
+        self._state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_started_at = None
+
+    def record_failure(self, reason: str = 'error'):
+        self.consecutive_failures += 1
+        self.last_failure_reason = reason
+        if self._state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.times_opened += 1
+            self._state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial_started_at = None
+
+    def snapshot(self) -> Dict:
+        state = self.state
+        retry_in = None
+        if state == self.OPEN:
+            retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 1)
+        return {
+            'state': state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_failure_reason': self.last_failure_reason,
+            'times_opened': self.times_opened,
+            'rejected_calls': self.rejected_calls,
+            'retry_in_seconds': retry_in
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_MAX_BREAKERS = 10000
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    """Devuelve (o crea) el circuit breaker de un upstream"""
+    breaker = _breakers.get(upstream)
+    if breaker is None:
+        if len(_breakers) >= _MAX_BREAKERS:
+            # Descartar circuitos cerrados y sanos de sitios objetivo para acotar memoria
+            for name in [n for n, b in _breakers.items() if b.state == CircuitBreaker.CLOSED
+                         and b.consecutive_failures == 0 and n != FACEBOOK_UPSTREAM]:
+                del _breakers[name]
+        breaker = _breakers[upstream] = CircuitBreaker(upstream)
+    return breaker
+
+
+def breakers_snapshot() -> Dict:
+    """Estado de Facebook y de todos los upstreams con circuito no cerrado"""
+    snapshot = {FACEBOOK_UPSTREAM: get_breaker(FACEBOOK_UPSTREAM).snapshot()}
+    for name, breaker in _breakers.items():
+        if name != FACEBOOK_UPSTREAM and breaker.state != CircuitBreaker.CLOSED:
+            snapshot[name] = breaker.snapshot()
+    return snapshot
@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, List, Optional
+
+
+class Deadline:
+    """
+    Presupuesto de tiempo global de un análisis, compartido por todas sus etapas.
+
+    Cada etapa se ejecuta con `run()`: si el presupuesto ya se agotó se omite,
+    y si no termina a tiempo se cancela. El resultado parcial se construye con
+    las etapas que sí se completaron y `report()` indica cuáles fueron.
+    Las etapas que se decide no ejecutar (p. ej. el pre-clasificador) se
+    anotan con `gate()`.
+    Sin presupuesto (budget_ms=None) las etapas se ejecutan sin límite global.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_ms / 1000 if budget_ms else None
+        self.computed: List[str] = []
+        self.timed_out: List[str] = []
+        self.skipped: List[str] = []
+        self.failed: List[str] = []
+        self.gated: List[str] = []
+        self.timings: Dict[str, float] = {}
+
+    def remaining(self) -> Optional[float]:
+        """Segundos restantes del presupuesto (None si no hay límite)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """Indica si el presupuesto ya se agotó"""
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def timeout(self, default: float) -> float:
+        """Timeout de una operación individual acotado por el tiempo restante"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        return max(0.001, min(default, remaining))
+
+    async def run(self, stage: str, awaitable: Awaitable, default: Any = None) -> Any:
+        """Ejecuta una etapa dentro del presupuesto; devuelve `default` si no llega a tiempo"""
+        if self.expired():
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.skipped.append(stage)
+            return default
+
+        started = time.monotonic()
+        try:
+            if self.expires_at is None:
+                result = await awaitable
+            else:
+                result = await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            self.timed_out.append(stage)
+            return default
+        except Exception:
+            self.failed.append(stage)
+            raise
+        finally:
+            self.timings[stage] = round((time.monotonic() - started) * 1000, 1)
+
+        self.computed.append(stage)
+        return result
+
+    def gate(self, *stages: str):
+        """Anota etapas que no se ejecutan por decisión (no por falta de tiempo)"""
+        self.gated.extend(stages)
+
+    def report(self) -> Dict:
+        """Resumen de las señales calculadas y las que no llegaron a tiempo"""
+        return {
+            'deadline_ms': self.budget_ms,
+            'elapsed_ms': round((time.monotonic() - self.started_at) * 1000, 1),
+            'computed': list(self.computed),
+            'timed_out': list(self.timed_out),
+            'skipped': list(self.skipped),
+            'failed': list(self.failed),
+            'gated': list(self.gated),
+            'partial': bool(self.timed_out or self.skipped),
+            'stage_timings_ms': dict(self.timings)
+        }
@@ -0,0 +1,108 @@
+from html.parser import HTMLParser
+from typing import Dict, List, Set, Tuple
+
+# Tags cuyos src/href apuntan a recursos de terceros
+RESOURCE_TAGS = {'script', 'iframe', 'img', 'link'}
+
+LD_JSON_TYPE = 'application/ld+json'
+
+
+class DomFeatures:
+    """
+    Registro compacto con todo lo que los detectores necesitan del DOM de
+    una página. Se rellena en un único recorrido (ver `extract_dom_features`).
+    """
+
+    def __init__(self):
+        self.resource_urls: List[Tuple[str, str]] = []  # (tag, src/href) de script/iframe/img/link
+        self.script_srcs: List[str] = []  # src de los <script> externos
+        self.inline_scripts: List[str] = []  # Contenido de cada <script> (incluye JSON-LD)
+        self.json_ld: List[str] = []  # Contenido de <script type="application/ld+json">
+        self.hidden_form_inputs: List[str] = []  # name (en minúsculas) de inputs hidden dentro de <form>
+        self.class_values: Set[str] = set()  # Valores distintos del atributo class
+        self.meta_tags: List[Dict[str, str]] = []  # name/property/content de cada <meta>
+        self.tag_count = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'resource_urls': len(self.resource_urls),
+            'script_srcs': len(self.script_srcs),
+            'inline_scripts': len(self.inline_scripts),
+            'json_ld': len(self.json_ld),
+            'hidden_form_inputs': len(self.hidden_form_inputs),
+            'class_values': len(self.class_values),
+            'meta_tags': len(self.meta_tags),
+            'tag_count': self.tag_count
+        }
+
+
+class _DomFeatureVisitor(HTMLParser):
+    """Visitor de html.parser: cada tag se mira una sola vez y sin construir árbol"""
+
+    def __init__(self, features: DomFeatures):
+        super().__init__(convert_charrefs=True)
+        self.features = features
+        self._form_depth = 0
+        self._script = None  # (es JSON-LD, trozos de texto) del <script> abierto
+
+    def handle_starttag(self, tag, attrs):
+        features = self.features
+        features.tag_count += 1
+        attrs = {name: value or '' for name, value in attrs}
+
+        class_value = attrs.get('class')
+        if class_value:
+            features.class_values.add(class_value)
+
+        if tag in RESOURCE_TAGS:
+            url = attrs.get('src') or attrs.get('href')
+            if url:
+                features.resource_urls.append((tag, url))
+
+        if tag == 'script':
+            if attrs.get('src'):
+                features.script_srcs.append(attrs['src'])
+            self._script = (attrs.get('type', '').strip().lower() == LD_JSON_TYPE, [])
+        elif tag == 'meta':
+            features.meta_tags.append({
+                'name': attrs.get('name', '').lower(),
+                'property': attrs.get('property', '').lower(),
+                'content': attrs.get('content', '')
+            })
+        elif tag == 'form':
+            self._form_depth += 1
+        elif tag == 'input' and self._form_depth and attrs.get('type', '').lower() == 'hidden':
+            features.hidden_form_inputs.append(attrs.get('name', '').lower())
+
+    def handle_endtag(self, tag):
+        if tag == 'script' and self._script is not None:
+            is_ld_json, parts = self._script
+            self._script = None
+            content = ''.join(parts)
+            if content:
+                self.features.inline_scripts.append(content)
+                if is_ld_json:
+                    self.features.json_ld.append(content)
+        elif tag == 'form' and self._form_depth:
+            self._form_depth -= 1
+
+    def handle_data(self, data):
+        if self._script is not None:
+            self._script[1].append(data)
+
+
+def extract_dom_features(html: str) -> DomFeatures:
+    """
+    Calcula todas las features derivadas del DOM en un único recorrido del
+    HTML (recursos de terceros, scripts, JSON-LD, formularios, clases y meta
+    tags), en lugar de un `find_all` por cada análisis.
+    """
+    features = DomFeatures()
+    visitor = _DomFeatureVisitor(features)
+    try:
+        visitor.feed(html)
+        visitor.close()
+    except Exception:
+        # HTML roto: se devuelve lo extraído hasta el error
+        pass
+    return features
@@ -0,0 +1,74 @@
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+_RULES = ''  # Clave reservada del nodo: ninguna etiqueta de host es vacía
+
+
+class HostSuffixTrie:
+    """
+    Trie de etiquetas de host invertidas ("net" -> "facebook" -> "connect").
+    Clasifica un hostname en O(nº de etiquetas) y solo coincide en límites
+    de etiqueta: "notfacebook.net" no coincide con "facebook.net".
+
+    Una entrada puede llevar un prefijo de ruta ("facebook.com/tr"): en ese
+    caso solo cuenta para URLs de ese host que empiecen por esa ruta.
+    """
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, entry: str, category: str):
+        host, _, path = entry.lower().partition('/')
+        node = self._root
+        for label in reversed(host.strip('.').split('.')):
+            node = node.setdefault(label, {})
+        node.setdefault(_RULES, []).append((category, '/' + path if path else None, entry))
+
+    def lookup(self, host: str) -> List[Tuple[str, Optional[str], str]]:
+        """Reglas (categoría, prefijo de ruta, entrada) de todos los sufijos del host, la más específica primero"""
+        found = []
+        node = self._root
+        for label in reversed(host.lower().strip('.').split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            found.extend(node.get(_RULES, ()))
+        found.reverse()
+        return found
+
+    def classify_url(self, url) -> Optional[Tuple[str, str]]:
+        """
+        Clasifica una URL (str o resultado de urlparse) contra el catálogo.
+        Devuelve (categoría, entrada del catálogo) o None.
+        """
+        parsed = urlparse(url) if isinstance(url, str) else url
+        host = parsed.hostname
+        if not host:
+            return None
+        path = parsed.path or '/'
+        for category, path_prefix, entry in self.lookup(host):
+            # El prefijo de ruta también respeta límites de segmento ("/tr" no es "/track")
+            if path_prefix is None or path == path_prefix or path.startswith(path_prefix + '/'):
+                return category, entry
+        return None
+
+    def classify_host(self, host: str, categories: Optional[Tuple[str, ...]] = None) -> Optional[str]:
+        """
+        Categoría del host, opcionalmente restringida a `categories`. Las
+        entradas con prefijo de ruta no cuentan ("instagram.com/embed.js" no
+        clasifica todo instagram.com): para esas hay que usar `classify_url`.
+        Devuelve None si no está en el catálogo.
+        """
+        for category, path_prefix, _ in self.lookup(host.split(':')[0]):
+            if path_prefix is None and (categories is None or category in categories):
+                return category
+        return None
+
+
+def build_trie(catalog: Dict[str, List[str]]) -> HostSuffixTrie:
+    """Construye el trie a partir de un catálogo categoría -> [hosts]"""
+    trie = HostSuffixTrie()
+    for category, entries in catalog.items():
+        for entry in entries:
+            trie.add(entry, category)
+    return trie
@@ -0,0 +1,60 @@
+import re
+from typing import Optional
+
+# Bytes iniciales suficientes para ver <title> y los marcadores del interstitial
+HEAD_BYTES = 16 * 1024
+
+LOGIN_WALL = 'login_wall'
+CHECKPOINT = 'checkpoint'
+CONSENT = 'consent'
+
+_TITLE_RE = re.compile(rb'<title[^>]{0,100}>([^<]{0,200})', re.IGNORECASE)
+
+# Rutas a las que redirige Facebook cuando no deja ver la página sin sesión
+_URL_MARKERS = (
+    (CHECKPOINT, ('/checkpoint',)),
+    (LOGIN_WALL, ('/login/', '/login.php', '/login?', '/recover/')),
+    (CONSENT, ('/privacy/consent', '/cookie/consent', 'consent.facebook.com'))
+)
+
+# Títulos (en minúsculas) de las pantallas intermedias, en inglés y español
+_TITLE_MARKERS = (
+    (CHECKPOINT, (b'security check', b'control de seguridad')),
+    (LOGIN_WALL, (b'log in to facebook', b'log into facebook', b'log in or sign up',
+                  b'inicia sesi', b'iniciar sesi')),
+    (CONSENT, (b'use of cookies', b'uso de cookies'))
+)
+
+# Marcadores de cuerpo que solo aparecen en el interstitial
+_BODY_MARKERS = (
+    (CHECKPOINT, (b'id="checkpointsubmitbutton"', b'/checkpoint/block', b'checkpoint_title')),
+)
+
+
+def classify_facebook_response(head: bytes, final_url: str = '') -> Optional[str]:
+    """
+    Clasifica una respuesta de facebook.com a partir de la URL final y los
+    primeros KB del cuerpo, sin parsear el HTML.
+
+    Devuelve 'login_wall', 'checkpoint', 'consent' o None si parece una
+    página normal.
+    """
+    url = final_url.lower()
+    for kind, markers in _URL_MARKERS:
+        if any(marker in url for marker in markers):
+            return kind
+
+    head = head[:HEAD_BYTES].lower()
+
+    match = _TITLE_RE.search(head)
+    if match:
+        title = match.group(1)
+        for kind, markers in _TITLE_MARKERS:
+            if any(marker in title for marker in markers):
+                return kind
+
+    for kind, markers in _BODY_MARKERS:
+        if any(marker in head for marker in markers):
+            return kind
+
+    return None
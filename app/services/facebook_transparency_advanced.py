@@ -5,6 +5,10 @@ from urllib.parse import quote
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
 import logging
+from .circuit_breaker import (
+    FACEBOOK_UPSTREAM, FAILURE_STATUS_CODES, UPSTREAM_UNAVAILABLE, get_breaker
+)
+from .facebook_interstitials import HEAD_BYTES, classify_facebook_response
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,11 @@ class FacebookTransparencyAdvanced:
             
             for search_term in search_strategies:
                 result = await self._search_facebook_page(search_term, domain)
+                
+                # Facebook no disponible: no seguir probando estrategias
+                if result and result.get('skipped'):
+                    return best_result or result
+                
                 if result and result.get('confidence', 0) > max_confidence:
                     best_result = result
                     max_confidence = result.get('confidence', 0)
@@ -65,8 +74,48 @@ class FacebookTransparencyAdvanced:
                 'source': 'facebook_transparency_advanced'
             }
     
+    def _upstream_unavailable(self, domain: str, interstitial: str = None) -> dict:
+        """Resultado de fallo rápido cuando Facebook no deja ver la página (circuito abierto o interstitial)"""
+        result = {
+            'domain': domain,
+            'has_ads_in_circulation': False,
+            'page_found': False,
+            'confidence': 0,
+            'skipped': UPSTREAM_UNAVAILABLE,
+            'source': 'facebook_transparency_advanced',
+            'message': 'Facebook no disponible temporalmente (circuito abierto)'
+        }
+        if interstitial:
+            result['interstitial'] = interstitial
+            result['message'] = f'Facebook respondió con una pantalla intermedia ({interstitial})'
+        return result
+    
+    async def _read_page(self, response) -> tuple:
+        """
+        Lee los primeros KB de la respuesta y, si es un login wall / checkpoint /
+        consentimiento, devuelve (tipo, None) sin descargar ni parsear el resto.
+        En otro caso devuelve (None, html).
+        """
+        head = b''
+        while len(head) < HEAD_BYTES:
+            chunk = await response.content.read(HEAD_BYTES - len(head))
+            if not chunk:
+                break
+            head += chunk
+        
+        interstitial = classify_facebook_response(head, str(response.url))
+        if interstitial:
+            return interstitial, None
+        
+        body = head + await response.content.read()
+        return None, body.decode(response.charset or 'utf-8', errors='replace')
+    
     async def _search_facebook_page(self, search_term: str, original_domain: str) -> dict:
         """Busca la página específica en Facebook"""
+        breaker = get_breaker(FACEBOOK_UPSTREAM)
+        if not breaker.allow_request():
+            return self._upstream_unavailable(original_domain)
+        
         try:
             headers = {
                 'User-Agent': self.ua.random,
@@ -82,10 +131,20 @@ class FacebookTransparencyAdvanced:
             
             async with aiohttp.ClientSession() as session:
                 async with session.get(search_url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status in FAILURE_STATUS_CODES:
+                        breaker.record_failure(f"HTTP {response.status}")
+                        return self._upstream_unavailable(original_domain) if breaker.state == breaker.OPEN else None
                     if response.status != 200:
+                        breaker.record_success()
                         return None
                     
-                    content = await response.text()
+                    interstitial, content = await self._read_page(response)
+                    if interstitial:
+                        # Sin sesión no hay resultados: no parsear ni seguir pidiendo páginas
+                        breaker.record_failure(interstitial)
+                        return self._upstream_unavailable(original_domain, interstitial)
+                    breaker.record_success()
+                    
                     soup = BeautifulSoup(content, 'html.parser')
                     
                     # Buscar enlaces a páginas que coincidan con nuestro dominio
@@ -101,6 +160,7 @@ class FacebookTransparencyAdvanced:
             return None
             
         except Exception as e:
+            breaker.record_failure(type(e).__name__)
             logger.error(f"Error buscando página de Facebook: {e}")
             return None
     
@@ -130,6 +190,10 @@ class FacebookTransparencyAdvanced:
     
     async def _check_page_transparency(self, page_url: str, domain: str) -> dict:
         """Verifica la sección de transparencia de una página específica"""
+        breaker = get_breaker(FACEBOOK_UPSTREAM)
+        if not breaker.allow_request():
+            return self._upstream_unavailable(domain)
+        
         try:
             headers = {
                 'User-Agent': self.ua.random,
@@ -141,10 +205,20 @@ class FacebookTransparencyAdvanced:
             async with aiohttp.ClientSession() as session:
                 # Ir a la página principal
                 async with session.get(page_url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status in FAILURE_STATUS_CODES:
+                        breaker.record_failure(f"HTTP {response.status}")
+                        return self._upstream_unavailable(domain) if breaker.state == breaker.OPEN else None
                     if response.status != 200:
+                        breaker.record_success()
                         return None
                     
-                    content = await response.text()
+                    interstitial, content = await self._read_page(response)
+                    if interstitial:
+                        # Login wall / checkpoint / consentimiento: evitar el parseo completo
+                        breaker.record_failure(interstitial)
+                        return self._upstream_unavailable(domain, interstitial)
+                    breaker.record_success()
+                    
                     soup = BeautifulSoup(content, 'html.parser')
                     
                     # Buscar la sección de transparencia
@@ -202,6 +276,7 @@ class FacebookTransparencyAdvanced:
                     }
                     
         except Exception as e:
+            breaker.record_failure(type(e).__name__)
             logger.error(f"Error verificando transparencia en {page_url}: {e}")
             return None
     
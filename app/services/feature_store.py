@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..config import settings
+from . import scoring
+from .scoring_rules import get_scoring_rules
+from .signature_db import get_signature_db
+
+logger = logging.getLogger(__name__)
+
+# Filas que se leen de cada vez al recorrer un run
+PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    scoring_version TEXT NOT NULL,
+    signatures_version TEXT
+);
+CREATE TABLE IF NOT EXISTS domain_features (
+    run_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    features TEXT NOT NULL,
+    scores TEXT NOT NULL,
+    recorded_at REAL NOT NULL,
+    PRIMARY KEY (run_id, domain)
+) WITHOUT ROWID;
+"""
+
+
+def _library_features(result: Optional[Dict]) -> Optional[Dict]:
+    if not result:
+        return None
+    return {
+        'has_ads': result.get('has_ads', False),
+        'advertiser_found': result.get('advertiser_found', False),
+        'confidence': result.get('confidence', 0),
+        'verified_page': bool(result.get('verified_page'))
+    }
+
+
+def extract_features(pipeline: str, basic_result: Optional[Dict], advanced_result: Optional[Dict] = None,
+                     facebook_transparency: Optional[Dict] = None, signals: Optional[Dict] = None,
+                     preclassifier: Optional[Dict] = None) -> Dict:
+    """
+    Features crudas de un dominio a partir de los resultados de los
+    detectores: conteos de firmas del HTML, IDs de tracking, features del
+    DOM, registros de ads.txt, flags de las bibliotecas y de transparencia.
+    Es todo lo que necesita `scoring.score_features` (sin red). Se guarda
+    también la decisión del pre-clasificador, si la hubo.
+    """
+    detailed = (basic_result or {}).get('detailed_analysis') or {}
+    tracking = detailed.get('website_tracking') or {}
+    tracking_details = tracking.get('analysis_details') or {}
+    google = detailed.get('google_transparency')
+
+    features = {
+        'pipeline': pipeline,
+        'tracking': tracking_details.get('score_features'),
+        'tracking_ids': tracking_details.get('tracking_ids', {}),
+        # Bytes leídos y motivo del corte: con `truncated` las features son de un prefijo de la home
+        'tracking_scan': tracking_details.get('scan'),
+        'facebook_library': _library_features(detailed.get('facebook_ad_library')),
+        'google_transparency': _library_features(google),
+        'ads_txt': (google or {}).get('ads_txt'),
+        'signals': signals
+    }
+    if features['google_transparency'] is not None:
+        features['google_transparency']['total_score'] = google.get('total_score', 0)
+
+    if advanced_result and 'advanced_analysis' in advanced_result:
+        analyses = advanced_result['advanced_analysis']
+        features['advanced'] = {
+            'analysis_scores': {name: result.get('confidence_score', 0) for name, result in analyses.items()},
+            'dom_features': (analyses.get('main_page_analysis') or {}).get('dom_features'),
+            'landing_pages_found': (analyses.get('landing_pages_analysis') or {}).get('landing_pages_found', 0),
+            'tracking_ids': (analyses.get('javascript_analysis') or {}).get('tracking_ids', {})
+        }
+
+    if facebook_transparency is not None:
+        features['facebook_transparency'] = {
+            'page_found': facebook_transparency.get('page_found', False),
+            'ads_in_circulation': facebook_transparency.get('has_ads_in_circulation', False),
+            'confidence': facebook_transparency.get('confidence', 0)
+        }
+
+    if preclassifier is not None:
+        features['preclassifier'] = preclassifier
+    return features
+
+
+class FeatureStore:
+    """
+    Almacén en disco (SQLite) de las features crudas de cada dominio por
+    run, separadas de los scores calculados en ese momento. Permite volver
+    a puntuar un run completo con otra fórmula sin tocar la red
+    (ver `rescore.py`).
+    """
+
+    def __init__(self, path: str = settings.FEATURE_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def start_run(self, source: str, run_id: Optional[str] = None) -> str:
+        """Registra un run (si ya existe se reutiliza) y devuelve su id"""
+        run_id = run_id or f"{source}-{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, source, created_at, scoring_version, signatures_version) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, source, time.time(), get_scoring_rules().version, get_signature_db().version)
+            )
+        return run_id
+
+    def record(self, run_id: str, domain: str, features: Dict) -> Dict:
+        """
+        Guarda (o reemplaza) las features de un dominio en un run, junto con
+        los scores que dan las fórmulas actuales, y devuelve esos scores.
+        """
+        scores = scoring.score_features(features)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO domain_features (run_id, domain, features, scores, recorded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (run_id, domain, json.dumps(features, default=str), json.dumps(scores, default=str), time.time())
+            )
+        return scores
+
+    def runs(self) -> List[Dict]:
+        """Runs guardados con su número de dominios (más recientes primero)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT r.run_id, r.source, r.created_at, r.scoring_version, r.signatures_version, "
+                "(SELECT COUNT(*) FROM domain_features f WHERE f.run_id = r.run_id) "
+                "FROM runs r ORDER BY r.created_at DESC"
+            ).fetchall()
+        return [
+            {
+                'run_id': row[0],
+                'source': row[1],
+                'created_at': row[2],
+                'scoring_version': row[3],
+                'signatures_version': row[4],
+                'domains': row[5]
+            }
+            for row in rows
+        ]
+
+    def iter_run(self, run_id: str) -> Iterator[Tuple[str, Dict, Dict]]:
+        """Recorre (dominio, features, scores guardados) de un run por páginas, sin cargarlo entero"""
+        last_domain = ''
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT domain, features, scores FROM domain_features "
+                    "WHERE run_id = ? AND domain > ? ORDER BY domain LIMIT ?",
+                    (run_id, last_domain, PAGE_SIZE)
+                ).fetchall()
+            if not rows:
+                return
+            for domain, features, scores in rows:
+                yield domain, json.loads(features), json.loads(scores)
+            last_domain = rows[-1][0]
+
+
+_store: Optional[FeatureStore] = None
+
+
+def get_feature_store() -> FeatureStore:
+    """Almacén compartido (se abre la primera vez que se usa)"""
+    global _store
+    if _store is None:
+        _store = FeatureStore()
+    return _store
@@ -0,0 +1,380 @@
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from ..config import settings
+from .circuit_breaker import CircuitOpenError, FAILURE_STATUS_CODES, get_breaker
+from .signatures import SignatureScanner
+
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]{0,200}?charset\s*=\s*["\']?\s*([a-zA-Z0-9_-]{1,40})', re.IGNORECASE)
+
+
+def decode_html(body: bytes, declared_charset: Optional[str] = None) -> str:
+    """
+    Decodifica HTML sin detección estadística de charset: usa el charset del
+    Content-Type, si no el de <meta charset> de los primeros KB y, por
+    último, utf-8 reemplazando bytes inválidos.
+    """
+    candidates = [declared_charset]
+    match = _META_CHARSET_RE.search(body[:4096])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    for charset in candidates:
+        if not charset:
+            continue
+        try:
+            return body.decode(charset, errors='replace')
+        except LookupError:
+            continue
+    return body.decode('utf-8', errors='replace')
+
+
+class ScanResult:
+    """Resultado de una descarga escaneada en streaming"""
+
+    def __init__(self, url: str, status_code: int, headers, body: bytes,
+                 bytes_read: int, truncated: bool, stop_reason: str,
+                 charset: Optional[str] = None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body  # Prefijo descargado, sin decodificar
+        self.charset = charset  # Charset declarado en Content-Type (si lo hay)
+        self.bytes_read = bytes_read
+        self.truncated = truncated
+        self.stop_reason = stop_reason  # 'eof', 'signatures_decided', 'byte_cap', 'cpu_budget', 'rejected' o el del consumidor
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        """HTML decodificado; solo se calcula si alguien necesita parsear el DOM"""
+        if self._text is None:
+            self._text = decode_html(self.body, self.charset)
+        return self._text
+
+    def scan_info(self) -> Dict:
+        return {
+            'bytes_read': self.bytes_read,
+            'truncated': self.truncated,
+            'stop_reason': self.stop_reason
+        }
+
+
+def replay(page: ScanResult, scanner: SignatureScanner, chunk_size: int = 64 * 1024) -> ScanResult:
+    """
+    Pasa un cuerpo ya descargado (con `keep_body`) por otro consumidor sin
+    volver a la red, con los mismos cortes que `HttpFetcher.scan`. Si la
+    descarga original se cortó y el consumidor no decide antes, el
+    resultado conserva ese `stop_reason`.
+    """
+    if hasattr(scanner, 'accepts') and not scanner.accepts(page.status_code, page.headers):
+        return ScanResult(page.url, page.status_code, page.headers, b'', 0, True, 'rejected', page.charset)
+
+    body = page.body
+    offset = 0
+    stop_reason = 'eof'
+    while offset < len(body):
+        chunk = body[offset:offset + chunk_size]
+        offset += len(chunk)
+        if scanner.feed(chunk):
+            if scanner.budget_exhausted:
+                stop_reason = 'cpu_budget'
+            else:
+                stop_reason = getattr(scanner, 'stop_reason', None) or 'signatures_decided'
+            break
+    if stop_reason == 'eof':
+        if page.truncated:
+            stop_reason = page.stop_reason
+        elif hasattr(scanner, 'close'):
+            scanner.close()
+    return ScanResult(
+        url=page.url,
+        status_code=page.status_code,
+        headers=page.headers,
+        body=body[:offset],
+        bytes_read=offset,
+        truncated=stop_reason != 'eof',
+        stop_reason=stop_reason,
+        charset=page.charset
+    )
+
+
+class _PrefixReader:
+    """Consumidor nulo para `scan`: solo interesa el prefijo del cuerpo"""
+
+    budget_exhausted = False
+
+    def feed(self, chunk) -> bool:
+        return False
+
+
+def _close_loser(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
+
+
+class HttpFetcher:
+    """
+    Capa compartida de descarga HTTP para los sitios objetivo.
+
+    Reutiliza un único cliente con pool de conexiones y, opcionalmente,
+    lanza peticiones "hedged": si un GET no recibe las cabeceras antes del
+    percentil de latencia aprendido (tiempo hasta cabeceras de los GET
+    recientes), se abre una segunda petición idéntica, se queda la primera
+    que responde y la otra se cancela o se cierra. El cuerpo se lee después
+    solo de la ganadora, así que también los escaneos en streaming usan
+    hedging. Las peticiones extra están limitadas por un presupuesto
+    (fracción de las peticiones normales). Cada host tiene su propio circuit
+    breaker: con el circuito abierto se lanza `CircuitOpenError` sin tocar
+    la red.
+    """
+
+    def __init__(self, hedging: bool = settings.HTTP_HEDGING_ENABLED,
+                 hedge_percentile: float = settings.HTTP_HEDGE_PERCENTILE,
+                 hedge_budget: float = settings.HTTP_HEDGE_BUDGET,
+                 min_samples: int = settings.HTTP_HEDGE_MIN_SAMPLES):
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.min_samples = min_samples
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        self._latencies = deque(maxlen=500)
+        # Tokens para peticiones extra: cada petición normal suma `hedge_budget`
+        self._hedge_tokens = 1.0
+
+        self.counters = {
+            'requests': 0,
+            'hedges_fired': 0,
+            'hedges_won': 0,
+            'hedges_denied_budget': 0
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Cliente compartido (uno por event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            )
+            self._client_loop = loop
+        return self._client
+
+    def hedge_delay(self) -> Optional[float]:
+        """Segundos a esperar antes de lanzar la petición de respaldo"""
+        if len(self._latencies) < self.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile))
+        return ordered[index]
+
+    def _reserve_hedge(self) -> bool:
+        """Consume un token del presupuesto de peticiones extra"""
+        if self._hedge_tokens >= 1.0:
+            self._hedge_tokens -= 1.0
+            return True
+        self.counters['hedges_denied_budget'] += 1
+        return False
+
+    async def _timed_open(self, url: str, headers: Optional[Dict], timeout: float,
+                          record_cancelled: bool = False) -> httpx.Response:
+        """Abre un GET en streaming: vuelve con las cabeceras recibidas y el cuerpo sin leer"""
+        client = self._get_client()
+        started = time.monotonic()
+        try:
+            response = await client.send(client.build_request('GET', url, headers=headers, timeout=timeout), stream=True)
+        except asyncio.CancelledError:
+            # Una primaria cancelada (ganó el respaldo) tardaba al menos esto: sin la muestra,
+            # las lentas nunca cuentan y el percentil deriva hacia abajo
+            if record_cancelled:
+                self._latencies.append(time.monotonic() - started)
+            raise
+        self._latencies.append(time.monotonic() - started)
+        return response
+
+    async def get(self, url: str, headers: Optional[Dict] = None, timeout: float = 15,
+                  hedge: Optional[bool] = None) -> httpx.Response:
+        """GET con circuit breaker por host y hedging opcional (por defecto según configuración)"""
+        breaker = get_breaker(urlparse(url).hostname or url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name)
+
+        try:
+            response = await self._hedged_open(url, headers, timeout, hedge)
+            try:
+                await response.aread()
+            finally:
+                await response.aclose()
+        except Exception as e:
+            breaker.record_failure(type(e).__name__)
+            raise
+
+        if response.status_code in FAILURE_STATUS_CODES:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success()
+        return response
+
+    async def head(self, url: str, headers: Optional[Dict] = None, timeout: float = 10) -> httpx.Response:
+        """HEAD con el mismo cliente compartido y circuit breaker por host (sin hedging)"""
+        breaker = get_breaker(urlparse(url).hostname or url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name)
+
+        self.counters['requests'] += 1
+        try:
+            response = await self._get_client().head(url, headers=headers, timeout=timeout)
+        except Exception as e:
+            breaker.record_failure(type(e).__name__)
+            raise
+
+        if response.status_code in FAILURE_STATUS_CODES:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success()
+        return response
+
+    async def fetch_prefix(self, url: str, headers: Optional[Dict] = None, timeout: float = 10,
+                           max_bytes: int = 4096) -> ScanResult:
+        """
+        GET con Range que solo lee los primeros `max_bytes` del cuerpo (aunque
+        el servidor ignore el Range, la descarga se corta al llegar al tope).
+        """
+        headers = {**(headers or {}), 'Range': f'bytes=0-{max_bytes - 1}'}
+        return await self.scan(url, _PrefixReader(), headers=headers, timeout=timeout, max_bytes=max_bytes)
+
+    async def _hedged_open(self, url: str, headers: Optional[Dict], timeout: float,
+                           hedge: Optional[bool]) -> httpx.Response:
+        """
+        Apertura (hasta las cabeceras) con hedging. Devuelve la respuesta
+        ganadora en streaming; el llamador debe cerrarla.
+        """
+        self.counters['requests'] += 1
+        self._hedge_tokens = min(5.0, self._hedge_tokens + self.hedge_budget)
+
+        hedge = self.hedging if hedge is None else hedge
+        delay = self.hedge_delay() if hedge else None
+        if delay is None:
+            return await self._timed_open(url, headers, timeout)
+
+        primary = asyncio.create_task(self._timed_open(url, headers, timeout, record_cancelled=True))
+        tasks = {primary}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._reserve_hedge():
+                winner = primary
+                return await primary
+
+            self.counters['hedges_fired'] += 1
+            backup = asyncio.create_task(self._timed_open(url, headers, timeout))
+            tasks.add(backup)
+
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.counters['hedges_won'] += 1
+                        winner = task
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    # La perdedora se cancela; si ya tenía cabeceras, se cierra su conexión
+                    task.add_done_callback(_close_loser)
+                    task.cancel()
+
+    async def scan(self, url: str, scanner: SignatureScanner, headers: Optional[Dict] = None,
+                   timeout: float = 15, max_bytes: int = settings.HTTP_MAX_BODY_BYTES,
+                   keep_body: bool = True, hedge: Optional[bool] = None) -> ScanResult:
+        """
+        Descarga en streaming alimentando el escáner de firmas trozo a trozo.
+        Corta la descarga cuando todas las familias están decididas, al
+        llegar a `max_bytes` o si se agota el presupuesto de CPU del escáner;
+        `truncated` indica si no se leyó la página entera.
+        El escáner puede ser cualquier consumidor con `feed(chunk) -> bool` y
+        `budget_exhausted` (p. ej. el parser de ads.txt); con `keep_body=False`
+        no se guarda el cuerpo. Si el consumidor tiene `close()` se llama
+        cuando el cuerpo se leyó entero (no si la descarga se cortó). Si tiene
+        `accepts(status_code, headers) -> bool` se consulta antes de leer el
+        cuerpo: con False no se descarga (stop_reason 'rejected'). Un
+        consumidor que corta por su cuenta puede dar el motivo en `stop_reason`.
+        El hedging (`hedge`, por defecto según configuración) solo cubre la
+        espera de las cabeceras: el cuerpo se lee de la respuesta ganadora.
+        """
+        breaker = get_breaker(urlparse(url).hostname or url)
+        if not breaker.allow_request():
+            raise CircuitOpenError(breaker.name)
+
+        try:
+            response = await self._hedged_open(url, headers, timeout, hedge)
+            try:
+                if response.status_code in FAILURE_STATUS_CODES:
+                    breaker.record_failure(f"HTTP {response.status_code}")
+                else:
+                    breaker.record_success()
+
+                # Se escanean los bytes tal cual llegan: sin decodificar ni detectar charset
+                body = bytearray()
+                bytes_read = 0
+                stop_reason = 'eof'
+                if hasattr(scanner, 'accepts') and not scanner.accepts(response.status_code, response.headers):
+                    stop_reason = 'rejected'
+                else:
+                    async for chunk in response.aiter_bytes():
+                        bytes_read += len(chunk)
+                        if keep_body:
+                            body += chunk
+                        if scanner.feed(chunk):
+                            if scanner.budget_exhausted:
+                                stop_reason = 'cpu_budget'
+                            else:
+                                stop_reason = getattr(scanner, 'stop_reason', None) or 'signatures_decided'
+                            break
+                        if bytes_read >= max_bytes:
+                            stop_reason = 'byte_cap'
+                            break
+                    if stop_reason == 'eof' and hasattr(scanner, 'close'):
+                        scanner.close()
+
+                return ScanResult(
+                    url=str(response.url),
+                    status_code=response.status_code,
+                    headers=response.headers,
+                    body=bytes(body),
+                    bytes_read=bytes_read,
+                    truncated=stop_reason != 'eof',
+                    stop_reason=stop_reason,
+                    charset=response.charset_encoding
+                )
+            finally:
+                await response.aclose()
+        except Exception as e:
+            breaker.record_failure(type(e).__name__)
+            raise
+
+    def stats(self) -> Dict:
+        """Contadores de uso y de hedging"""
+        delay = self.hedge_delay()
+        return {
+            'hedging_enabled': self.hedging,
+            'hedge_delay_ms': round(delay * 1000, 1) if delay is not None else None,
+            **self.counters
+        }
+
+
+# Instancia compartida por todos los detectores
+http_fetcher = HttpFetcher()
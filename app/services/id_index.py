@@ -0,0 +1,186 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Tipos de ID que identifican a un anunciante en Facebook
+FACEBOOK_ID_TYPES = ('meta_pixel',)
+
+# Confianza mínima de la página de Facebook encontrada para ligarle los píxeles
+VERIFIED_MIN_CONFIDENCE = 60
+
+# Cada cuánto se vuelve a mirar si hay páginas verificadas mientras no haya ninguna
+# (otro proceso, p. ej. un worker de gunicorn o process_csv, puede haberlas añadido)
+HAS_VERIFIED_RECHECK_SECONDS = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_domains (
+    id_type TEXT NOT NULL,
+    id_value TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (id_type, id_value, domain)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_id_domains_domain ON id_domains (domain);
+CREATE INDEX IF NOT EXISTS idx_id_domains_value ON id_domains (id_value);
+CREATE TABLE IF NOT EXISTS verified_pages (
+    id_type TEXT NOT NULL,
+    id_value TEXT NOT NULL,
+    page_url TEXT NOT NULL,
+    source_domain TEXT NOT NULL,
+    confidence INTEGER NOT NULL,
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (id_type, id_value)
+) WITHOUT ROWID;
+"""
+
+
+class TrackingIdIndex:
+    """
+    Índice invertido en disco (SQLite) de IDs de píxel / conversión:
+    ID -> dominios y dominio -> IDs, más la página de Facebook verificada
+    a la que está ligado cada píxel. Las búsquedas van por clave primaria
+    o índice, así que tardan milisegundos aunque haya millones de filas.
+    """
+
+    def __init__(self, path: str = settings.ID_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._has_verified = None
+        self._has_verified_checked_at: Optional[float] = None
+
+    def record(self, domain: str, ids: Dict[str, List[str]]):
+        """Guarda los IDs encontrados en un dominio"""
+        now = time.time()
+        rows = [(id_type, value, domain, now, now) for id_type, values in ids.items() for value in values]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO id_domains (id_type, id_value, domain, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (id_type, id_value, domain) DO UPDATE SET last_seen = excluded.last_seen",
+                rows
+            )
+
+    def domains_for(self, id_type: str, id_value: str) -> List[str]:
+        """Dominios en los que se ha visto un ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT domain FROM id_domains WHERE id_type = ? AND id_value = ? ORDER BY first_seen",
+                (id_type, id_value)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def ids_for(self, domain: str) -> Dict[str, List[str]]:
+        """IDs vistos en un dominio, por tipo"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id_type, id_value FROM id_domains WHERE domain = ? ORDER BY id_type, id_value",
+                (domain,)
+            ).fetchall()
+        ids: Dict[str, List[str]] = {}
+        for id_type, value in rows:
+            ids.setdefault(id_type, []).append(value)
+        return ids
+
+    def mark_verified(self, domain: str, page_url: str, confidence: int) -> int:
+        """
+        Liga los píxeles del dominio a su página de Facebook verificada.
+        Devuelve cuántos IDs quedaron ligados.
+        """
+        ids = self.ids_for(domain)
+        now = time.time()
+        rows = [
+            (id_type, value, page_url, domain, confidence, now)
+            for id_type in FACEBOOK_ID_TYPES for value in ids.get(id_type, [])
+        ]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO verified_pages "
+                "(id_type, id_value, page_url, source_domain, confidence, verified_at) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        self._has_verified = True
+        return len(rows)
+
+    def has_verified(self) -> bool:
+        """Hay al menos un píxel ligado a una página (evita esperar por IDs si no)"""
+        now = time.monotonic()
+        if not self._has_verified and (self._has_verified_checked_at is None
+                                       or now - self._has_verified_checked_at >= HAS_VERIFIED_RECHECK_SECONDS):
+            with self._lock:
+                self._has_verified = self._conn.execute("SELECT 1 FROM verified_pages LIMIT 1").fetchone() is not None
+            self._has_verified_checked_at = now
+        return self._has_verified
+
+    def verified_page_for(self, ids: Dict[str, List[str]],
+                          max_age: Optional[float] = settings.ID_INDEX_VERIFIED_TTL_HOURS * 3600) -> Optional[Dict]:
+        """
+        Página verificada ligada a alguno de los IDs indicados (la de mayor
+        confianza). Los vínculos verificados hace más de `max_age` segundos
+        se ignoran (None: sin caducidad).
+        """
+        pairs = [(id_type, value) for id_type in FACEBOOK_ID_TYPES for value in ids.get(id_type, [])]
+        min_verified_at = time.time() - max_age if max_age is not None else 0
+        best = None
+        with self._lock:
+            for id_type, value in pairs:
+                row = self._conn.execute(
+                    "SELECT page_url, source_domain, confidence, verified_at FROM verified_pages "
+                    "WHERE id_type = ? AND id_value = ? AND verified_at >= ?",
+                    (id_type, value, min_verified_at)
+                ).fetchone()
+                if row and (best is None or row[2] > best['confidence']):
+                    best = {
+                        'id_type': id_type,
+                        'id_value': value,
+                        'page_url': row[0],
+                        'source_domain': row[1],
+                        'confidence': row[2],
+                        'verified_at': row[3]
+                    }
+        return best
+
+    def lookup(self, id_value: str, id_types: Iterable[str] = ()) -> Dict:
+        """Dominios y página verificada de un ID (buscando en todos los tipos si no se indican)"""
+        with self._lock:
+            if id_types:
+                types = list(id_types)
+            else:
+                types = [row[0] for row in self._conn.execute(
+                    "SELECT DISTINCT id_type FROM id_domains WHERE id_value = ?", (id_value,)
+                ).fetchall()]
+        result = {}
+        for id_type in types:
+            result[id_type] = {
+                'domains': self.domains_for(id_type, id_value),
+                'verified_page': self.verified_page_for({id_type: [id_value]}, max_age=None)
+            }
+        return result
+
+
+_index: Optional[TrackingIdIndex] = None
+
+
+def get_id_index() -> TrackingIdIndex:
+    """Índice compartido (se abre la primera vez que se usa)"""
+    global _index
+    if _index is None:
+        _index = TrackingIdIndex()
+    return _index
@@ -0,0 +1,348 @@
+"""
+Re-escaneo incremental de una lista de dominios que ya se analizó.
+
+Por cada dominio se guarda el hash del contenido de la home y sus
+validadores HTTP (ETag / Last-Modified) junto con las features crudas del
+último análisis completo. El hash es del mismo prefijo que lee el escáner
+(hasta HTTP_MAX_BODY_BYTES) sin los tokens que cambian en cada respuesta
+(nonces, tokens CSRF, timestamps). Al volver a escanear se hace un GET
+condicional de la home: con 304 o con el mismo hash se reutilizan las
+features y solo
+se vuelve a consultar la transparencia de Facebook si caducó su TTL; los
+scores se recalculan con `scoring.score_features` (sin red). Solo los
+dominios nuevos, cambiados o con features demasiado antiguas pasan por el
+análisis completo (ultra + transparencia de Facebook), que reutiliza la
+home ya descargada por el GET condicional.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from ..config import settings
+from . import scoring
+from .deadline import Deadline
+from .facebook_transparency_advanced import FacebookTransparencyAdvanced
+from .feature_store import extract_features, get_feature_store
+from .http_fetcher import ScanResult, http_fetcher
+from .result_store import canonical_domain, get_result_store
+from .ultra_detector import UltraAdvancedDetector
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS domain_state (
+    domain TEXT PRIMARY KEY,
+    url TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    features TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    checked_at REAL NOT NULL,
+    facebook_page_url TEXT,
+    facebook_checked_at REAL
+) WITHOUT ROWID;
+"""
+
+_COLUMNS = (
+    'domain', 'url', 'etag', 'last_modified', 'content_hash', 'features',
+    'analyzed_at', 'checked_at', 'facebook_page_url', 'facebook_checked_at'
+)
+
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+}
+
+
+# Partes del HTML que cambian en cada respuesta sin que cambie la página: atributos nonce,
+# valores opacos largos (tokens CSRF, hashes de sesión) y timestamps de 10-13 dígitos
+_VOLATILE_RE = re.compile(rb'nonce="[^"]*"|="[A-Za-z0-9+/_-]{24,}={0,2}"|\b\d{10,13}\b')
+
+
+def content_hash(body: bytes) -> str:
+    """Hash del HTML sin las partes volátiles"""
+    return hashlib.sha256(_VOLATILE_RE.sub(b'', body)).hexdigest()
+
+
+class _BodyReader:
+    """Consumidor de `http_fetcher.scan` que no corta: el cuerpo se queda en el resultado"""
+
+    budget_exhausted = False
+
+    def feed(self, chunk) -> bool:
+        return False
+
+
+class RescanState:
+    """Estado en disco (SQLite) de cada dominio monitorizado"""
+
+    def __init__(self, path: str = settings.RESCAN_STATE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, domain: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM domain_state WHERE domain = ?", (domain,)
+            ).fetchone()
+        if not row:
+            return None
+        state = dict(zip(_COLUMNS, row))
+        state['features'] = json.loads(state['features'])
+        return state
+
+    def save(self, state: Dict):
+        values = dict(state, features=json.dumps(state['features'], default=str))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO domain_state ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [values.get(column) for column in _COLUMNS]
+            )
+
+
+class IncrementalScanner:
+    """
+    Análisis de dominios ya conocidos reutilizando lo que no cambió. Cada
+    resultado indica el modo: 'full' (análisis completo), 'not_modified'
+    (304), 'same_content' (mismo hash); `facebook_refreshed` indica si se
+    volvió a consultar la transparencia de Facebook.
+
+    Un análisis completo degradado (etapas con error, fuera de tiempo u
+    omitidas, home inaccesible, Facebook no disponible) se indica en
+    `degraded`: no se guarda como referencia (se repite en la siguiente
+    pasada) ni se registra en los almacenes.
+    """
+
+    def __init__(self, state: Optional[RescanState] = None,
+                 facebook_ttl: float = settings.RESCAN_FACEBOOK_TTL_HOURS * 3600,
+                 max_age: float = settings.RESCAN_MAX_AGE_DAYS * 86400):
+        self.state = state or get_rescan_state()
+        self.facebook_ttl = facebook_ttl
+        self.max_age = max_age
+        self.ultra_detector = UltraAdvancedDetector()
+        self.fb_transparency = FacebookTransparencyAdvanced()
+        self.counters = {'full': 0, 'not_modified': 0, 'same_content': 0, 'facebook_refreshed': 0, 'degraded': 0}
+
+    async def scan(self, domain: str, run_id: Optional[str] = None, deadline_ms: Optional[int] = None,
+                   force: bool = False) -> Dict:
+        """
+        Re-escanea un dominio. Con `run_id` las features y el resultado se
+        guardan en el feature store y en el almacén de resultados.
+        """
+        domain = canonical_domain(domain)
+        now = time.time()
+        previous = None if force else self.state.get(domain)
+        if previous and now - previous['analyzed_at'] > self.max_age:
+            previous = None
+
+        probe = await self._probe(domain, previous)
+        unchanged = bool(previous and probe and (
+            probe['not_modified'] or (probe['content_hash'] and probe['content_hash'] == previous['content_hash'])
+        ))
+
+        facebook_refreshed = False
+        degraded = []
+        if unchanged:
+            mode = 'not_modified' if probe['not_modified'] else 'same_content'
+            state = dict(previous, checked_at=now)
+            if not probe['not_modified']:
+                state.update(etag=probe['etag'], last_modified=probe['last_modified'])
+            if now - (previous['facebook_checked_at'] or 0) > self.facebook_ttl:
+                fb_result = await self._facebook_transparency(domain, previous['facebook_page_url'], deadline_ms)
+                # Si la consulta falla se conservan las features anteriores y se reintenta la próxima vez
+                if fb_result is not None:
+                    state['features'] = dict(previous['features'])
+                    state['features']['facebook_transparency'] = extract_features(
+                        'unified', None, facebook_transparency=fb_result
+                    )['facebook_transparency']
+                    state['facebook_checked_at'] = now
+                    if fb_result.get('page_url'):
+                        state['facebook_page_url'] = fb_result['page_url']
+                    facebook_refreshed = True
+        else:
+            mode = 'full'
+            page = probe['page'] if probe and not probe['not_modified'] else None
+            features, fb_result, degraded = await self._full_analysis(domain, deadline_ms, page)
+            stored = previous or self.state.get(domain)
+            facebook_ok = fb_result is not None
+            if not facebook_ok and stored and 'facebook_transparency' in stored['features']:
+                # Sin respuesta de Facebook vale lo último que se supo (hasta el próximo intento)
+                features['facebook_transparency'] = stored['features']['facebook_transparency']
+                degraded.remove('facebook_transparency')
+            # Solo un análisis completo de la home sirve de referencia para reutilizarlo
+            reference = probe if probe and not set(degraded) - {'facebook_transparency'} else {}
+            state = {
+                'domain': domain,
+                'url': probe['url'] if probe else None,
+                'etag': reference.get('etag'),
+                'last_modified': reference.get('last_modified'),
+                'content_hash': reference.get('content_hash'),
+                'features': features,
+                'analyzed_at': now,
+                'checked_at': now,
+                'facebook_page_url': fb_result.get('page_url') if facebook_ok else (stored or {}).get('facebook_page_url'),
+                'facebook_checked_at': now if facebook_ok else None
+            }
+            facebook_refreshed = facebook_ok
+
+        self.counters[mode] += 1
+        if facebook_refreshed and mode != 'full':
+            self.counters['facebook_refreshed'] += 1
+        if degraded:
+            self.counters['degraded'] += 1
+
+        scores = scoring.score_features(state['features'])
+        # Las escrituras en SQLite (commits síncronos) fuera del event loop
+        await asyncio.to_thread(self._persist, state, scores, mode, None if degraded else run_id)
+
+        return {
+            'domain': domain,
+            'mode': mode,
+            'facebook_refreshed': facebook_refreshed,
+            'degraded': degraded,
+            'analyzed_at': datetime.fromtimestamp(state['analyzed_at']).isoformat(),
+            'scores': scores
+        }
+
+    def _persist(self, state: Dict, scores: Dict, mode: str, run_id: Optional[str]):
+        """Guarda el estado del dominio y, con `run_id`, sus features y su resultado"""
+        self.state.save(state)
+        if run_id:
+            domain = state['domain']
+            get_feature_store().record(run_id, domain, state['features'])
+            get_result_store().record(
+                run_id, domain, 'unified',
+                score=scores['overall_score'],
+                likely_has_ads=scores['likely_has_ads'],
+                summary={'scores': scores, 'rescan_mode': mode},
+                ultra_score=scores['ultra_score'],
+                basic_score=scores['basic_score'],
+                priority=scores['priority'],
+                confidence_level=scores['confidence_level'],
+                rules_version=scores['rules_version']
+            )
+
+    async def _probe(self, domain: str, previous: Optional[Dict]) -> Optional[Dict]:
+        """
+        GET condicional de la home: validadores, hash del contenido y la
+        propia descarga (`page`, para el análisis completo). None si no responde.
+        """
+        headers = dict(_HEADERS)
+        if previous and previous['etag']:
+            headers['If-None-Match'] = previous['etag']
+        if previous and previous['last_modified']:
+            headers['If-Modified-Since'] = previous['last_modified']
+
+        url = (previous or {}).get('url') or f"https://{domain}"
+        try:
+            result = await http_fetcher.scan(url, _BodyReader(), headers=headers, timeout=15)
+        except Exception as e:
+            logger.debug(f"No se pudo revalidar la home de {domain}: {e}")
+            return None
+
+        if result.status_code == 304:
+            return {'url': url, 'not_modified': True, 'content_hash': None, 'etag': None, 'last_modified': None,
+                    'page': None}
+        if result.status_code != 200:
+            return None
+        return {
+            'url': result.url,
+            'not_modified': False,
+            'content_hash': content_hash(result.body),
+            'etag': result.headers.get('etag'),
+            'last_modified': result.headers.get('last-modified'),
+            'page': result
+        }
+
+    async def _full_analysis(self, domain: str, deadline_ms: Optional[int], page: Optional[ScanResult] = None):
+        """
+        Análisis ultra + transparencia de Facebook, reducido a features
+        crudas (`page`: home ya descargada). Devuelve (features, resultado
+        de transparencia o None si no se pudo consultar, etapas degradadas).
+        """
+        deadline = Deadline(deadline_ms)
+        ultra_result, fb_result = await asyncio.gather(
+            self.ultra_detector.analyze_domain_ultra(domain, deadline, page),
+            deadline.run('facebook_transparency', self.fb_transparency.search_page_transparency(domain)),
+            return_exceptions=True
+        )
+        if isinstance(ultra_result, Exception):
+            ultra_result = {'error': str(ultra_result)}
+        if isinstance(fb_result, Exception) or (fb_result and fb_result.get('skipped')):
+            fb_result = None
+
+        ultra_analysis = ultra_result.get('ultra_analysis') or {}
+        basic = ultra_analysis.get('basic_detection') or {}
+        signals = deadline.report()
+        features = extract_features(
+            'unified', basic, ultra_analysis.get('advanced_detection'),
+            fb_result or {}, signals,
+            (ultra_result.get('analysis_metadata') or {}).get('preclassifier')
+        )
+
+        # Etapas con error, fuera de tiempo u omitidas (las descartadas por el pre-clasificador no cuentan)
+        degraded = []
+        for stage in signals['timed_out'] + signals['skipped'] + signals['failed']:
+            if stage not in degraded:
+                degraded.append(stage)
+        if ultra_result.get('error') or basic.get('error'):
+            degraded.append('ultra')
+        if features.get('tracking') is None and 'website_tracking' not in degraded:
+            degraded.append('website_tracking')  # Home inaccesible
+        library = (basic.get('detailed_analysis') or {}).get('facebook_ad_library') or {}
+        if library.get('skipped') and 'facebook_ad_library' not in degraded:
+            degraded.append('facebook_ad_library')  # Facebook no disponible
+        if fb_result is None and 'facebook_transparency' not in degraded:
+            degraded.append('facebook_transparency')
+        return features, fb_result, degraded
+
+    async def _facebook_transparency(self, domain: str, page_url: Optional[str],
+                                     deadline_ms: Optional[int]) -> Optional[Dict]:
+        """
+        Solo la etapa de transparencia de Facebook (por la página ya conocida
+        si la hay). None si no se pudo consultar: error, tiempo agotado o
+        Facebook no disponible (circuito abierto, login o checkpoint).
+        """
+        deadline = Deadline(deadline_ms)
+        if page_url:
+            check = self.fb_transparency._check_page_transparency(page_url, domain)
+        else:
+            check = self.fb_transparency.search_page_transparency(domain)
+        try:
+            result = await deadline.run('facebook_transparency', check)
+        except Exception as e:
+            logger.debug(f"Transparencia de Facebook fallida para {domain}: {e}")
+            return None
+        # `skipped` no es "sin anuncios": Facebook no dejó ver la página
+        if result and result.get('skipped'):
+            logger.debug(f"Transparencia de Facebook no disponible para {domain}: {result['skipped']}")
+            return None
+        return result
+
+
+_state: Optional[RescanState] = None
+
+
+def get_rescan_state() -> RescanState:
+    """Estado compartido (se abre la primera vez que se usa)"""
+    global _state
+    if _state is None:
+        _state = RescanState()
+    return _state
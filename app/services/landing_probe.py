@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import re
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from ..config import settings
+from .http_fetcher import http_fetcher
+
+# Bytes iniciales que se leen para la huella de soft-404
+PREFIX_BYTES = 4096
+
+# Códigos con los que un servidor indica que no soporta HEAD
+_HEAD_UNSUPPORTED = {405, 501}
+
+_TITLE_RE = re.compile(rb'<title[^>]{0,100}>([^<]{0,200})', re.IGNORECASE)
+
+
+class ProbeResult:
+    """Respuesta de una ruta sondeada: status, ruta final tras redirecciones y huella del contenido"""
+
+    def __init__(self, path: str, status: Optional[int], final_path: Optional[str] = None,
+                 title_hash: Optional[str] = None, method: str = 'HEAD'):
+        self.path = path
+        self.status = status  # None si la petición falló
+        self.final_path = final_path
+        self.title_hash = title_hash
+        self.method = method
+
+    @classmethod
+    def from_prefix(cls, path: str, result) -> 'ProbeResult':
+        match = _TITLE_RE.search(result.body)
+        title_hash = hashlib.sha1(match.group(1).strip().lower()).hexdigest() if match else None
+        return cls(path, result.status_code, urlparse(result.url).path or '/', title_hash, method='GET')
+
+
+class LandingPageProber:
+    """
+    Sondea en paralelo rutas típicas de landing pages sobre el cliente HTTP
+    compartido. Usa HEAD y, si el servidor no lo soporta (405/501 o error
+    de conexión), un GET con Range que solo lee los primeros KB.
+
+    Antes se pide una ruta aleatoria para tomar la huella de soft-404: si el
+    sitio responde 200 a todo, cada ruta se compara con esa huella (ruta
+    final tras redirecciones y <title>) en vez de fiarse del status.
+    """
+
+    def __init__(self, paths: Optional[List[str]] = None,
+                 concurrency: int = settings.LANDING_PROBE_CONCURRENCY,
+                 timeout: float = settings.LANDING_PROBE_TIMEOUT):
+        self.paths = paths or settings.LANDING_PAGE_PATHS
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    async def probe(self, domain: str, paths: Optional[List[str]] = None) -> Dict:
+        paths = paths or self.paths
+        base = f'https://{domain}'
+
+        # Huella de una ruta que no puede existir
+        fingerprint = await self._get_prefix(base, f'/{uuid.uuid4().hex}')
+        catch_all = fingerprint is not None and fingerprint.status in (200, 206)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(path: str) -> ProbeResult:
+            async with semaphore:
+                # En sitios catch-all el status no basta: hace falta el contenido
+                if catch_all:
+                    return await self._get_prefix(base, path) or ProbeResult(path, None)
+                return await self._probe_path(base, path)
+
+        results = await asyncio.gather(*[bounded(path) for path in paths])
+
+        found = [r.path for r in results if self._is_landing_page(r, fingerprint if catch_all else None)]
+        return {
+            'found': found,
+            'soft_404_site': catch_all,
+            'probes': {r.path: r.status for r in results}
+        }
+
+    async def _probe_path(self, base: str, path: str) -> ProbeResult:
+        try:
+            response = await http_fetcher.head(f'{base}{path}', timeout=self.timeout)
+        except Exception:
+            # Hay servidores que cortan la conexión ante un HEAD: se intenta con el GET con Range
+            response = None
+
+        if response is None or response.status_code in _HEAD_UNSUPPORTED:
+            return await self._get_prefix(base, path) or ProbeResult(path, None)
+        return ProbeResult(path, response.status_code, urlparse(str(response.url)).path or '/')
+
+    async def _get_prefix(self, base: str, path: str) -> Optional[ProbeResult]:
+        try:
+            result = await http_fetcher.fetch_prefix(f'{base}{path}', timeout=self.timeout, max_bytes=PREFIX_BYTES)
+        except Exception:
+            return None
+        return ProbeResult.from_prefix(path, result)
+
+    @staticmethod
+    def _is_landing_page(result: ProbeResult, soft_404: Optional[ProbeResult]) -> bool:
+        # 206: respuesta al GET con Range
+        if result.status not in (200, 206):
+            return False
+        # Redirigir a la home no es tener la página
+        if result.final_path in ('/', '') and result.path not in ('/', ''):
+            return False
+        if soft_404 is None:
+            return True
+        if result.final_path == soft_404.final_path:
+            return False
+        return not (result.title_hash and result.title_hash == soft_404.title_hash)
+
+
+# Instancia compartida por los detectores
+landing_prober = LandingPageProber()
@@ -1,6 +1,13 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from .tracking_detector import TrackingDetector
 from .public_scrapers import FacebookAdLibraryScraper, GoogleTransparencyScraper
+from .facebook_transparency_advanced import FacebookTransparencyAdvanced
+from .deadline import Deadline
+from .id_index import get_id_index
+from .result_records import DomainRecord
+from . import batch_scoring, scoring
+from .scoring_rules import ScoringRules, get_scoring_rules
+import numpy as np
 import asyncio
 
 
@@ -10,16 +17,44 @@ class NoAPIAdsDetector:
     def __init__(self):
         self.tracking_detector = TrackingDetector()
         self.facebook_scraper = FacebookAdLibraryScraper()
+        self.fb_transparency = FacebookTransparencyAdvanced()
         self.google_scraper = GoogleTransparencyScraper()
     
-    async def analyze_domain_comprehensive(self, domain: str) -> Dict:
-        """Análisis completo de un dominio usando todos los métodos sin API"""
+    async def analyze_domain_comprehensive(self, domain: str, deadline: Optional[Deadline] = None,
+                                           tracking_task: Optional[asyncio.Future] = None,
+                                           skip_facebook: bool = False) -> Dict:
+        """
+        Análisis completo de un dominio usando todos los métodos sin API.
+        `tracking_task` reutiliza un análisis de la home ya lanzado y
+        `skip_facebook` omite la búsqueda en Facebook Ad Library (se puntúa con 0).
+        """
+        deadline = deadline or Deadline()
+        id_index = get_id_index()
+        
+        if tracking_task is None:
+            tracking_task = asyncio.ensure_future(
+                deadline.run('website_tracking', self.tracking_detector.analyze_website(domain, deadline))
+            )
         
-        # Ejecutar todos los análisis en paralelo
+        async def run_facebook():
+            if skip_facebook:
+                return None
+            # Si el píxel del sitio ya está ligado a una página verificada, se revisa esa página sin buscar
+            if await asyncio.to_thread(id_index.has_verified):
+                tracking = await asyncio.shield(tracking_task)
+                ids = ((tracking or {}).get('analysis_details') or {}).get('tracking_ids', {})
+                verified = await asyncio.to_thread(id_index.verified_page_for, ids)
+                if verified:
+                    check = await self.fb_transparency._check_page_transparency(verified['page_url'], domain)
+                    if check and check.get('page_found'):
+                        return self.facebook_scraper.create_verified_result(domain, verified, check)
+            return await self.facebook_scraper.search_advertiser(domain, deadline)
+        
+        # Ejecutar todos los análisis en paralelo (las etapas lentas se cancelan al agotar el presupuesto)
         results = await asyncio.gather(
-            self.tracking_detector.analyze_website(domain),
-            self.facebook_scraper.search_advertiser(domain),
-            self.google_scraper.search_advertiser(domain),
+            tracking_task,
+            run_facebook() if skip_facebook else deadline.run('facebook_ad_library', run_facebook()),
+            deadline.run('google_transparency', self.google_scraper.search_advertiser(domain, deadline)),
             return_exceptions=True
         )
         
@@ -27,12 +62,19 @@ class NoAPIAdsDetector:
         facebook_result = results[1] if not isinstance(results[1], Exception) else None
         google_result = results[2] if not isinstance(results[2], Exception) else None
         
-        # Calcular score combinado
-        combined_score = self.calculate_combined_score(tracking_result, facebook_result, google_result)
+        # Guardar los IDs del sitio en el índice invertido (ID <-> dominios)
+        if tracking_result:
+            await asyncio.to_thread(
+                id_index.record, domain, (tracking_result.get('analysis_details') or {}).get('tracking_ids', {})
+            )
+        
+        # Calcular score combinado (con las reglas de scoring vigentes)
+        rules = get_scoring_rules()
+        combined_score = self.calculate_combined_score(tracking_result, facebook_result, google_result, rules)
         
         # Determinar probabilidad final
         has_ads_probability = combined_score['final_score']
-        likely_has_ads = has_ads_probability >= 40  # Umbral del 40%
+        likely_has_ads = has_ads_probability >= rules.basic_likely_threshold  # Umbral del 40%
         
         return {
             'domain': domain,
@@ -46,60 +88,15 @@ class NoAPIAdsDetector:
                 'google_transparency': google_result
             },
             'summary': combined_score,
-            'next_steps': self.get_next_steps(has_ads_probability)
+            'next_steps': self.get_next_steps(has_ads_probability),
+            'rules_version': rules.version
         }
     
-    def calculate_combined_score(self, tracking_result: Dict, facebook_result: Dict, google_result: Dict) -> Dict:
+    def calculate_combined_score(self, tracking_result: Dict, facebook_result: Dict, google_result: Dict,
+                                 rules: Optional[ScoringRules] = None) -> Dict:
         """Calcula un score combinado de todos los métodos de detección"""
-        
-        scores = {
-            'tracking_score': 0,
-            'facebook_score': 0,
-            'google_score': 0,
-            'final_score': 0
-        }
-        
-        weights = {
-            'tracking': 0.5,    # 50% - Más confiable porque analiza el sitio real
-            'facebook': 0.3,    # 30% - Biblioteca pública
-            'google': 0.2       # 20% - Menos información disponible públicamente
-        }
-        
-        # Score del tracking detector
-        if tracking_result and tracking_result.get('probability_score'):
-            scores['tracking_score'] = tracking_result['probability_score']
-        
-        # Score de Facebook Ad Library
-        if facebook_result and facebook_result.get('has_ads'):
-            base_score = 60 if facebook_result.get('advertiser_found') else 40
-            confidence_bonus = facebook_result.get('confidence', 0) * 0.4
-            scores['facebook_score'] = min(base_score + confidence_bonus, 100)
-        
-        # Score de Google Transparency
-        if google_result and google_result.get('has_ads'):
-            base_score = 50 if google_result.get('advertiser_found') else 30
-            confidence_bonus = google_result.get('confidence', 0) * 0.3
-            scores['google_score'] = min(base_score + confidence_bonus, 100)
-        
-        # Calcular score final ponderado
-        final_score = (
-            scores['tracking_score'] * weights['tracking'] +
-            scores['facebook_score'] * weights['facebook'] +
-            scores['google_score'] * weights['google']
-        )
-        
-        scores['final_score'] = round(final_score, 1)
-        
-        # Información adicional
-        scores['methods_detected'] = sum([
-            1 if scores['tracking_score'] > 30 else 0,
-            1 if scores['facebook_score'] > 0 else 0,
-            1 if scores['google_score'] > 0 else 0
-        ])
-        
-        scores['strongest_indicator'] = max(scores.keys(), key=lambda k: scores[k] if k != 'final_score' and k != 'methods_detected' else 0)
-        
-        return scores
+        tracking = (tracking_result or {}).get('probability_score') or 0
+        return scoring.combined_score(tracking, facebook_result, google_result, rules)
     
     def get_confidence_level(self, score: float) -> str:
         """Devuelve el nivel de confianza basado en el score"""
@@ -159,32 +156,40 @@ class NoAPIAdsDetector:
         
         return steps
     
-    async def batch_analyze_domains(self, domains: List[str], max_concurrent: int = 5) -> List[Dict]:
-        """Analiza múltiples dominios en lotes para evitar sobrecarga"""
+    async def batch_analyze_domains(self, domains: List[str], max_concurrent: int = 5,
+                                    as_records: bool = False, include_details: bool = True) -> List:
+        """
+        Analiza múltiples dominios en lotes para evitar sobrecarga.
+        Con `as_records` cada resultado se reduce a un `DomainRecord` nada más
+        terminar (el detalle completo solo se conserva con `include_details`).
+        """
         
         results = []
         
         # Procesar en lotes
         for i in range(0, len(domains), max_concurrent):
             batch = domains[i:i + max_concurrent]
+            deadlines = [Deadline() for _ in batch]
             
             batch_results = await asyncio.gather(
-                *[self.analyze_domain_comprehensive(domain) for domain in batch],
+                *[self.analyze_domain_comprehensive(domain, deadline) for domain, deadline in zip(batch, deadlines)],
                 return_exceptions=True
             )
             
             # Filtrar excepciones y agregar resultados válidos
-            for result in batch_results:
-                if not isinstance(result, Exception):
-                    results.append(result)
-                else:
+            for result, deadline in zip(batch_results, deadlines):
+                if isinstance(result, Exception):
                     # Crear resultado de error
-                    results.append({
+                    result = {
                         'domain': 'unknown',
                         'likely_has_ads': False,
                         'probability_score': 0,
                         'error': str(result)
-                    })
+                    }
+                results.append(
+                    DomainRecord.from_basic(result, deadline.report(), include_details=include_details)
+                    if as_records else result
+                )
             
             # Pequeña pausa entre lotes
             await asyncio.sleep(1)
@@ -195,24 +200,17 @@ class NoAPIAdsDetector:
         """Genera un reporte resumen de múltiples análisis"""
         
         total_domains = len(results)
-        high_priority = len([r for r in results if r.get('probability_score', 0) >= 70])
-        medium_priority = len([r for r in results if 50 <= r.get('probability_score', 0) < 70])
-        low_priority = len([r for r in results if 30 <= r.get('probability_score', 0) < 50])
-        no_priority = len([r for r in results if r.get('probability_score', 0) < 30])
+        scores = np.fromiter((r.get('probability_score', 0) for r in results), dtype=np.float64, count=total_domains)
         
-        # Dominios de alta prioridad para APIs
-        api_candidates = [r for r in results if r.get('probability_score', 0) >= 50]
-        api_candidates.sort(key=lambda x: x.get('probability_score', 0), reverse=True)
+        # Dominios de alta prioridad para APIs (orden estable por score descendente)
+        candidates = np.flatnonzero(scores >= 50)
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        api_candidates = [results[i] for i in candidates[:20]]  # Top 20 candidatos
         
         return {
             'total_domains_analyzed': total_domains,
-            'priority_distribution': {
-                'high_priority': high_priority,
-                'medium_priority': medium_priority,
-                'low_priority': low_priority,
-                'no_priority': no_priority
-            },
-            'api_candidates': api_candidates[:20],  # Top 20 candidatos
-            'estimated_api_calls_needed': len(api_candidates),
-            'potential_savings': f"{((total_domains - len(api_candidates)) / total_domains * 100):.1f}% menos llamadas API"
+            'priority_distribution': batch_scoring.basic_priority_distribution(scores),
+            'api_candidates': api_candidates,
+            'estimated_api_calls_needed': len(candidates),
+            'potential_savings': f"{((total_domains - len(candidates)) / total_domains * 100):.1f}% menos llamadas API"
         }
\ No newline at end of file
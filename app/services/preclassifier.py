@@ -0,0 +1,123 @@
+import json
+import logging
+import math
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+from ..config import settings
+from .tracking_ids import ID_TYPES
+
+logger = logging.getLogger(__name__)
+
+# Modos: 'off' (no se usa), 'shadow' (solo se anota la predicción), 'gate' (decide las etapas caras)
+PRECLASSIFIER_MODES = ('off', 'shadow', 'gate')
+
+# Features de la home (conteos del tracking detector + tipos de ID encontrados)
+COUNT_FEATURES = (
+    'facebook_indicators', 'google_ads_indicators', 'campaign_indicators',
+    'tracking_domains', 'social_meta_tags', 'tracking_scripts'
+)
+FEATURE_NAMES = COUNT_FEATURES + tuple(f'id_{id_type}' for id_type in ID_TYPES)
+
+
+def homepage_vector(score_features: Optional[Dict], tracking_ids: Optional[Dict]) -> List[float]:
+    """
+    Vector de features que solo necesita la home: los conteos del tracking
+    detector (escala logarítmica) y si aparece cada tipo de ID de tracking.
+    Sirve igual para un resultado en vivo que para features guardadas.
+    """
+    score_features = score_features or {}
+    tracking_ids = tracking_ids or {}
+    vector = [math.log1p(score_features.get(name, 0)) for name in COUNT_FEATURES]
+    vector.extend(1.0 if tracking_ids.get(id_type) else 0.0 for id_type in ID_TYPES)
+    return vector
+
+
+class PreClassifier:
+    """
+    Regresión logística entrenada offline (ver train_preclassifier.py) sobre
+    las features de la home. Estima la probabilidad de que el dominio NO
+    acabe en la prioridad más baja sin anuncios detectados; por debajo de
+    `threshold` no merece la pena lanzar la búsqueda en Facebook ni el
+    análisis avanzado.
+
+    La estandarización se pliega en los pesos al entrenar, así que predecir
+    es un producto escalar y una sigmoide (microsegundos, sin NumPy).
+    """
+
+    def __init__(self, data: Dict):
+        if tuple(data['feature_names']) != FEATURE_NAMES:
+            raise ValueError("El modelo del pre-clasificador no coincide con las features actuales")
+        self.version = data['version']
+        self.weights = [float(w) for w in data['weights']]
+        self.bias = float(data['bias'])
+        self.threshold = float(data['threshold'])
+        self.rules_version = data.get('rules_version')
+        self.metrics = data.get('metrics', {})
+
+    @classmethod
+    def load(cls, path: str) -> 'PreClassifier':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def probability(self, vector: Sequence[float]) -> float:
+        z = self.bias + sum(w * x for w, x in zip(self.weights, vector))
+        if z < -30:
+            return 0.0
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def decide(self, tracking_result: Optional[Dict]) -> Dict:
+        """Decisión sobre el resultado del tracking detector de la home"""
+        details = (tracking_result or {}).get('analysis_details') or {}
+        probability = self.probability(homepage_vector(details.get('score_features'), details.get('tracking_ids')))
+        return {
+            'model_version': self.version,
+            'probability': round(probability, 4),
+            'threshold': self.threshold,
+            'skip_expensive_stages': probability < self.threshold
+        }
+
+
+def save_model(path: str, weights: Sequence[float], bias: float, threshold: float,
+               rules_version: Optional[str], metrics: Dict) -> Dict:
+    data = {
+        'version': time.strftime('%Y%m%d-%H%M%S'),
+        'feature_names': list(FEATURE_NAMES),
+        'weights': [float(w) for w in weights],
+        'bias': float(bias),
+        'threshold': float(threshold),
+        'rules_version': rules_version,
+        'metrics': metrics
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    return data
+
+
+_model: Optional[PreClassifier] = None
+_loaded = False
+
+
+def get_preclassifier() -> Optional[PreClassifier]:
+    """
+    Pre-clasificador activo según PRECLASSIFIER_MODE, o None si está
+    desactivado o aún no hay modelo entrenado (se carga una sola vez).
+    """
+    global _model, _loaded
+    if settings.PRECLASSIFIER_MODE == 'off':
+        return None
+    if not _loaded:
+        _loaded = True
+        try:
+            _model = PreClassifier.load(settings.PRECLASSIFIER_MODEL_PATH)
+            logger.info(f"Pre-clasificador {_model.version} cargado en modo {settings.PRECLASSIFIER_MODE}")
+        except FileNotFoundError:
+            _model = None
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"No se pudo cargar el pre-clasificador: {e}")
+            _model = None
+    return _model
@@ -1,12 +1,21 @@
 import httpx
 import re
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import asyncio
 from urllib.parse import quote
 from fake_useragent import UserAgent
 import time
 import random
+from .deadline import Deadline
+from .http_fetcher import http_fetcher
+from .signatures import SignatureScanner
+from .signature_db import get_signature_db
+from .ads_txt import ads_txt_cache
+from .circuit_breaker import (
+    FACEBOOK_UPSTREAM, FAILURE_STATUS_CODES, UPSTREAM_UNAVAILABLE, get_breaker
+)
+from .facebook_interstitials import HEAD_BYTES, classify_facebook_response
 
 
 class FacebookAdLibraryScraper:
@@ -18,9 +27,15 @@ class FacebookAdLibraryScraper:
         ua = UserAgent()
         self.user_agent = ua.random
         
-    async def search_advertiser(self, domain: str) -> Dict:
-        """Busca un anunciante en la biblioteca de anuncios de Facebook"""
+    async def search_advertiser(self, domain: str, deadline: Optional[Deadline] = None) -> Dict:
+        """Busca un anunciante en la biblioteca de anuncios de Facebook (esperas acotadas por `deadline`)"""
         try:
+            # Fallar rápido si Facebook nos está bloqueando (circuito abierto)
+            if not get_breaker(FACEBOOK_UPSTREAM).allow_request():
+                result = self.create_result(domain, False, "Facebook no disponible temporalmente (circuito abierto)")
+                result['skipped'] = UPSTREAM_UNAVAILABLE
+                return result
+            
             # Normalizar dominio
             clean_domain = self.normalize_domain(domain)
             
@@ -28,7 +43,12 @@ class FacebookAdLibraryScraper:
             search_url = f"{self.base_url}/?active_status=all&ad_type=all&country=ALL&q={quote(clean_domain)}&sort_data[direction]=desc&sort_data[mode]=relevancy_monthly_grouped&search_type=keyword_unordered"
             
             # Realizar búsqueda
-            content = await self.fetch_content(search_url)
+            content, interstitial = await self._fetch(search_url, deadline)
+            if interstitial:
+                result = self.create_result(domain, False, f"Facebook respondió con una pantalla intermedia ({interstitial})")
+                result['skipped'] = UPSTREAM_UNAVAILABLE
+                result['interstitial'] = interstitial
+                return result
             if not content:
                 return self.create_result(domain, False, "No se pudo acceder a Facebook Ad Library")
             
@@ -51,6 +71,13 @@ class FacebookAdLibraryScraper:
     
     async def fetch_content(self, url: str) -> Optional[str]:
         """Obtiene el contenido de la página"""
+        content, _ = await self._fetch(url)
+        return content
+    
+    async def _fetch(self, url: str, deadline: Optional[Deadline] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Descarga la página y devuelve (html, interstitial); los login walls no se decodifican"""
+        deadline = deadline or Deadline()
+        breaker = get_breaker(FACEBOOK_UPSTREAM)
         try:
             headers = {
                 'User-Agent': self.user_agent,
@@ -66,15 +93,30 @@ class FacebookAdLibraryScraper:
             }
             
             # Agregar delay aleatorio para evitar rate limiting
-            await asyncio.sleep(random.uniform(1, 3))
+            await asyncio.sleep(deadline.timeout(random.uniform(1, 3)))
             
-            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
+            async with httpx.AsyncClient(timeout=deadline.timeout(self.timeout), follow_redirects=True) as client:
                 response = await client.get(url, headers=headers)
+                if response.status_code in FAILURE_STATUS_CODES:
+                    breaker.record_failure(f"HTTP {response.status_code}")
+                    return None, None
                 response.raise_for_status()
-                return response.text
                 
-        except Exception:
-            return None
+                # Login wall / checkpoint / consentimiento: clasificar por bytes antes de decodificar
+                interstitial = classify_facebook_response(response.content[:HEAD_BYTES], str(response.url))
+                if interstitial:
+                    breaker.record_failure(interstitial)
+                    return None, interstitial
+                
+                breaker.record_success()
+                return response.text, None
+                
+        except Exception as e:
+            if isinstance(e, httpx.HTTPStatusError):
+                breaker.record_success()  # Facebook respondió: el upstream está disponible
+            else:
+                breaker.record_failure(type(e).__name__)
+            return None, None
     
     def analyze_search_results(self, html: str, domain: str) -> Dict:
         """Analiza los resultados de búsqueda de Facebook Ad Library"""
@@ -176,6 +218,27 @@ class FacebookAdLibraryScraper:
                 'message': self.generate_message(has_ads, details)
             }
     
+    def create_verified_result(self, domain: str, verified: Dict, check: Dict) -> Dict:
+        """
+        Resultado sin búsqueda: el píxel del sitio está ligado a una página
+        verificada y `check` es la revisión actual de la transparencia de esa
+        página (lo que decide si hay anuncios, no la verificación antigua).
+        """
+        has_ads = bool(check.get('has_ads_in_circulation'))
+        link = f"Píxel {verified['id_value']} ligado a {verified['page_url']} (verificado en {verified['source_domain']})"
+        return {
+            'domain': domain,
+            'has_ads': has_ads,
+            'source': 'Facebook (píxel compartido)',
+            'advertiser_found': True,
+            'page_names': [verified['page_url']],
+            'estimated_ads': 0,
+            'indicators_found': [f"{verified['id_type']}:{verified['id_value']}"] + check.get('evidence', []),
+            'confidence': check.get('confidence', 0),
+            'verified_page': verified,
+            'message': f"✅ {link}: anuncios en circulación" if has_ads else f"❌ {link}: sin anuncios en circulación"
+        }
+    
     def calculate_confidence(self, analysis: Dict) -> int:
         """Calcula el nivel de confianza del resultado"""
         confidence = 0
@@ -213,30 +276,32 @@ class GoogleTransparencyScraper:
         ua = UserAgent()
         self.user_agent = ua.random
     
-    async def search_advertiser(self, domain: str) -> Dict:
+    async def search_advertiser(self, domain: str, deadline: Optional[Deadline] = None) -> Dict:
         """
         NUEVA IMPLEMENTACIÓN: Detección alternativa de Google Ads
         Ya que Google Transparency Center requiere JS/autenticación,
-        usamos métodos más efectivos
+        usamos métodos más efectivos. Con un `deadline`, las esperas y los
+        timeouts de las descargas se acotan a lo que queda.
         """
+        deadline = deadline or Deadline()
         try:
             total_score = 0
             evidence = []
             
             # Método 1: Verificar ads.txt
-            ads_txt_score = await self._check_ads_txt(domain)
+            ads_txt_score = await self._check_ads_txt(domain, deadline)
             total_score += ads_txt_score.get('score', 0)
             if ads_txt_score.get('evidence'):
                 evidence.extend(ads_txt_score['evidence'])
             
             # Método 2: Verificar scripts de Google Ads
-            scripts_score = await self._check_google_ads_scripts(domain)
+            scripts_score = await self._check_google_ads_scripts(domain, deadline)
             total_score += scripts_score.get('score', 0)
             if scripts_score.get('evidence'):
                 evidence.extend(scripts_score['evidence'])
             
             # Método 3: Verificar dominios de DoubleClick
-            doubleclick_score = await self._check_doubleclick_domains(domain)
+            doubleclick_score = await self._check_doubleclick_domains(domain, deadline)
             total_score += doubleclick_score.get('score', 0)
             if doubleclick_score.get('evidence'):
                 evidence.extend(doubleclick_score['evidence'])
@@ -249,7 +314,8 @@ class GoogleTransparencyScraper:
                 'has_ads': has_ads,
                 'advertiser_found': has_ads,
                 'indicators': evidence,
-                'total_score': total_score
+                'total_score': total_score,
+                'ads_txt': ads_txt_score.get('ads_txt')
             }
             
             return self.create_result(domain, has_ads, analysis)
@@ -257,58 +323,40 @@ class GoogleTransparencyScraper:
         except Exception as e:
             return self.create_result(domain, False, f"Error en detección alternativa: {str(e)}")
 
-    async def _check_ads_txt(self, domain: str) -> dict:
-        """Verifica archivo ads.txt para entradas de Google"""
+    async def _check_ads_txt(self, domain: str, deadline: Deadline) -> dict:
+        """Verifica ads.txt y app-ads.txt (registros estructurados, caché compartida) buscando entradas de Google"""
         try:
-            url = f"https://{domain}/ads.txt"
-            content = await self.fetch_content(url)
+            files = await ads_txt_cache.get_all(domain, deadline)
+            google_systems = get_signature_db().ads_txt_google_systems
             
-            if content:
-                google_patterns = [
-                    r'google\.com',
-                    r'googlesyndication\.com', 
-                    r'doubleclick\.net',
-                    r'googleadservices\.com'
-                ]
-                
-                google_entries = []
-                for pattern in google_patterns:
-                    matches = re.findall(f".*{pattern}.*", content, re.IGNORECASE)
-                    google_entries.extend(matches[:2])  # Max 2 per pattern
-                
-                if google_entries:
-                    return {
-                        'score': 40,  # High score for ads.txt
-                        'evidence': [f"ads.txt: {entry[:60]}..." for entry in google_entries]
-                    }
+            evidence = []
+            for filename, ads_file in files.items():
+                for ad_system in google_systems:
+                    for record in ads_file.records.get(ad_system, [])[:2]:  # Max 2 por sistema
+                        evidence.append(f"{filename}: {record.ad_system}, {record.publisher_id}, {record.relationship}")
             
-            return {'score': 0}
+            return {
+                'score': 40 if evidence else 0,  # High score for ads.txt
+                'evidence': evidence,
+                'ads_txt': {filename: ads_file.summary() for filename, ads_file in files.items()}
+            }
             
         except Exception:
             return {'score': 0}
 
-    async def _check_google_ads_scripts(self, domain: str) -> dict:
+    async def _check_google_ads_scripts(self, domain: str, deadline: Deadline) -> dict:
         """Busca scripts de Google Ads en la página principal"""
         try:
             url = f"https://{domain}"
-            content = await self.fetch_content(url)
             
-            if content:
-                google_ads_patterns = [
-                    r'googleadservices\.com',
-                    r'googlesyndication\.com',
-                    r'doubleclick\.net',
-                    r'google_ad_client',
-                    r'gtag\s*\(\s*[\'"]config[\'"].*[\'"]AW-',
-                    r'_gac_',
-                    r'_gcl_'
+            # Cada patrón es su propia familia: se deja de descargar cuando aparecen todos
+            scanner = await self.scan_content(url, get_signature_db().scanner('google_ads_scripts'), deadline)
+            
+            if scanner:
+                found_patterns = [
+                    patterns[0] for patterns in scanner.found_patterns.values() if patterns
                 ]
                 
-                found_patterns = []
-                for pattern in google_ads_patterns:
-                    if re.search(pattern, content, re.IGNORECASE):
-                        found_patterns.append(pattern)
-                
                 if found_patterns:
                     score = min(30, len(found_patterns) * 6)  # Max 30 points
                     return {
@@ -321,26 +369,16 @@ class GoogleTransparencyScraper:
         except Exception:
             return {'score': 0}
 
-    async def _check_doubleclick_domains(self, domain: str) -> dict:
+    async def _check_doubleclick_domains(self, domain: str, deadline: Deadline) -> dict:
         """Verifica conexiones a dominios de Google/DoubleClick"""
         try:
             url = f"https://{domain}"
-            content = await self.fetch_content(url)
             
-            if content:
-                doubleclick_domains = [
-                    'googletagmanager.com',
-                    'googletagservices.com',
-                    'google-analytics.com',
-                    'googleadservices.com',
-                    'googlesyndication.com',
-                    'doubleclick.net'
-                ]
-                
-                found_domains = []
-                for domain_check in doubleclick_domains:
-                    if domain_check in content:
-                        found_domains.append(domain_check)
+            # Una familia por dominio de Google/DoubleClick
+            scanner = await self.scan_content(url, get_signature_db().scanner('google_connected_domains'), deadline)
+            
+            if scanner:
+                found_domains = [d for d in scanner.families if scanner.decided(d)]
                 
                 if found_domains:
                     score = min(25, len(found_domains) * 5)
@@ -363,8 +401,10 @@ class GoogleTransparencyScraper:
             domain = domain[:-1]
         return domain
     
-    async def fetch_content(self, url: str) -> Optional[str]:
-        """Obtiene el contenido de la página"""
+    async def scan_content(self, url: str, scanner: SignatureScanner,
+                           deadline: Optional[Deadline] = None) -> Optional[SignatureScanner]:
+        """Descarga la página en streaming alimentando el escáner indicado"""
+        deadline = deadline or Deadline()
         try:
             headers = {
                 'User-Agent': self.user_agent,
@@ -374,12 +414,12 @@ class GoogleTransparencyScraper:
                 'Connection': 'keep-alive'
             }
             
-            await asyncio.sleep(random.uniform(1, 3))
+            await asyncio.sleep(deadline.timeout(random.uniform(1, 3)))
             
-            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.text
+            result = await http_fetcher.scan(url, scanner, headers=headers, timeout=deadline.timeout(self.timeout))
+            if result.status_code >= 400:
+                return None
+            return scanner
                 
         except Exception:
             return None
@@ -455,5 +495,7 @@ class GoogleTransparencyScraper:
                 'indicators_found': details.get('indicators', []),
                 'total_score': details.get('total_score', 0),
                 'confidence': confidence,
+                'ads_txt': details.get('ads_txt'),
+                'signatures_version': get_signature_db().version,
                 'message': f"✅ Google Ads detectados (Score: {details.get('total_score', 0)}%)" if has_ads else f"❌ No detectados (Score: {details.get('total_score', 0)}%)"
             }
\ No newline at end of file
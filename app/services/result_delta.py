@@ -0,0 +1,135 @@
+"""
+Delta entre dos estados guardados en el almacén de resultados.
+
+Compara un run con otro run o con el estado guardado en un instante (el
+último análisis de cada dominio antes de ese momento), por dominio
+canónico, y emite solo los dominios añadidos, eliminados o cambiados con
+sus valores antes y después. Los dos lados se leen del almacén ya
+ordenados por dominio y se cruzan con un merge-join en streaming, así que
+la memoria no depende del tamaño del histórico.
+"""
+from typing import Dict, Iterable, Iterator, Optional, Sequence
+
+from .result_store import ResultStore
+
+# Campos que se pueden comparar
+DELTA_FIELDS = ('likely_has_ads', 'priority', 'confidence_level', 'score', 'ultra_score', 'basic_score')
+
+# Por defecto solo interesa el estado de anuncios
+DEFAULT_DELTA_FIELDS = ('likely_has_ads', 'priority')
+
+CHANGE_TYPES = ('added', 'removed', 'changed')
+
+# Contexto que acompaña a los valores comparados
+_CONTEXT = ('run_id', 'pipeline', 'analyzed_at')
+
+
+def latest_per_domain(rows: Iterable[Dict]) -> Iterator[Dict]:
+    """De filas ordenadas por dominio, solo la última de cada dominio"""
+    previous = None
+    for row in rows:
+        if previous is not None and row['domain'] != previous['domain']:
+            yield previous
+        previous = row
+    if previous is not None:
+        yield previous
+
+
+def _values(row: Dict, fields: Sequence[str]) -> Dict:
+    return {name: row.get(name) for name in tuple(fields) + _CONTEXT}
+
+
+def _changed_fields(before: Dict, after: Dict, fields: Sequence[str], score_tolerance: float):
+    changed = []
+    for name in fields:
+        old, new = before.get(name), after.get(name)
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and not isinstance(old, bool):
+            if abs(new - old) > score_tolerance:
+                changed.append(name)
+        elif old != new:
+            changed.append(name)
+    return changed
+
+
+def iter_delta(before: Iterable[Dict], after: Iterable[Dict], fields: Sequence[str] = DEFAULT_DELTA_FIELDS,
+               score_tolerance: float = 0.0, include_removed: bool = True) -> Iterator[Dict]:
+    """
+    Merge-join de dos secuencias ordenadas por dominio (una fila por
+    dominio). Emite {domain, change, changed_fields, before, after} para
+    cada dominio añadido, eliminado o con algún campo de `fields` distinto
+    (los scores, solo si difieren más de `score_tolerance`).
+    """
+    unknown = set(fields) - set(DELTA_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos no comparables: {', '.join(sorted(unknown))} (use {', '.join(DELTA_FIELDS)})")
+
+    before, after = iter(before), iter(after)
+    old, new = next(before, None), next(after, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old['domain'] < new['domain']):
+            if include_removed:
+                yield {'domain': old['domain'], 'change': 'removed', 'changed_fields': [],
+                       'before': _values(old, fields), 'after': None}
+            old = next(before, None)
+        elif old is None or new['domain'] < old['domain']:
+            yield {'domain': new['domain'], 'change': 'added', 'changed_fields': [],
+                   'before': None, 'after': _values(new, fields)}
+            new = next(after, None)
+        else:
+            changed = _changed_fields(old, new, fields, score_tolerance)
+            if changed:
+                yield {'domain': new['domain'], 'change': 'changed', 'changed_fields': changed,
+                       'before': _values(old, fields), 'after': _values(new, fields)}
+            old, new = next(before, None), next(after, None)
+
+
+def run_delta(store: ResultStore, run_id: str, base_run_id: Optional[str] = None, as_of: Optional[float] = None,
+              fields: Sequence[str] = DEFAULT_DELTA_FIELDS, score_tolerance: float = 0.0,
+              include_removed: Optional[bool] = None) -> Iterator[Dict]:
+    """
+    Delta de un run frente a otro run (`base_run_id`) o frente al estado
+    guardado en `as_of`. Sin ninguno de los dos se compara con el estado
+    justo antes de que empezara el run (lo último que se sabía de cada
+    dominio). Si un run analizó un dominio varias veces cuenta el último.
+
+    El estado guardado solo incluye análisis de los pipelines del run (los
+    campos de otro pipeline no son comparables) y, salvo que se pidan los
+    eliminados, solo de los dominios del run. Por defecto los eliminados se
+    incluyen al comparar con otro run y no al comparar con el estado
+    guardado (serían todos los dominios analizados en otros runs).
+    """
+    bounds = store.run_bounds(run_id)
+    if bounds is None:
+        raise ValueError(f"Run sin resultados guardados: {run_id}")
+
+    if base_run_id is not None:
+        if store.run_bounds(base_run_id) is None:
+            raise ValueError(f"Run sin resultados guardados: {base_run_id}")
+        base = store.iter_run(base_run_id, with_summary=False)
+        if include_removed is None:
+            include_removed = True
+    else:
+        include_removed = bool(include_removed)
+        base = store.iter_snapshot(
+            as_of if as_of is not None else bounds['started_at'], pipelines=bounds['pipelines'],
+            domains_of_run=None if include_removed else run_id, with_summary=False
+        )
+
+    return iter_delta(
+        latest_per_domain(base), latest_per_domain(store.iter_run(run_id, with_summary=False)),
+        fields, score_tolerance, include_removed
+    )
+
+
+def flatten_change(change: Dict, fields: Sequence[str] = DEFAULT_DELTA_FIELDS) -> Dict:
+    """Una fila plana por cambio (before_<campo>, after_<campo>) para CSV / Parquet"""
+    row = {
+        'domain': change['domain'],
+        'change': change['change'],
+        'changed_fields': ','.join(change['changed_fields'])
+    }
+    for side in ('before', 'after'):
+        values = change[side] or {}
+        for name in tuple(fields) + _CONTEXT:
+            row[f"{side}_{name}"] = values.get(name)
+    return row
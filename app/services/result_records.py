@@ -0,0 +1,226 @@
+"""
+Registros compactos de resultados para los análisis en lote.
+
+El resultado de un dominio es un dict anidado con todo el detalle (cada
+coincidencia de las firmas, la lista de scripts, meta tags, evidencias en
+texto...). En un lote de decenas de miles de dominios eso se acumula
+entero en memoria. `DomainRecord` guarda solo lo que se usa después: los
+scores, la decisión, la evidencia como conteos y códigos (bits) y las
+etapas que faltaron. El detalle completo se conserva solo si se pide
+(`include_details`).
+"""
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+from .tracking_ids import ID_TYPES
+
+# Conteos de señales del HTML (mismos nombres que `score_features` del tracking detector)
+EVIDENCE_COUNTS = (
+    'facebook_indicators', 'google_ads_indicators', 'campaign_indicators',
+    'tracking_domains', 'social_meta_tags', 'tracking_scripts'
+)
+
+# Códigos de evidencia (un bit por tipo)
+EVIDENCE_FLAGS = (
+    'basic_detected',          # El detector básico considera que hay anuncios
+    'strong_tracking',         # Tracking de la home > 50
+    'facebook_library',        # Anuncios en Facebook Ad Library
+    'google_transparency',     # Anuncios en Google Transparency
+    'verified_page',           # Página de Facebook verificada por píxel
+    'advanced_detected'        # El detector avanzado encontró factores de confianza
+)
+_FLAG_BITS = {name: 1 << i for i, name in enumerate(EVIDENCE_FLAGS)}
+_ID_BITS = {id_type: 1 << i for i, id_type in enumerate(ID_TYPES)}
+
+
+def _bits(names: Iterable[str], table: Dict[str, int]) -> int:
+    value = 0
+    for name in names:
+        value |= table.get(name, 0)
+    return value
+
+
+def _names(value: int, names: Tuple[str, ...]) -> list:
+    return [name for i, name in enumerate(names) if value & (1 << i)]
+
+
+def _stages(signals: Optional[Dict]) -> Tuple[str, ...]:
+    """Etapas sin resultado: fuera de tiempo, omitidas, con error o descartadas por el pre-clasificador"""
+    if not signals:
+        return ()
+    stages = []
+    for key in ('timed_out', 'skipped', 'failed', 'gated'):
+        stages.extend(stage for stage in signals.get(key, []) if stage not in stages)
+    return tuple(sys.intern(stage) for stage in stages)
+
+
+class DomainRecord:
+    """
+    Resultado compacto de un dominio (con `__slots__`: sin dict por instancia).
+    Las cadenas repetidas (pipeline, prioridad, confianza, etapas) se
+    internan, así que todos los registros comparten el mismo objeto.
+    """
+
+    __slots__ = (
+        'domain', 'pipeline', 'likely_has_ads', 'score',
+        'tracking_score', 'facebook_score', 'google_score', 'basic_score', 'advanced_score', 'ultra_score',
+        'priority', 'confidence_level', 'evidence', 'evidence_counts', 'tracking_ids',
+        'facebook_url', 'facebook_page', 'estimated_ads',
+        'advanced_factors', 'missing_stages', 'error', 'details'
+    )
+
+    def __init__(self, domain: str, pipeline: str):
+        self.domain = domain
+        self.pipeline = sys.intern(pipeline)
+        self.likely_has_ads = False
+        self.score = 0.0
+        self.tracking_score = 0.0
+        self.facebook_score = 0.0
+        self.google_score = 0.0
+        self.basic_score = 0.0
+        self.advanced_score = 0.0
+        self.ultra_score = 0.0
+        self.priority: Optional[str] = None
+        self.confidence_level: Optional[str] = None
+        self.evidence = 0
+        self.evidence_counts: Tuple[int, ...] = (0,) * len(EVIDENCE_COUNTS)
+        self.tracking_ids = 0
+        self.facebook_url: Optional[str] = None
+        self.facebook_page: Optional[str] = None
+        self.estimated_ads = 0
+        self.advanced_factors = 0
+        self.missing_stages: Tuple[str, ...] = ()
+        self.error: Optional[str] = None
+        self.details: Optional[Dict] = None
+
+    @classmethod
+    def from_basic(cls, result: Dict, signals: Optional[Dict] = None,
+                   include_details: bool = False) -> 'DomainRecord':
+        """Registro de un resultado de `NoAPIAdsDetector.analyze_domain_comprehensive`"""
+        record = cls(result.get('domain', 'unknown'), 'basic')
+        record._fill_basic(result)
+        record.score = record.basic_score
+        record.likely_has_ads = bool(result.get('likely_has_ads', False))
+        record.missing_stages = _stages(signals)
+        record.error = result.get('error')
+        if include_details:
+            record.details = result
+        return record
+
+    @classmethod
+    def from_ultra(cls, result: Dict, include_details: bool = False) -> 'DomainRecord':
+        """Registro de un resultado de `UltraAdvancedDetector.analyze_domain_ultra`"""
+        record = cls(result.get('domain', 'unknown'), 'ultra')
+        ultra_analysis = result.get('ultra_analysis') or {}
+        basic = ultra_analysis.get('basic_detection') or {}
+        advanced = ultra_analysis.get('advanced_detection') or {}
+        assessment = result.get('final_assessment') or {}
+
+        record._fill_basic(basic)
+        record.advanced_score = advanced.get('risk_score', 0.0) or 0.0
+        record.advanced_factors = len(advanced.get('confidence_factors') or ())
+        if record.advanced_factors:
+            record.evidence |= _FLAG_BITS['advanced_detected']
+        record.ultra_score = assessment.get('ultra_score', 0) or 0
+        record.score = record.ultra_score
+        record.likely_has_ads = bool(assessment.get('likely_has_ads', False))
+        record.priority = sys.intern(assessment.get('priority', 'UNKNOWN'))
+        record.confidence_level = sys.intern(assessment.get('confidence_level', 'unknown'))
+        record.missing_stages = _stages((result.get('analysis_metadata') or {}).get('signals'))
+        record.error = result.get('error')
+        if include_details:
+            record.details = result
+        return record
+
+    def _fill_basic(self, result: Dict):
+        summary = result.get('summary') or {}
+        detailed = result.get('detailed_analysis') or {}
+        tracking = detailed.get('website_tracking') or {}
+        tracking_details = tracking.get('analysis_details') or {}
+        score_features = tracking_details.get('score_features') or {}
+        facebook = detailed.get('facebook_ad_library') or {}
+
+        self.tracking_score = summary.get('tracking_score', 0) or 0
+        self.facebook_score = summary.get('facebook_score', 0) or 0
+        self.google_score = summary.get('google_score', 0) or 0
+        self.basic_score = result.get('probability_score', 0) or 0
+        if result.get('confidence_level') and self.confidence_level is None:
+            self.confidence_level = sys.intern(result['confidence_level'])
+
+        self.estimated_ads = facebook.get('estimated_ads', 0) or 0
+        page_names = facebook.get('page_names') or ()
+        self.facebook_page = page_names[0] if page_names else None
+        self.evidence_counts = tuple(int(score_features.get(name, 0)) for name in EVIDENCE_COUNTS)
+        self.tracking_ids = _bits((t for t, ids in (tracking_details.get('tracking_ids') or {}).items() if ids), _ID_BITS)
+        flags = []
+        if result.get('likely_has_ads'):
+            flags.append('basic_detected')
+        if (tracking.get('probability_score') or 0) > 50:
+            flags.append('strong_tracking')
+        if facebook.get('has_ads'):
+            flags.append('facebook_library')
+        if (detailed.get('google_transparency') or {}).get('has_ads'):
+            flags.append('google_transparency')
+        if facebook.get('verified_page'):
+            flags.append('verified_page')
+        self.evidence |= _bits(flags, _FLAG_BITS)
+
+    def has_evidence(self, flag: str) -> bool:
+        return bool(self.evidence & _FLAG_BITS[flag])
+
+    def has_tracking_id(self, id_type: str) -> bool:
+        return bool(self.tracking_ids & _ID_BITS[id_type])
+
+    def evidence_count(self, name: str) -> int:
+        return self.evidence_counts[EVIDENCE_COUNTS.index(name)]
+
+    def assessment(self) -> Dict:
+        """Campos de `final_assessment` (mismo formato que el resultado ultra)"""
+        return {
+            'ultra_score': self.ultra_score,
+            'basic_score': self.basic_score,
+            'advanced_score': self.advanced_score,
+            'confidence_level': self.confidence_level,
+            'priority': self.priority,
+            'likely_has_ads': self.likely_has_ads
+        }
+
+    def to_dict(self) -> Dict:
+        """
+        Forma serializable. Con el detalle guardado (`include_details`) es el
+        resultado completo original; si no, la versión compacta.
+        """
+        if self.details is not None:
+            return self.details
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Versión compacta (sin el detalle completo)"""
+        compact = {
+            'domain': self.domain,
+            'pipeline': self.pipeline,
+            'likely_has_ads': self.likely_has_ads,
+            'score': self.score,
+            'scores': {
+                'tracking_score': self.tracking_score,
+                'facebook_score': self.facebook_score,
+                'google_score': self.google_score,
+                'basic_score': self.basic_score
+            },
+            'evidence': _names(self.evidence, EVIDENCE_FLAGS),
+            'evidence_counts': dict(zip(EVIDENCE_COUNTS, self.evidence_counts)),
+            'tracking_ids': _names(self.tracking_ids, ID_TYPES),
+            'facebook_page': self.facebook_page,
+            'estimated_ads': self.estimated_ads,
+            'missing_stages': list(self.missing_stages)
+        }
+        if self.facebook_url:
+            compact['facebook_url'] = self.facebook_url
+        if self.pipeline == 'ultra':
+            compact['scores'].update({'advanced_score': self.advanced_score, 'ultra_score': self.ultra_score})
+            compact['priority'] = self.priority
+            compact['advanced_factors'] = self.advanced_factors
+        compact['confidence_level'] = self.confidence_level
+        if self.error:
+            compact['error'] = self.error
+        return compact
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from ..config import settings
+from .result_records import DomainRecord
+
+logger = logging.getLogger(__name__)
+
+# Columnas por las que se puede ordenar una consulta
+SORT_COLUMNS = ('score', 'ultra_score', 'basic_score', 'analyzed_at', 'domain')
+
+# Filas por página como máximo
+MAX_PAGE_SIZE = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    pipeline TEXT NOT NULL,
+    analyzed_at REAL NOT NULL,
+    score REAL NOT NULL,
+    ultra_score REAL,
+    basic_score REAL,
+    likely_has_ads INTEGER NOT NULL,
+    priority TEXT,
+    confidence_level TEXT,
+    rules_version TEXT,
+    is_latest INTEGER NOT NULL DEFAULT 1,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_results_domain ON results (domain, analyzed_at);
+CREATE INDEX IF NOT EXISTS idx_results_run ON results (run_id, domain);
+CREATE INDEX IF NOT EXISTS idx_results_analyzed ON results (analyzed_at);
+CREATE INDEX IF NOT EXISTS idx_results_score ON results (score);
+CREATE INDEX IF NOT EXISTS idx_results_ultra ON results (ultra_score);
+CREATE INDEX IF NOT EXISTS idx_results_priority ON results (priority, score);
+CREATE INDEX IF NOT EXISTS idx_results_latest_score ON results (score) WHERE is_latest = 1;
+CREATE INDEX IF NOT EXISTS idx_results_latest_ultra ON results (ultra_score) WHERE is_latest = 1;
+"""
+
+_COLUMNS = (
+    'id', 'run_id', 'domain', 'pipeline', 'analyzed_at', 'score', 'ultra_score', 'basic_score',
+    'likely_has_ads', 'priority', 'confidence_level', 'rules_version', 'summary'
+)
+
+
+def canonical_domain(domain: str) -> str:
+    """Dominio canónico con el que se indexa (sin esquema, www., ruta ni punto final)"""
+    domain = (domain or '').strip().lower()
+    for prefix in ('https://', 'http://'):
+        if domain.startswith(prefix):
+            domain = domain[len(prefix):]
+    domain = domain.split('/', 1)[0].split('?', 1)[0].rstrip('.')
+    if domain.startswith('www.'):
+        domain = domain[4:]
+    return domain
+
+
+def _row(row, columns=_COLUMNS) -> Dict:
+    result = dict(zip(columns, row))
+    result['likely_has_ads'] = bool(result['likely_has_ads'])
+    if 'summary' in result:
+        result['summary'] = json.loads(result['summary'])
+    return result
+
+
+class ResultStore:
+    """
+    Almacén en disco (SQLite, WAL) de cada análisis terminado: una fila por
+    análisis con los scores, la decisión y la prioridad en columnas
+    indexadas, y el resumen del resultado en JSON. La última fila de cada
+    dominio se marca (`is_latest`), así que las consultas del dashboard
+    ("top 500 por ultra_score de los últimos 7 días") son una lectura por
+    índice, sin volver a analizar ni recargar CSVs.
+    """
+
+    def __init__(self, path: str = settings.RESULT_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no sincroniza en cada commit y sigue siendo consistente ante una caída
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def record(self, run_id: str, domain: str, pipeline: str, score: float, likely_has_ads: bool,
+               summary: Dict, ultra_score: Optional[float] = None, basic_score: Optional[float] = None,
+               priority: Optional[str] = None, confidence_level: Optional[str] = None,
+               rules_version: Optional[str] = None, analyzed_at: Optional[float] = None):
+        """Guarda un análisis y lo marca como el último de su dominio"""
+        self.record_many([(
+            run_id, canonical_domain(domain), pipeline, analyzed_at or time.time(), float(score or 0),
+            ultra_score, basic_score, int(bool(likely_has_ads)), priority, confidence_level, rules_version,
+            json.dumps(summary, default=str)
+        )])
+
+    def record_domain(self, run_id: str, record: DomainRecord, rules_version: Optional[str] = None):
+        """Guarda un registro compacto de un análisis en lote"""
+        self.record_many([self._record_row(run_id, record, rules_version)])
+
+    def record_domains(self, run_id: str, records: Iterable[DomainRecord], rules_version: Optional[str] = None):
+        self.record_many([self._record_row(run_id, record, rules_version) for record in records])
+
+    def _record_row(self, run_id: str, record: DomainRecord, rules_version: Optional[str]) -> tuple:
+        return (
+            run_id, canonical_domain(record.domain), record.pipeline, time.time(), float(record.score or 0),
+            record.ultra_score if record.pipeline != 'basic' else None, record.basic_score,
+            int(record.likely_has_ads), record.priority, record.confidence_level, rules_version,
+            json.dumps(record.summary(), default=str)
+        )
+
+    def record_many(self, rows: List[tuple]):
+        if not rows:
+            return
+        with self._lock, self._conn:
+            # (`+is_latest`: la búsqueda va por el índice de dominio)
+            for row in rows:
+                self._conn.execute("UPDATE results SET is_latest = 0 WHERE domain = ? AND +is_latest = 1", (row[1],))
+                self._conn.execute(
+                    "INSERT INTO results (run_id, domain, pipeline, analyzed_at, score, ultra_score, basic_score, "
+                    "likely_has_ads, priority, confidence_level, rules_version, summary) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+
+    def query(self, since: Optional[float] = None, until: Optional[float] = None,
+              min_score: Optional[float] = None, max_score: Optional[float] = None,
+              priority: Optional[str] = None, likely_has_ads: Optional[bool] = None,
+              pipeline: Optional[str] = None, run_id: Optional[str] = None, latest_only: bool = True,
+              sort_by: str = 'score', descending: bool = True, limit: int = 100, offset: int = 0) -> Dict:
+        """
+        Consulta paginada con filtros por fecha, score, prioridad, decisión,
+        pipeline y run. Por defecto solo el último análisis de cada dominio.
+        """
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"No se puede ordenar por '{sort_by}' (use {', '.join(SORT_COLUMNS)})")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+
+        conditions = []
+        params: List = []
+        if latest_only:
+            conditions.append("is_latest = 1")
+        for clause, value in (
+            ("analyzed_at >= ?", since), ("analyzed_at < ?", until),
+            ("score >= ?", min_score), ("score <= ?", max_score),
+            ("priority = ?", priority), ("pipeline = ?", pipeline), ("run_id = ?", run_id)
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        if likely_has_ads is not None:
+            conditions.append("likely_has_ads = ?")
+            params.append(int(likely_has_ads))
+        if sort_by in ('ultra_score', 'basic_score'):
+            conditions.append(f"{sort_by} IS NOT NULL")
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f" ORDER BY {sort_by} {'DESC' if descending else 'ASC'}, id {'DESC' if descending else 'ASC'}"
+
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM results{where}{order} LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return {
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'results': [_row(row) for row in rows]
+        }
+
+    def history(self, domain: str, limit: int = 50) -> List[Dict]:
+        """Análisis de un dominio, del más reciente al más antiguo"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM results WHERE domain = ? ORDER BY analyzed_at DESC LIMIT ?",
+                (canonical_domain(domain), max(1, min(limit, MAX_PAGE_SIZE)))
+            ).fetchall()
+        return [_row(row) for row in rows]
+
+    def iter_run(self, run_id: str, page_size: int = MAX_PAGE_SIZE, with_summary: bool = True) -> Iterator[Dict]:
+        """Recorre los resultados de un run ordenados por dominio, por páginas"""
+        columns = _COLUMNS if with_summary else _COLUMNS[:-1]
+        # (`(domain, id) > (?, ?)`: cada página empieza por búsqueda en el índice del run)
+        last = ('', 0)
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(columns)} FROM results "
+                    "WHERE run_id = ? AND (domain, id) > (?, ?) "
+                    "ORDER BY domain, id LIMIT ?",
+                    (run_id,) + last + (page_size,)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _row(row, columns)
+            last = (rows[-1][2], rows[-1][0])
+
+    def iter_snapshot(self, as_of: float, pipelines: Optional[Sequence[str]] = None,
+                      domains_of_run: Optional[str] = None, page_size: int = MAX_PAGE_SIZE,
+                      with_summary: bool = True) -> Iterator[Dict]:
+        """
+        Recorre, ordenados por dominio, los análisis anteriores a `as_of`
+        (varios por dominio, del más antiguo al más reciente): el último de
+        cada dominio es el estado guardado en ese momento. Se puede limitar
+        a unos pipelines y a los dominios analizados en un run.
+        """
+        columns = _COLUMNS if with_summary else _COLUMNS[:-1]
+        conditions = ["(domain, analyzed_at, id) > (?, ?, ?)", "analyzed_at < ?"]
+        params: List = [as_of]
+        if pipelines:
+            conditions.append(f"pipeline IN ({', '.join('?' * len(pipelines))})")
+            params.extend(pipelines)
+        if domains_of_run is not None:
+            conditions.append("domain IN (SELECT domain FROM results WHERE run_id = ?)")
+            params.append(domains_of_run)
+        last = ('', 0.0, 0)
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(columns)} FROM results WHERE {' AND '.join(conditions)} "
+                    "ORDER BY domain, analyzed_at, id LIMIT ?",
+                    list(last) + params + [page_size]
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _row(row, columns)
+            last = (rows[-1][2], rows[-1][4], rows[-1][0])
+
+    def run_bounds(self, run_id: str) -> Optional[Dict]:
+        """Número de análisis de un run, su primer y último instante y sus pipelines"""
+        with self._lock:
+            count, started, finished = self._conn.execute(
+                "SELECT COUNT(*), MIN(analyzed_at), MAX(analyzed_at) FROM results WHERE run_id = ?", (run_id,)
+            ).fetchone()
+            pipelines = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT pipeline FROM results WHERE run_id = ? ORDER BY pipeline", (run_id,)
+            )] if count else []
+        if not count:
+            return None
+        return {'run_id': run_id, 'results': count, 'started_at': started, 'finished_at': finished,
+                'pipelines': pipelines}
+
+
+_store: Optional[ResultStore] = None
+
+
+def get_result_store() -> ResultStore:
+    """Almacén compartido (se abre la primera vez que se usa)"""
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
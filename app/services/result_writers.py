@@ -0,0 +1,134 @@
+"""
+Escritura incremental de resultados por lotes en CSV, JSONL o Parquet.
+
+Las filas se escriben a medida que llegan, así que un run largo no
+necesita tener todos los resultados en memoria. CSV y JSONL vuelcan cada
+fila al disco en cuanto llega (si el proceso se corta no se pierde ninguna
+fila terminada); Parquet las agrupa de `row_group_size` en
+`row_group_size` (un row group por grupo) y solo es legible tras cerrarlo. Las columnas son tipadas ('bool', 'int', 'float', 'str'):
+JSONL y Parquet conservan los tipos; CSV los escribe como texto.
+Parquet requiere pyarrow (dependencia opcional).
+"""
+import csv
+import json
+from typing import Dict, List, Optional, Sequence, Tuple
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+# Extensión de salida por defecto de cada formato
+FORMAT_EXTENSIONS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+COLUMN_TYPES = ('bool', 'int', 'float', 'str')
+DEFAULT_ROW_GROUP_SIZE = 5000
+
+Column = Tuple[str, str]
+
+
+class ResultWriter:
+    """Base: acumula filas y las vuelca por grupos (`_flush`)"""
+
+    def __init__(self, path: str, columns: Sequence[Column], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        for name, column_type in columns:
+            if column_type not in COLUMN_TYPES:
+                raise ValueError(f"Tipo de columna no soportado: {name} = {column_type}")
+        self.path = path
+        self.columns = list(columns)
+        self.row_group_size = max(1, row_group_size)
+        self.rows_written = 0
+        self._pending: List[Dict] = []
+
+    def write(self, row: Dict):
+        self._pending.append(row)
+        if len(self._pending) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._flush(self._pending)
+            self.rows_written += len(self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _flush(self, rows: List[Dict]):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class CSVResultWriter(ResultWriter):
+    def __init__(self, path: str, columns: Sequence[Column], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__(path, columns, 1)  # Fila a fila: los row groups solo tienen sentido en Parquet
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in self.columns], extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _flush(self, rows: List[Dict]):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class JSONLResultWriter(ResultWriter):
+    def __init__(self, path: str, columns: Sequence[Column], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__(path, columns, 1)  # Fila a fila: los row groups solo tienen sentido en Parquet
+        self._names = [name for name, _ in self.columns]
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _flush(self, rows: List[Dict]):
+        self._file.writelines(
+            json.dumps({name: row.get(name) for name in self._names}, ensure_ascii=False) + '\n' for row in rows
+        )
+        self._file.flush()
+
+    def _close(self):
+        self._file.close()
+
+
+class ParquetResultWriter(ResultWriter):
+    def __init__(self, path: str, columns: Sequence[Column], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        super().__init__(path, columns, row_group_size)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("El formato parquet requiere pyarrow (pip install pyarrow)")
+        arrow_types = {'bool': pa.bool_(), 'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+        self._pa = pa
+        self._schema = pa.schema([(name, arrow_types[column_type]) for name, column_type in self.columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def _flush(self, rows: List[Dict]):
+        # Un row group por grupo de filas, por columnas
+        table = self._pa.Table.from_pydict(
+            {name: [row.get(name) for row in rows] for name in self._schema.names},
+            schema=self._schema
+        )
+        self._writer.write_table(table, row_group_size=len(rows))
+
+    def _close(self):
+        self._writer.close()
+
+
+_WRITERS = {
+    'csv': CSVResultWriter,
+    'jsonl': JSONLResultWriter,
+    'parquet': ParquetResultWriter
+}
+
+
+def open_result_writer(path: str, fmt: str, columns: Sequence[Column],
+                       row_group_size: Optional[int] = None) -> ResultWriter:
+    """Writer incremental para el formato pedido ('csv', 'jsonl' o 'parquet')"""
+    if fmt not in _WRITERS:
+        raise ValueError(f"Formato no soportado: {fmt} (use {', '.join(FORMATS)})")
+    return _WRITERS[fmt](path, columns, row_group_size or DEFAULT_ROW_GROUP_SIZE)
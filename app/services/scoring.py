@@ -0,0 +1,216 @@
+"""
+Fórmulas de scoring de todos los detectores, como funciones puras sobre
+features crudas (sin red ni estado). Los detectores las usan en vivo y
+`rescore.py` las vuelve a aplicar sobre las features guardadas en el
+feature store, así que cambiar una fórmula aquí cambia ambos.
+
+Los pesos, umbrales y boosts no están aquí sino en las reglas declarativas
+(`scoring_rules`, app/data/scoring_rules.json): cada función recibe las
+reglas compiladas o usa las vigentes. `batch_scoring` evalúa las mismas
+reglas vectorizadas para lotes.
+"""
+from typing import Dict, Iterable, Optional
+
+from .scoring_rules import ScoringRules, get_scoring_rules
+
+
+def tracking_score(features: Optional[Dict], rules: Optional[ScoringRules] = None) -> int:
+    """Score del tracking detector a partir de los conteos de señales del HTML"""
+    if not features:
+        return 0
+    rules = rules or get_scoring_rules()
+    score = 0
+    for name, points in rules.tracking_family_points.items():
+        if features.get(name):
+            score += points
+    for name, points in rules.tracking_count_points.items():
+        score += points * features.get(name, 0)
+    return min(score, rules.tracking_max_score)
+
+
+def _library_score(result: Optional[Dict], points: Dict) -> float:
+    if not result or not result.get('has_ads'):
+        return 0
+    base_score = points['advertiser'] if result.get('advertiser_found') else points['no_advertiser']
+    return min(base_score + (result.get('confidence') or 0) * points['confidence_weight'], 100)
+
+
+def facebook_library_score(result: Optional[Dict], rules: Optional[ScoringRules] = None) -> float:
+    """Score de Facebook Ad Library (has_ads, advertiser_found, confidence)"""
+    return _library_score(result, (rules or get_scoring_rules()).library_points['facebook'])
+
+
+def google_transparency_score(result: Optional[Dict], rules: Optional[ScoringRules] = None) -> float:
+    """Score de Google Transparency (has_ads, advertiser_found, confidence)"""
+    return _library_score(result, (rules or get_scoring_rules()).library_points['google'])
+
+
+def combined_score(tracking: float, facebook_result: Optional[Dict], google_result: Optional[Dict],
+                   rules: Optional[ScoringRules] = None) -> Dict:
+    """Score combinado del detector básico (mismo formato que `summary`)"""
+    rules = rules or get_scoring_rules()
+    scores = {
+        'tracking_score': tracking or 0,
+        'facebook_score': facebook_library_score(facebook_result, rules),
+        'google_score': google_transparency_score(google_result, rules),
+        'final_score': 0
+    }
+
+    weights = rules.basic_weights
+    final_score = (
+        scores['tracking_score'] * weights['tracking'] +
+        scores['facebook_score'] * weights['facebook'] +
+        scores['google_score'] * weights['google']
+    )
+    scores['final_score'] = round(final_score, 1)
+
+    scores['methods_detected'] = sum([
+        1 if scores['tracking_score'] > rules.tracking_likely_threshold else 0,
+        1 if scores['facebook_score'] > 0 else 0,
+        1 if scores['google_score'] > 0 else 0
+    ])
+    scores['strongest_indicator'] = max(
+        ('tracking_score', 'facebook_score', 'google_score', 'final_score'),
+        key=lambda k: scores[k] if k != 'final_score' else 0
+    )
+    scores['rules_version'] = rules.version
+    return scores
+
+
+def advanced_risk_score(confidence_scores: Iterable[float], rules: Optional[ScoringRules] = None) -> float:
+    """Score del detector avanzado: media de los análisis que respondieron, por el multiplicador"""
+    scores = list(confidence_scores)
+    if not scores:
+        return 0.0
+    return min(100, sum(scores) / len(scores) * (rules or get_scoring_rules()).advanced_multiplier)
+
+
+def _level(score: float, levels, lowest: str) -> str:
+    for threshold, label in levels:
+        if score >= threshold:
+            return label
+    return lowest
+
+
+def evidence_strength(risk_score: float, rules: Optional[ScoringRules] = None) -> str:
+    rules = rules or get_scoring_rules()
+    return _level(risk_score, rules.evidence_strengths, rules.lowest_evidence_strength)
+
+
+def basic_priority(score: float, rules: Optional[ScoringRules] = None) -> str:
+    rules = rules or get_scoring_rules()
+    return _level(score, rules.basic_priorities, rules.basic_lowest_priority)
+
+
+def ultra_priority(ultra_score: float, rules: Optional[ScoringRules] = None) -> str:
+    rules = rules or get_scoring_rules()
+    return _level(ultra_score, rules.ultra_priorities, rules.ultra_lowest_priority)
+
+
+def ultra_assessment(basic_score: float, advanced_score: float, rules: Optional[ScoringRules] = None) -> Dict:
+    """Combinación ultra (básico + avanzado ponderados) con ajuste por concordancia"""
+    rules = rules or get_scoring_rules()
+    ultra_score = (basic_score * rules.ultra_weights['basic']) + (advanced_score * rules.ultra_weights['advanced'])
+
+    # Si ambos métodos coinciden, aumentar confianza
+    both_high = basic_score >= rules.concordance_high and advanced_score >= rules.concordance_high
+    both_low = basic_score <= rules.concordance_low and advanced_score <= rules.concordance_low
+
+    if both_high:
+        ultra_score = min(100, ultra_score * rules.concordance_high_multiplier)  # Boost si ambos detectan
+        confidence = rules.confidence_names[2]
+    elif both_low:
+        ultra_score = max(0, ultra_score * rules.concordance_low_multiplier)   # Reducir si ambos no detectan
+        confidence = rules.confidence_names[1]
+    else:
+        confidence = rules.confidence_names[0]  # Resultados mixtos
+
+    return {
+        'ultra_score': round(ultra_score, 1),
+        'basic_score': round(basic_score, 1),
+        'advanced_score': round(advanced_score, 1),
+        'confidence_level': confidence,
+        'priority': ultra_priority(ultra_score, rules),
+        'likely_has_ads': ultra_score >= rules.ultra_likely_threshold,
+        'rules_version': rules.version
+    }
+
+
+def smart_or(facebook_ads: bool, google_ads: bool, ultra_has_ads: bool, tracking: float,
+             rules: Optional[ScoringRules] = None) -> bool:
+    """
+    Decisión "smart_OR": hay anuncios si CUALQUIERA de estas condiciones se cumple:
+    Facebook Ad Library o Google Transparency detectaron ads (fuerte), el
+    score ultra pasa su umbral o el tracking es muy fuerte (moderado).
+    """
+    rules = rules or get_scoring_rules()
+    return bool(facebook_ads or google_ads or ultra_has_ads or tracking > rules.strong_tracking_threshold)
+
+
+def facebook_transparency_boost(summary: Dict, ads_in_circulation: bool, rules: Optional[ScoringRules] = None) -> Dict:
+    """Boost si la transparencia de la página de Facebook muestra anuncios activos"""
+    if not ads_in_circulation:
+        return summary
+    rules = rules or get_scoring_rules()
+    summary = dict(summary)
+    summary['overall_score'] = min(100, summary['overall_score'] + rules.facebook_transparency_boost)
+    if summary['overall_score'] >= rules.facebook_transparency_min_score:
+        summary['has_ads_detected'] = True
+        summary['confidence_level'] = rules.confidence_names[3]
+    return summary
+
+
+def score_features(features: Dict, rules: Optional[ScoringRules] = None) -> Dict:
+    """
+    Recalcula todos los scores de un dominio a partir de sus features crudas
+    (ver `feature_store.extract_features`), hasta el nivel del pipeline que
+    las produjo: 'basic' (NoAPIAdsDetector), 'ultra' o 'unified' (endpoint
+    sin APIs, con smart_OR). Las etapas que no llegaron a ejecutarse se
+    puntúan como en vivo: con 0.
+    """
+    rules = rules or get_scoring_rules()
+    pipeline = features.get('pipeline', 'basic')
+    tracking = tracking_score(features.get('tracking'), rules)
+    basic = combined_score(tracking, features.get('facebook_library'), features.get('google_transparency'), rules)
+    scores = {
+        'tracking_score': tracking,
+        'facebook_score': basic['facebook_score'],
+        'google_score': basic['google_score'],
+        'basic_score': basic['final_score'],
+        'likely_has_ads': basic['final_score'] >= rules.basic_likely_threshold,
+        'rules_version': rules.version
+    }
+
+    if pipeline == 'basic':
+        return scores
+
+    advanced = features.get('advanced') or {}
+    risk = advanced_risk_score((advanced.get('analysis_scores') or {}).values(), rules)
+    ultra = ultra_assessment(basic['final_score'], risk, rules)
+    scores.update({
+        'advanced_score': ultra['advanced_score'],
+        'ultra_score': ultra['ultra_score'],
+        'confidence_level': ultra['confidence_level'],
+        'priority': ultra['priority'],
+        'likely_has_ads': ultra['likely_has_ads']
+    })
+
+    if pipeline != 'unified':
+        return scores
+
+    library = features.get('facebook_library') or {}
+    google = features.get('google_transparency') or {}
+    summary = {
+        'overall_score': ultra['ultra_score'],
+        'confidence_level': ultra['confidence_level'],
+        'has_ads_detected': smart_or(library.get('has_ads', False), google.get('has_ads', False),
+                                     ultra['likely_has_ads'], tracking, rules)
+    }
+    transparency = features.get('facebook_transparency') or {}
+    summary = facebook_transparency_boost(summary, transparency.get('ads_in_circulation', False), rules)
+    scores.update({
+        'overall_score': summary['overall_score'],
+        'confidence_level': summary['confidence_level'],
+        'likely_has_ads': summary['has_ads_detected']
+    })
+    return scores
@@ -0,0 +1,138 @@
+import json
+import logging
+import os
+import time
+from numbers import Number
+from typing import Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _number(value, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, Number):
+        raise ValueError(f"Regla de scoring no numérica: {name} = {value!r}")
+    return value
+
+
+def _numbers(mapping: Dict, name: str) -> Dict[str, float]:
+    return {key: _number(value, f"{name}.{key}") for key, value in mapping.items()}
+
+
+def _levels(levels: List, name: str) -> Tuple[Tuple[float, str], ...]:
+    """Niveles [umbral, nombre] ordenados de mayor a menor umbral"""
+    compiled = [(_number(threshold, name), str(label)) for threshold, label in levels]
+    return tuple(sorted(compiled, key=lambda level: level[0], reverse=True))
+
+
+class ScoringRules:
+    """
+    Reglas de scoring (pesos, umbrales, boosts) versionadas y compiladas
+    desde un fichero JSON declarativo (SCORING_RULES_FILE). Se compilan una
+    vez al cargar: los valores quedan como atributos y tuplas ya ordenadas,
+    así que evaluarlas (escalar o en lote) no interpreta nada por petición.
+    Una regla mal formada hace fallar la carga (ValueError / KeyError).
+    """
+
+    def __init__(self, data: Dict, mtime_ns: Optional[int] = None):
+        self.version = data['version']
+        self.mtime_ns = mtime_ns
+
+        tracking = data['tracking']
+        self.tracking_family_points = _numbers(tracking['family_points'], 'tracking.family_points')
+        self.tracking_count_points = _numbers(tracking['count_points'], 'tracking.count_points')
+        self.tracking_max_score = _number(tracking['max_score'], 'tracking.max_score')
+        self.tracking_likely_threshold = _number(tracking['likely_threshold'], 'tracking.likely_threshold')
+        self.tracking_detected_threshold = _number(tracking['detected_threshold'], 'tracking.detected_threshold')
+        self.strong_tracking_threshold = _number(tracking['strong_threshold'], 'tracking.strong_threshold')
+
+        self.library_points = {
+            name: _numbers(points, f'libraries.{name}') for name, points in data['libraries'].items()
+        }
+        for name in ('facebook', 'google'):
+            missing = {'advertiser', 'no_advertiser', 'confidence_weight'} - set(self.library_points.get(name, {}))
+            if missing:
+                raise ValueError(f"Faltan reglas de scoring en libraries.{name}: {sorted(missing)}")
+
+        basic = data['basic']
+        self.basic_weights = _numbers(basic['weights'], 'basic.weights')
+        self.basic_likely_threshold = _number(basic['likely_threshold'], 'basic.likely_threshold')
+        self.basic_priorities = _levels(basic['priorities'], 'basic.priorities')
+        self.basic_lowest_priority = basic['lowest_priority']
+
+        advanced = data['advanced']
+        self.advanced_multiplier = _number(advanced['multiplier'], 'advanced.multiplier')
+        self.evidence_strengths = _levels(advanced['evidence_strength'], 'advanced.evidence_strength')
+        self.lowest_evidence_strength = advanced['lowest_evidence_strength']
+
+        ultra = data['ultra']
+        concordance = ultra['concordance']
+        self.ultra_weights = _numbers(ultra['weights'], 'ultra.weights')
+        self.concordance_high = _number(concordance['high']['min_score'], 'ultra.concordance.high.min_score')
+        self.concordance_high_multiplier = _number(concordance['high']['multiplier'], 'ultra.concordance.high.multiplier')
+        self.concordance_low = _number(concordance['low']['max_score'], 'ultra.concordance.low.max_score')
+        self.concordance_low_multiplier = _number(concordance['low']['multiplier'], 'ultra.concordance.low.multiplier')
+        self.ultra_likely_threshold = _number(ultra['likely_threshold'], 'ultra.likely_threshold')
+        self.ultra_priorities = _levels(ultra['priorities'], 'ultra.priorities')
+        self.ultra_lowest_priority = ultra['lowest_priority']
+
+        unified = data['unified']
+        self.facebook_transparency_boost = _number(unified['facebook_transparency_boost'], 'unified.facebook_transparency_boost')
+        self.facebook_transparency_min_score = _number(
+            unified['facebook_transparency_min_score'], 'unified.facebook_transparency_min_score'
+        )
+
+        # Niveles de confianza con su código para el motor en lote (índice en la tupla)
+        self.confidence_names = (
+            concordance['mixed_confidence'],
+            concordance['low']['confidence'],
+            concordance['high']['confidence'],
+            unified['facebook_transparency_confidence']
+        )
+
+        # Prioridades de menor a mayor con sus umbrales (códigos del motor en lote)
+        self.ultra_priority_names = (self.ultra_lowest_priority,) + tuple(
+            label for _, label in reversed(self.ultra_priorities)
+        )
+        self.ultra_thresholds = tuple(threshold for threshold, _ in reversed(self.ultra_priorities))
+        self.basic_priority_names = (self.basic_lowest_priority,) + tuple(
+            label for _, label in reversed(self.basic_priorities)
+        )
+        self.basic_thresholds = tuple(threshold for threshold, _ in reversed(self.basic_priorities))
+
+    @classmethod
+    def load(cls, path: str) -> 'ScoringRules':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data, os.stat(path).st_mtime_ns)
+
+
+_current: Optional[ScoringRules] = None
+_last_check = 0.0
+
+
+def get_scoring_rules() -> ScoringRules:
+    """
+    Reglas vigentes. Como mucho cada SCORING_RULES_RELOAD_SECONDS se
+    comprueba el mtime del fichero y, si cambió, se recompilan en caliente.
+    Si la nueva versión no es válida se siguen usando las anteriores.
+    """
+    global _current, _last_check
+    now = time.monotonic()
+    if _current is not None and now - _last_check < settings.SCORING_RULES_RELOAD_SECONDS:
+        return _current
+
+    _last_check = now
+    try:
+        mtime_ns = os.stat(settings.SCORING_RULES_FILE).st_mtime_ns
+        if _current is None or mtime_ns != _current.mtime_ns:
+            previous = _current.version if _current else None
+            _current = ScoringRules.load(settings.SCORING_RULES_FILE)
+            if previous:
+                logger.info(f"Reglas de scoring recargadas: {previous} -> {_current.version}")
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        if _current is None:
+            raise
+        logger.error(f"No se pudieron recargar las reglas de scoring, se mantiene {_current.version}: {e}")
+    return _current
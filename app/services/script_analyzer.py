@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from ..config import settings
+from .http_fetcher import http_fetcher
+from .signature_db import get_signature_db
+from .tracking_ids import create_id_scanner, extract_ids
+
+logger = logging.getLogger(__name__)
+
+
+class _BodyHasher:
+    """Consumidor para `HttpFetcher.scan`: calcula el hash del script mientras se descarga"""
+
+    budget_exhausted = False
+
+    def __init__(self):
+        self.digest = hashlib.sha256()
+
+    def feed(self, chunk) -> bool:
+        self.digest.update(chunk)
+        return False
+
+
+class ScriptAnalyzer:
+    """
+    Análisis compartido de scripts de terceros (contenedores gtm.js,
+    fbevents.js, gtag/js?id=AW-...). Cada script se descarga y se escanea
+    con la base de firmas una sola vez para todo el lote:
+
+    - caché por URL (con TTL) y deduplicación de descargas en curso: si
+      varios dominios piden el mismo contenedor a la vez, solo uno lo baja;
+    - caché por hash de contenido: el mismo fichero servido desde otra URL
+      reutiliza el escaneo ya hecho;
+    - caché de fallos (error o respuesta distinta de 200) con un TTL corto,
+      para no reintentar un script caído una vez por dominio.
+
+    Solo se analizan scripts servidos por hosts de ads/tracking del catálogo.
+    """
+
+    def __init__(self, ttl: float = settings.SCRIPT_CACHE_TTL,
+                 max_entries: int = settings.SCRIPT_CACHE_MAX_ENTRIES,
+                 max_bytes: int = settings.SCRIPT_MAX_BYTES,
+                 failure_ttl: float = settings.SCRIPT_FAILURE_TTL):
+        self.ttl = ttl
+        self.failure_ttl = failure_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._by_url: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._by_hash: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._failed: 'OrderedDict[str, float]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {'url_hits': 0, 'hash_hits': 0, 'failure_hits': 0, 'inflight_joins': 0, 'downloads': 0, 'errors': 0}
+
+    @staticmethod
+    def is_tracking_script(url: str) -> bool:
+        """El script lo sirve un host de ads/tracking del catálogo"""
+        db = get_signature_db()
+        match = db.hosts.classify_url(url)
+        return match is not None and match[0] in db.tracking_categories
+
+    async def analyze(self, url: str) -> Optional[Dict]:
+        """Análisis (IDs encontrados, hash, tamaño) de un script; None si no se pudo descargar"""
+        cached = self._by_url.get(url)
+        if cached and time.monotonic() - cached['fetched_at'] < self.ttl:
+            self._by_url.move_to_end(url)
+            self.counters['url_hits'] += 1
+            return cached
+
+        failed_at = self._failed.get(url)
+        if failed_at is not None and time.monotonic() - failed_at < self.failure_ttl:
+            self.counters['failure_hits'] += 1
+            return None
+
+        task = self._inflight.get(url)
+        if task is not None:
+            self.counters['inflight_joins'] += 1
+            return await asyncio.shield(task)
+
+        # shield: si el llamador se cancela (deadline) la descarga compartida sigue
+        task = asyncio.ensure_future(self._fetch_and_scan(url))
+        self._inflight[url] = task
+        task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    async def analyze_many(self, urls: Iterable[str]) -> List[Dict]:
+        results = await asyncio.gather(*[self.analyze(url) for url in urls], return_exceptions=True)
+        return [r for r in results if isinstance(r, dict)]
+
+    async def _fetch_and_scan(self, url: str) -> Optional[Dict]:
+        hasher = _BodyHasher()
+        try:
+            result = await http_fetcher.scan(url, hasher, timeout=10, max_bytes=self.max_bytes)
+        except Exception as e:
+            logger.debug(f"No se pudo descargar el script {url}: {e}")
+            self.counters['errors'] += 1
+            self._store(self._failed, url, time.monotonic())
+            return None
+        if result.status_code != 200:
+            self.counters['errors'] += 1
+            self._store(self._failed, url, time.monotonic())
+            return None
+
+        self.counters['downloads'] += 1
+        content_hash = hasher.digest.hexdigest()
+        by_hash = self._by_hash.get(content_hash)
+        if by_hash is not None:
+            self.counters['hash_hits'] += 1
+            ids = by_hash['ids']
+        else:
+            scanner = create_id_scanner()
+            scanner.feed(result.body)
+            if not result.truncated:
+                scanner.close()
+            ids = extract_ids(scanner)
+
+        entry = {
+            'url': url,
+            'host': urlparse(url).hostname,
+            'content_hash': content_hash,
+            'bytes': result.bytes_read,
+            'truncated': result.truncated,
+            'ids': ids,
+            'fetched_at': time.monotonic()
+        }
+        self._store(self._by_hash, content_hash, entry)
+        self._store(self._by_url, url, entry)
+        self._failed.pop(url, None)
+        return entry
+
+    def _store(self, cache: OrderedDict, key: str, entry):
+        cache[key] = entry
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {'urls': len(self._by_url), 'contents': len(self._by_hash), 'failed_urls': len(self._failed), **self.counters}
+
+
+# Caché compartida por todos los dominios del lote
+script_analyzer = ScriptAnalyzer()
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Dict, Optional
+
+from ..config import settings
+from .domain_catalog import build_trie
+from .signatures import SignatureScanner, check_linear_pattern, compile_families
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_patterns(node):
+    """Compila (recursivamente) listas de patrones de texto a [(patrón, regex)]"""
+    if isinstance(node, dict):
+        return {key: _compile_patterns(value) for key, value in node.items()}
+    for pattern in node:
+        check_linear_pattern(pattern)
+    return [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in node]
+
+
+class SignatureDB:
+    """
+    Base de firmas versionada y compilada, compartida en solo lectura por
+    todos los detectores. Se carga desde un fichero JSON (SIGNATURES_FILE).
+    Una firma que no sea de tiempo lineal hace fallar la carga (ValueError).
+    """
+
+    def __init__(self, data: Dict, mtime_ns: Optional[int] = None):
+        self.version = data['version']
+        self.mtime_ns = mtime_ns
+
+        # Escáneres de streaming (regex de bytes por familia)
+        self.scanners = {name: compile_families(families) for name, families in data['scanners'].items()}
+
+        # Catálogo de hosts de ads / tracking / A/B testing
+        self.host_catalog = data['host_catalog']
+        self.hosts = build_trie(self.host_catalog)
+        self.tracking_categories = tuple(data['tracking_categories'])
+        # Hosts que suman en el score de tracking (lista fija, independiente del catálogo)
+        self.tracking_score_hosts = build_trie({'tracking': data['tracking_score_hosts']})
+
+        # Patrones sobre texto ya decodificado (scripts, sitemap, robots.txt)
+        self.page_patterns = _compile_patterns(data['page_patterns'])
+        self.ads_txt_google_systems = tuple(data['ads_txt_google_systems'])
+        self.cta_classes = _compile_patterns(data['cta_classes'])
+        self.commercial_schema_types = tuple(data['commercial_schema_types'])
+        self.ad_keywords = data['ad_keywords']
+
+    @classmethod
+    def load(cls, path: str) -> 'SignatureDB':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data, os.stat(path).st_mtime_ns)
+
+    def scanner(self, name: str, stop_when_complete: bool = True) -> SignatureScanner:
+        """Escáner nuevo (estado por documento) sobre familias precompiladas"""
+        return SignatureScanner(self.scanners[name], stop_when_complete=stop_when_complete)
+
+
+_current: Optional[SignatureDB] = None
+_last_check = 0.0
+
+
+def get_signature_db() -> SignatureDB:
+    """
+    Base de firmas vigente. Como mucho cada SIGNATURES_RELOAD_SECONDS se
+    comprueba el mtime del fichero y, si cambió, se recarga en caliente
+    (cada worker de gunicorn lo hace por su cuenta, sin reiniciar). Si la
+    nueva versión no es válida se sigue usando la anterior.
+    """
+    global _current, _last_check
+    now = time.monotonic()
+    if _current is not None and now - _last_check < settings.SIGNATURES_RELOAD_SECONDS:
+        return _current
+
+    _last_check = now
+    try:
+        mtime_ns = os.stat(settings.SIGNATURES_FILE).st_mtime_ns
+        if _current is None or mtime_ns != _current.mtime_ns:
+            previous = _current.version if _current else None
+            _current = SignatureDB.load(settings.SIGNATURES_FILE)
+            if previous:
+                logger.info(f"Base de firmas recargada: {previous} -> {_current.version}")
+    except (OSError, ValueError, KeyError, re.error) as e:
+        if _current is None:
+            raise
+        logger.error(f"No se pudo recargar la base de firmas, se mantiene {_current.version}: {e}")
+    return _current
+
+
+def reload_signature_db() -> SignatureDB:
+    """Fuerza la comprobación del fichero de firmas en la próxima lectura"""
+    global _last_check
+    _last_check = 0.0
+    return get_signature_db()
@@ -0,0 +1,195 @@
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse
+
+from ..config import settings
+
+_REPEATS = {sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT}
+_POSSESSIVE_REPEAT = getattr(sre_parse, 'POSSESSIVE_REPEAT', None)
+if _POSSESSIVE_REPEAT is not None:
+    _REPEATS.add(_POSSESSIVE_REPEAT)
+
+# Trozo máximo que se pasa de una vez a las regex (granularidad del presupuesto de CPU)
+FEED_SLICE_BYTES = 64 * 1024
+
+
+def _subpatterns(op, av):
+    """Subpatrones anidados de un nodo del árbol de sre_parse"""
+    if op in _REPEATS:
+        return [av[2]]
+    if op == sre_parse.SUBPATTERN:
+        return [av[-1]]
+    if op == sre_parse.BRANCH:
+        return av[1]
+    if op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+        return [av[1]]
+    if op == getattr(sre_parse, 'ATOMIC_GROUP', None):
+        return [av]
+    return []
+
+
+def _check_tree(tree, pattern: str, inside_repeat: bool = False):
+    for op, av in tree:
+        if op in (sre_parse.GROUPREF, getattr(sre_parse, 'GROUPREF_EXISTS', None)):
+            raise ValueError(f"Firma no lineal (referencia a grupo): {pattern}")
+        if op in _REPEATS and inside_repeat:
+            raise ValueError(f"Firma no lineal (cuantificadores anidados): {pattern}")
+        for sub in _subpatterns(op, av):
+            _check_tree(sub, pattern, inside_repeat or op in _REPEATS)
+
+
+def check_linear_pattern(pattern: str, max_width: int = settings.SIGNATURE_MAX_WIDTH):
+    """
+    Valida que una firma se pueda evaluar en tiempo lineal con `re`: sin
+    cuantificadores anidados ni referencias a grupos, y con longitud de
+    coincidencia acotada (`.*`, `\\s*`, `+`... se escriben como `{0,N}`).
+
+    El ancho acotado además garantiza que ninguna coincidencia se pierde
+    entre trozos del escáner (solapamiento >= ancho máximo).
+    Lanza ValueError si la firma no cumple.
+    """
+    tree = sre_parse.parse(pattern)
+    _check_tree(tree, pattern)
+    _, max_len = tree.getwidth()
+    if max_len > max_width:
+        raise ValueError(f"Firma sin longitud acotada (máx. {max_width}): {pattern}")
+
+
+class CompiledFamilies(dict):
+    """Familias de firmas ya compiladas: nombre -> [(patrón, regex de bytes)]"""
+
+
+def compile_families(families: Dict[str, List[str]]) -> CompiledFamilies:
+    """Compila familias de patrones a regex de bytes (una sola vez, no por petición)"""
+    compiled = CompiledFamilies()
+    for name, patterns in families.items():
+        for pattern in patterns:
+            check_linear_pattern(pattern)
+        compiled[name] = [(pattern, re.compile(pattern.encode('utf-8'), re.IGNORECASE)) for pattern in patterns]
+    return compiled
+
+
+class CpuBudget:
+    """Tiempo de CPU (ms) que se permite gastar en matching para un documento"""
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = settings.SIGNATURE_CPU_BUDGET_MS if budget_ms is None else budget_ms
+        self.spent_ms = 0.0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.spent_ms >= self.budget_ms
+
+    def charge(self, started: float):
+        """Suma el tiempo transcurrido desde `started` (time.perf_counter())"""
+        self.spent_ms += (time.perf_counter() - started) * 1000
+
+
+class SignatureScanner:
+    """
+    Busca familias de firmas (regex) en un documento que llega por trozos.
+
+    Trabaja directamente sobre bytes: los patrones se compilan como regex de
+    bytes con IGNORECASE (plegado ASCII), así que no hace falta decodificar
+    ni adivinar el charset de la página para escanearla.
+
+    Una familia queda "decidida" en cuanto alguno de sus patrones aparece;
+    cuando todas lo están (`complete`) el llamador puede dejar de descargar.
+    Entre trozos se conserva un solapamiento para no perder coincidencias
+    partidas, sin contar dos veces las que ya se vieron. Una coincidencia
+    que toca el final del buffer puede ser el prefijo de otra más larga
+    (`AW-1234567` de `AW-123456789`): se retiene hasta el siguiente trozo o
+    hasta `close()`, que se llama al terminar el documento completo.
+
+    Las firmas son de tiempo lineal (ver `check_linear_pattern`) y además
+    cada documento tiene un presupuesto de CPU: si se agota, el escáner deja
+    de buscar (`budget_exhausted`) con las coincidencias que lleve.
+
+    Con `stop_when_complete=False` se recorre el documento entero aunque
+    todas las familias estén decididas (p. ej. para recoger todos los IDs).
+    """
+
+    def __init__(self, families: Dict[str, List[str]], overlap: int = settings.SIGNATURE_MAX_WIDTH,
+                 cpu_budget_ms: Optional[float] = None, stop_when_complete: bool = True):
+        # Las familias de la base de firmas llegan ya compiladas
+        if not isinstance(families, CompiledFamilies):
+            families = compile_families(families)
+        self.families: Dict[str, List[Tuple[str, Pattern]]] = families
+        self.overlap = overlap
+        self.stop_when_complete = stop_when_complete
+        self.budget = CpuBudget(cpu_budget_ms)
+        self.matches: Dict[str, List[str]] = {name: [] for name in families}
+        self.found_patterns: Dict[str, List[str]] = {name: [] for name in families}
+        self.bytes_scanned = 0
+        self._tail = b''
+        self._closed = False
+
+    @property
+    def complete(self) -> bool:
+        """Todas las familias tienen al menos una coincidencia"""
+        return all(self.matches.values())
+
+    @property
+    def budget_exhausted(self) -> bool:
+        return self.budget.exhausted
+
+    def decided(self, family: str) -> bool:
+        return bool(self.matches[family])
+
+    def feed(self, chunk) -> bool:
+        """
+        Escanea un trozo nuevo (bytes, bytearray o memoryview); devuelve True
+        si ya no hace falta seguir (todas las familias decididas o
+        presupuesto de CPU agotado).
+        """
+        view = memoryview(chunk)
+        for start in range(0, len(view), FEED_SLICE_BYTES):
+            if self._should_stop():
+                break
+            self._feed_slice(view[start:start + FEED_SLICE_BYTES])
+        return self._should_stop()
+
+    def _should_stop(self) -> bool:
+        return (self.stop_when_complete and self.complete) or self.budget.exhausted
+
+    def close(self):
+        """
+        Fin del documento: cuenta las coincidencias retenidas al final del
+        buffer. No se llama si la descarga se cortó (el final puede ser un
+        ID a medias).
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._tail and not self.budget.exhausted:
+            started = time.perf_counter()
+            self._match(self._tail, len(self._tail), final=True)
+            self.budget.charge(started)
+
+    def _feed_slice(self, chunk: memoryview):
+        started = time.perf_counter()
+        data = self._tail + chunk.tobytes()
+        self._match(data, len(self._tail), final=False)
+        self.bytes_scanned += len(chunk)
+        self._tail = data[-self.overlap:]
+        self.budget.charge(started)
+
+    def _match(self, data: bytes, already_scanned: int, final: bool):
+        for name, patterns in self.families.items():
+            for pattern, compiled in patterns:
+                for match in compiled.finditer(data):
+                    # Las que terminan dentro del solapamiento ya se contaron (o se
+                    # retuvieron en el final del buffer anterior y se cuentan ahora)
+                    if match.end() < already_scanned:
+                        continue
+                    # Tocan el final del buffer: pueden seguir en el siguiente trozo
+                    if match.end() == len(data) and not final:
+                        continue
+                    self.matches[name].append(match.group(0).decode('utf-8', errors='replace'))
+                    if pattern not in self.found_patterns[name]:
+                        self.found_patterns[name].append(pattern)
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser
+
+from ..config import settings
+from .deadline import Deadline
+from .http_fetcher import http_fetcher
+from .signature_db import get_signature_db
+
+logger = logging.getLogger(__name__)
+
+# Profundidad máxima de índices anidados (índice -> índice -> sitemap)
+MAX_INDEX_DEPTH = 2
+
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+def _local_name(tag: str) -> str:
+    """Nombre del elemento sin namespace ("{http://...}loc" -> "loc")"""
+    return tag.rsplit('}', 1)[-1]
+
+
+class _CrawlState:
+    """Contadores y límites compartidos por todos los ficheros de un host"""
+
+    def __init__(self, max_files: int, max_urls: int, max_bytes: int):
+        self.max_files = max_files
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.campaign_patterns = get_signature_db().page_patterns['sitemap_campaign']
+
+        self.files_fetched: List[str] = []
+        self.urls_seen = 0
+        self.bytes_parsed = 0
+        self.campaign_paths: Dict[str, int] = {}
+        self.utm_urls = 0
+        self.truncated = False
+        self.errors = 0
+
+    @property
+    def exhausted(self) -> bool:
+        return self.urls_seen >= self.max_urls or self.bytes_parsed >= self.max_bytes
+
+    def add_url(self, url: str):
+        """Cuenta una URL de página y las rutas de campaña que contiene"""
+        self.urls_seen += 1
+        for pattern, compiled in self.campaign_patterns:
+            if compiled.search(url):
+                self.campaign_paths[pattern] = self.campaign_paths.get(pattern, 0) + 1
+        if 'utm_' in url:
+            self.utm_urls += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            'found': bool(self.files_fetched),
+            'files_fetched': len(self.files_fetched),
+            'urls_seen': self.urls_seen,
+            'bytes_parsed': self.bytes_parsed,
+            'campaign_paths': self.campaign_paths,
+            'utm_urls': self.utm_urls,
+            'truncated': self.truncated,
+            'errors': self.errors
+        }
+
+
+class SitemapStreamParser:
+    """
+    Parser incremental de un sitemap (urlset o sitemapindex), gzip o no.
+    Recibe el cuerpo por trozos (`feed(chunk) -> bool`, como el escáner de
+    firmas), descomprime y parsea con XMLPullParser sin guardar el documento,
+    y suelta cada <url>/<sitemap> del árbol en cuanto se procesa (memoria
+    constante aunque el fichero tenga millones de URLs). Al cortar indica
+    el motivo en `stop_reason` ('url_cap', 'byte_cap' o 'parse_error').
+    """
+
+    budget_exhausted = False  # Compatibilidad con HttpFetcher.scan
+
+    def __init__(self, state: _CrawlState):
+        self.state = state
+        self.child_sitemaps: List[str] = []
+        self.urls = 0
+        self.stopped = False
+        self.stop_reason: Optional[str] = None
+        self.error = False
+        self._xml = XMLPullParser(events=('start', 'end'))
+        self._stack: List[str] = []
+        self._elements: List[Element] = []
+        self._decompressor = None
+        self._head: Optional[bytes] = b''
+
+    def feed(self, chunk) -> bool:
+        if self.stopped:
+            return True
+        chunk = bytes(chunk)
+
+        if self._head is not None:
+            # .xml.gz servido tal cual (sin Content-Encoding): se detecta por la
+            # cabecera gzip, que puede llegar repartida en varios trozos
+            chunk = self._head + chunk
+            if len(chunk) < len(_GZIP_MAGIC):
+                self._head = chunk
+                return False
+            self._head = None
+            if chunk.startswith(_GZIP_MAGIC):
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        room = self.state.max_bytes - self.state.bytes_parsed
+        data = chunk
+        if self._decompressor is not None:
+            try:
+                # Se limita la salida: un gzip-bomb no puede pasar del tope de bytes
+                data = self._decompressor.decompress(chunk, room + 1)
+            except zlib.error:
+                return self._stop(error=True)
+        if len(data) > room:
+            data = data[:room]
+            self.state.truncated = True
+            self.stopped = True
+            self.stop_reason = 'byte_cap'
+        self.state.bytes_parsed += len(data)
+
+        try:
+            self._xml.feed(data)
+            self._handle_events()
+        except ParseError:
+            return self._stop(error=True)
+        return self.stopped
+
+    def _handle_events(self):
+        for event, elem in self._xml.read_events():
+            name = _local_name(elem.tag)
+            if event == 'start':
+                self._stack.append(name)
+                self._elements.append(elem)
+                continue
+
+            self._stack.pop()
+            self._elements.pop()
+            if name == 'loc' and self._stack:
+                loc = (elem.text or '').strip()
+                parent = self._stack[-1]
+                if parent == 'sitemap' and loc:
+                    self.child_sitemaps.append(loc)
+                elif parent == 'url' and loc:
+                    self.urls += 1
+                    self.state.add_url(loc)
+                    if self.state.urls_seen >= self.state.max_urls:
+                        self.state.truncated = True
+                        self._stop('url_cap')
+                        return
+            elif name in ('url', 'sitemap'):
+                # clear() no basta: el elemento vacío seguiría colgando de la raíz
+                elem.clear()
+                if self._elements:
+                    self._elements[-1].remove(elem)
+
+    def _stop(self, reason: str = 'parse_error', error: bool = False) -> bool:
+        self.stopped = True
+        self.stop_reason = reason
+        if error:
+            self.error = True
+            self.state.errors += 1
+        return True
+
+
+class SitemapCrawler:
+    """
+    Recorre los sitemaps de un host en streaming: sigue las entradas de
+    sitemap_index.xml en paralelo (con límite de concurrencia y de
+    profundidad), respeta topes de ficheros, URLs y bytes descomprimidos, y
+    cuenta las rutas de campaña mientras parsea. El resultado se cachea por
+    host durante SITEMAP_CACHE_TTL.
+    """
+
+    def __init__(self, max_files: int = settings.SITEMAP_MAX_FILES,
+                 max_urls: int = settings.SITEMAP_MAX_URLS,
+                 max_bytes: int = settings.SITEMAP_MAX_BYTES,
+                 concurrency: int = settings.SITEMAP_CONCURRENCY,
+                 cache_ttl: float = settings.SITEMAP_CACHE_TTL,
+                 cache_max_hosts: int = settings.SITEMAP_CACHE_MAX_HOSTS):
+        self.max_files = max_files
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.cache_ttl = cache_ttl
+        self.cache_max_hosts = cache_max_hosts
+        self._cache: 'OrderedDict[str, tuple]' = OrderedDict()
+
+    async def crawl(self, domain: str, deadline: Optional[Deadline] = None) -> Dict:
+        """
+        Estadísticas de los sitemaps del host. Con un `deadline`, los timeouts
+        se acotan a lo que queda y un recorrido que se quedó sin tiempo no se
+        cachea.
+        """
+        deadline = deadline or Deadline()
+        host = domain.lower()
+        cached = self._cache.get(host)
+        if cached and time.monotonic() - cached[0] < self.cache_ttl:
+            self._cache.move_to_end(host)
+            return cached[1]
+
+        state = _CrawlState(self.max_files, self.max_urls, self.max_bytes)
+        candidates = [
+            f'https://{host}/sitemap.xml',
+            f'https://{host}/sitemap_index.xml',
+            f'https://www.{host}/sitemap.xml'
+        ]
+
+        children = None
+        for url in candidates:
+            children = await self._fetch_file(url, state, deadline)
+            if children is not None:
+                break
+
+        # Índices: los hijos de cada nivel se descargan en paralelo
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(url: str):
+            async with semaphore:
+                return await self._fetch_file(url, state, deadline)
+
+        depth = 1
+        level = children or []
+        while level and depth <= MAX_INDEX_DEPTH and not state.exhausted:
+            room = state.max_files - len(state.files_fetched)
+            if len(level) > room:
+                state.truncated = True
+                level = level[:room]
+            results = await asyncio.gather(*[bounded(url) for url in level])
+            level = [child for result in results if result for child in result]
+            depth += 1
+        if level:
+            state.truncated = True
+
+        result = state.to_dict()
+        if deadline.expired():
+            return result
+        self._cache[host] = (time.monotonic(), result)
+        self._cache.move_to_end(host)
+        while len(self._cache) > self.cache_max_hosts:
+            self._cache.popitem(last=False)
+        return result
+
+    async def _fetch_file(self, url: str, state: _CrawlState, deadline: Deadline) -> Optional[List[str]]:
+        """
+        Descarga y parsea un fichero de sitemap. Devuelve las entradas de
+        índice encontradas (lista vacía si es un urlset) o None si no existe.
+        """
+        if len(state.files_fetched) >= state.max_files or state.exhausted:
+            return None
+
+        parser = SitemapStreamParser(state)
+        try:
+            result = await http_fetcher.scan(
+                url, parser, headers={'Accept': 'application/xml,text/xml,*/*;q=0.5'},
+                timeout=deadline.timeout(10), max_bytes=state.max_bytes, keep_body=False
+            )
+        except Exception as e:
+            logger.debug(f"No se pudo descargar el sitemap {url}: {e}")
+            state.errors += 1
+            return None
+
+        if result.status_code != 200 or (parser.error and not parser.child_sitemaps and not parser.urls):
+            return None
+
+        state.files_fetched.append(url)
+        if result.stop_reason in ('byte_cap', 'url_cap'):
+            state.truncated = True
+        return parser.child_sitemaps
+
+
+# Instancia compartida (la caché por host es común a todas las peticiones)
+sitemap_crawler = SitemapCrawler()
@@ -1,10 +1,19 @@
-import httpx
-import re
-from bs4 import BeautifulSoup
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse
 import asyncio
 from fake_useragent import UserAgent
+from .http_fetcher import ScanResult, http_fetcher, decode_html, replay
+from .deadline import Deadline
+from .signatures import SignatureScanner
+from .dom_features import extract_dom_features
+from .tracking_ids import create_id_scanner, extract_ids
+from .signature_db import get_signature_db
+from . import scoring
+from .scoring_rules import get_scoring_rules
+
+# Meta tags y scripts que cuentan como señal de tracking en el score
+SOCIAL_META_KEYWORDS = ['fb:', 'og:', 'pixel']
+TRACKING_SCRIPT_MARKERS = ['fbq', 'gtag', 'ga(', 'fbevents.js', 'gtm.js']
 
 
 class TrackingDetector:
@@ -14,67 +23,44 @@ class TrackingDetector:
         self.timeout = 10
         ua = UserAgent()
         self.user_agent = ua.random
-        
-        # Patrones para detectar tracking de Facebook/Meta
-        self.facebook_patterns = [
-            r'facebook\.com/tr',
-            r'fbq\s*\(',
-            r'_fbp',
-            r'_fbc',
-            r'facebook\.net',
-            r'connect\.facebook\.net',
-            r'Meta\s+Pixel',
-            r'FB\.init'
-        ]
-        
-        # Patrones para detectar tracking de Google Ads
-        self.google_ads_patterns = [
-            r'googleadservices\.com',
-            r'googlesyndication\.com',
-            r'doubleclick\.net',
-            r'gtag\s*\(',
-            r'ga\s*\(',
-            r'google_ad_client',
-            r'_gac_',
-            r'_gcl_',
-            r'conversion_id',
-            r'google_conversion_id',
-            r'gtm\.js',
-            r'adnxs\.com'
-        ]
-        
-        # Patrones UTM y parámetros de campaigns
-        self.campaign_patterns = [
-            r'utm_source',
-            r'utm_medium',
-            r'utm_campaign',
-            r'gclid=',
-            r'fbclid=',
-            r'msclkid='
-        ]
     
-    async def analyze_website(self, domain: str) -> Dict:
-        """Analiza un sitio web para detectar indicadores de anuncios"""
+    async def analyze_website(self, domain: str, deadline: Optional[Deadline] = None,
+                              page: Optional[ScanResult] = None) -> Dict:
+        """
+        Analiza un sitio web para detectar indicadores de anuncios. Con un
+        `deadline`, los timeouts de las descargas se acotan a lo que queda.
+        `page` es la home ya descargada (con cuerpo): si sirve, se escanea
+        sin volver a descargarla.
+        """
         normalized_domain = self.normalize_domain(domain)
         
         try:
-            # Obtener contenido del sitio
-            html_content = await self.fetch_website_content(f"https://{normalized_domain}")
-            if not html_content:
-                html_content = await self.fetch_website_content(f"http://{normalized_domain}")
+            # Obtener contenido del sitio (escaneando firmas mientras se descarga)
+            scan = self.scan_page(page) if page is not None else None
+            if not scan:
+                scan = await self.scan_website_content(f"https://{normalized_domain}", deadline)
+            if not scan:
+                scan = await self.scan_website_content(f"http://{normalized_domain}", deadline)
             
-            if not html_content:
+            if not scan:
                 return self.create_analysis_result(normalized_domain, False, 0, "No se pudo acceder al sitio")
             
             # Analizar contenido
-            analysis = self.analyze_html_content(html_content)
+            html_content, scanner, scan_info = scan
+            analysis = self.analyze_html_content(html_content, scanner)
+            analysis['scan'] = scan_info
+            # Si la descarga se cortó (firmas decididas, tope de bytes o de CPU), el DOM, los
+            # dominios externos y los IDs salen del mismo prefijo que el escaneo de firmas
+            analysis['features_from_prefix'] = scan_info['truncated']
             
-            # Calcular score de probabilidad
-            probability_score = self.calculate_probability_score(analysis)
+            # Calcular score de probabilidad (las features crudas se guardan para re-puntuar)
+            rules = get_scoring_rules()
+            analysis['score_features'] = self.extract_score_features(analysis)
+            probability_score = scoring.tracking_score(analysis['score_features'], rules)
             
             return self.create_analysis_result(
                 normalized_domain, 
-                probability_score > 30,  # Umbral del 30%
+                probability_score > rules.tracking_likely_threshold,  # Umbral del 30%
                 probability_score,
                 analysis
             )
@@ -91,8 +77,29 @@ class TrackingDetector:
             domain = domain[:-1]
         return domain
     
-    async def fetch_website_content(self, url: str) -> Optional[str]:
-        """Obtiene el contenido HTML de un sitio web"""
+    def create_scanner(self) -> SignatureScanner:
+        """Escáner con las familias de firmas de tracking (facebook, google_ads, campaign)"""
+        return get_signature_db().scanner('tracking')
+    
+    def scan_page(self, page: ScanResult) -> Optional[Tuple[str, SignatureScanner, Dict]]:
+        """Como `scan_website_content`, sobre una home ya descargada"""
+        scanner = self.create_scanner()
+        result = replay(page, scanner)
+        if self._usable(result):
+            return result.text, scanner, result.scan_info()
+        return None
+    
+    def _usable(self, result: ScanResult) -> bool:
+        # Aceptar códigos de respuesta que aún pueden tener contenido útil
+        return result.status_code in [200, 403, 301, 302] and result.bytes_read > 100
+    
+    async def scan_website_content(self, url: str,
+                                   deadline: Optional[Deadline] = None) -> Optional[Tuple[str, SignatureScanner, Dict]]:
+        """
+        Descarga el HTML en streaming alimentando el escáner de firmas.
+        Devuelve (html leído, escáner, info del escaneo) o None si no se pudo acceder.
+        """
+        deadline = deadline or Deadline()
         headers_list = [
             {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36',
@@ -113,31 +120,51 @@ class TrackingDetector:
         ]
         
         for headers in headers_list:
+            scanner = self.create_scanner()
             try:
-                async with httpx.AsyncClient(timeout=15, follow_redirects=True) as client:
-                    response = await client.get(url, headers=headers)
+                result = await http_fetcher.scan(url, scanner, headers=headers, timeout=deadline.timeout(15))
+                
+                # El HTML solo se decodifica aquí, para el parseo del DOM
+                if self._usable(result):
+                    return result.text, scanner, result.scan_info()
                     
-                    # Aceptar códigos de respuesta que aún pueden tener contenido útil
-                    if response.status_code in [200, 403, 301, 302] and len(response.text) > 100:
-                        return response.text
-                        
             except Exception:
                 continue
                 
-        # Si todas las opciones fallan, intentar con requests básico
+        # Si todas las opciones fallan, intentar con requests básico (en un hilo: es bloqueante
+        # y la cancelación del deadline no lo interrumpe, solo deja de esperarlo)
         try:
             import requests
-            response = requests.get(url, timeout=10, allow_redirects=True)
-            if response.status_code in [200, 403] and len(response.text) > 100:
-                return response.text
+            response = await asyncio.to_thread(
+                requests.get, url, timeout=deadline.timeout(self.timeout), allow_redirects=True
+            )
+            if response.status_code in [200, 403] and len(response.content) > 100:
+                scanner = self.create_scanner()
+                scanner.feed(response.content)
+                scanner.close()
+                declared = response.encoding if 'charset' in response.headers.get('content-type', '').lower() else None
+                return decode_html(response.content, declared), scanner, {
+                    'bytes_read': len(response.content),
+                    'truncated': False,
+                    'stop_reason': 'eof'
+                }
         except Exception:
             pass
             
         return None
     
-    def analyze_html_content(self, html: str) -> Dict:
-        """Analiza el contenido HTML buscando indicadores de tracking"""
-        soup = BeautifulSoup(html, 'html.parser')
+    def analyze_html_content(self, html: str, scanner: Optional[SignatureScanner] = None) -> Dict:
+        """
+        Analiza el contenido HTML buscando indicadores de tracking.
+        Si el HTML ya se escaneó durante la descarga se reutiliza ese escáner.
+        """
+        if scanner is None:
+            scanner = self.create_scanner()
+            scanner.feed(html.encode('utf-8'))
+            scanner.close()
+        
+        # Scripts y meta tags salen del mismo recorrido del DOM
+        features = extract_dom_features(html)
         
         analysis = {
             'facebook_indicators': [],
@@ -145,34 +172,17 @@ class TrackingDetector:
             'campaign_indicators': [],
             'scripts_found': [],
             'meta_tags': [],
-            'external_domains': set()
+            'external_domains': set(),
+            'tracking_ids': {}
         }
         
-        # Buscar en todo el HTML
-        full_text = str(soup).lower()
-        
-        # Detectar Facebook/Meta tracking
-        for pattern in self.facebook_patterns:
-            matches = re.findall(pattern, full_text, re.IGNORECASE)
-            if matches:
-                analysis['facebook_indicators'].extend(matches)
-        
-        # Detectar Google Ads tracking  
-        for pattern in self.google_ads_patterns:
-            matches = re.findall(pattern, full_text, re.IGNORECASE)
-            if matches:
-                analysis['google_ads_indicators'].extend(matches)
-        
-        # Detectar parámetros de campaign
-        for pattern in self.campaign_patterns:
-            matches = re.findall(pattern, full_text, re.IGNORECASE)
-            if matches:
-                analysis['campaign_indicators'].extend(matches)
+        # Indicadores de Facebook/Meta, Google Ads y parámetros de campaign
+        analysis['facebook_indicators'].extend(scanner.matches['facebook'])
+        analysis['google_ads_indicators'].extend(scanner.matches['google_ads'])
+        analysis['campaign_indicators'].extend(scanner.matches['campaign'])
         
         # Analizar scripts externos
-        scripts = soup.find_all('script', src=True)
-        for script in scripts:
-            src = script.get('src', '')
+        for src in features.script_srcs:
             if src:
                 analysis['scripts_found'].append(src)
                 domain = self.extract_domain(src)
@@ -180,18 +190,15 @@ class TrackingDetector:
                     analysis['external_domains'].add(domain)
         
         # Analizar meta tags relevantes
-        meta_tags = soup.find_all('meta')
-        for meta in meta_tags:
-            name = meta.get('name', '').lower()
-            property_attr = meta.get('property', '').lower()
-            content = meta.get('content', '')
-            
-            if any(keyword in name + property_attr for keyword in ['facebook', 'fb:', 'og:', 'google', 'pixel']):
-                analysis['meta_tags'].append({
-                    'name': name,
-                    'property': property_attr,
-                    'content': content
-                })
+        for meta in features.meta_tags:
+            if any(keyword in meta['name'] + meta['property'] for keyword in ['facebook', 'fb:', 'og:', 'google', 'pixel']):
+                analysis['meta_tags'].append(meta)
+        
+        # IDs de píxel / conversión / contenedor (fbq init, AW-, GTM-, G-, UA-)
+        id_scanner = create_id_scanner()
+        id_scanner.feed(html.encode('utf-8'))
+        id_scanner.close()
+        analysis['tracking_ids'] = extract_ids(id_scanner)
         
         # Convertir set a list para JSON serialization
         analysis['external_domains'] = list(analysis['external_domains'])
@@ -206,45 +213,31 @@ class TrackingDetector:
         except:
             return None
     
+    def extract_score_features(self, analysis: Dict) -> Dict:
+        """Conteos de señales del HTML que usa el score (ver `scoring.tracking_score`)"""
+        db = get_signature_db()
+        return {
+            'facebook_indicators': len(analysis['facebook_indicators']),
+            'google_ads_indicators': len(analysis['google_ads_indicators']),
+            'campaign_indicators': len(analysis['campaign_indicators']),
+            # Dominios externos de tracking conocidos (lista del score, por límites de etiqueta)
+            'tracking_domains': sum(
+                1 for domain in analysis['external_domains']
+                if db.tracking_score_hosts.classify_host(domain)
+            ),
+            'social_meta_tags': sum(
+                1 for meta in analysis['meta_tags']
+                if any(keyword in meta['property'] + meta['name'] for keyword in SOCIAL_META_KEYWORDS)
+            ),
+            'tracking_scripts': sum(
+                1 for script in analysis['scripts_found']
+                if any(marker in script.lower() for marker in TRACKING_SCRIPT_MARKERS)
+            )
+        }
+    
     def calculate_probability_score(self, analysis: Dict) -> int:
         """Calcula un score de probabilidad de que el sitio tenga anuncios activos"""
-        score = 0
-        
-        # Facebook/Meta indicators (peso alto)
-        if analysis['facebook_indicators']:
-            score += 40
-        
-        # Google Ads indicators (peso alto)
-        if analysis['google_ads_indicators']:
-            score += 40
-        
-        # Campaign parameters (peso medio)
-        if analysis['campaign_indicators']:
-            score += 20
-        
-        # Dominios externos de tracking conocidos
-        tracking_domains = [
-            'facebook.com', 'facebook.net', 'connect.facebook.net',
-            'googleadservices.com', 'googlesyndication.com', 'doubleclick.net',
-            'google-analytics.com', 'googletagmanager.com'
-        ]
-        
-        for domain in analysis['external_domains']:
-            if any(tracking in domain for tracking in tracking_domains):
-                score += 15
-        
-        # Meta tags relevantes
-        for meta in analysis['meta_tags']:
-            if any(keyword in meta['property'] + meta['name'] for keyword in ['fb:', 'og:', 'pixel']):
-                score += 10
-        
-        # Scripts específicos
-        tracking_scripts = ['fbq', 'gtag', 'ga(', 'fbevents.js', 'gtm.js']
-        for script in analysis['scripts_found']:
-            if any(tracking in script.lower() for tracking in tracking_scripts):
-                score += 15
-        
-        return min(score, 100)  # Máximo 100%
+        return scoring.tracking_score(self.extract_score_features(analysis))
     
     def create_analysis_result(self, domain: str, likely_has_ads: bool, score: int, details) -> Dict:
         """Crea el resultado del análisis"""
@@ -256,7 +249,9 @@ class TrackingDetector:
             'google_ads_tracking_detected': bool(details.get('google_ads_indicators', [])) if isinstance(details, dict) else False,
             'campaign_parameters_detected': bool(details.get('campaign_indicators', [])) if isinstance(details, dict) else False,
             'analysis_details': details if isinstance(details, dict) else {'message': str(details)},
-            'recommendation': self.get_recommendation(score)
+            'recommendation': self.get_recommendation(score),
+            'signatures_version': get_signature_db().version,
+            'rules_version': get_scoring_rules().version
         }
     
     def get_recommendation(self, score: int) -> str:
@@ -0,0 +1,47 @@
+import re
+from typing import Dict, Iterable, List
+
+from .signatures import SignatureScanner
+from .signature_db import get_signature_db
+
+# Nombre del escáner de la base de firmas y tipos de ID que extrae
+ID_SCANNER = 'tracking_ids'
+ID_TYPES = ('google_ads', 'meta_pixel', 'gtm', 'ga4', 'ua')
+
+_DIGITS_RE = re.compile(r'\d{6,20}')
+
+
+def create_id_scanner() -> SignatureScanner:
+    """Escáner de IDs que recorre el documento entero (no para en la primera coincidencia)"""
+    return get_signature_db().scanner(ID_SCANNER, stop_when_complete=False)
+
+
+def _normalize(id_type: str, match: str) -> str:
+    """Forma canónica del ID a partir del texto que coincidió con la firma"""
+    if id_type == 'google_ads':
+        # "AW-123", "vtp_conversionId":"123" o google_conversion_id = 123 -> "AW-123"
+        digits = _DIGITS_RE.findall(match)
+        return f"AW-{digits[-1]}" if digits else match.upper()
+    if id_type == 'meta_pixel':
+        digits = _DIGITS_RE.findall(match)
+        return digits[-1] if digits else match
+    return match.upper()
+
+
+def extract_ids(scanner: SignatureScanner) -> Dict[str, List[str]]:
+    """IDs de píxel / conversión / contenedor encontrados por un escáner de IDs, sin duplicados"""
+    ids = {}
+    for id_type, matches in scanner.matches.items():
+        values = sorted({_normalize(id_type, match) for match in matches})
+        if values:
+            ids[id_type] = values
+    return ids
+
+
+def merge_ids(id_maps: Iterable[Dict[str, List[str]]]) -> Dict[str, List[str]]:
+    """Une varios diccionarios tipo -> [IDs]"""
+    merged: Dict[str, set] = {}
+    for id_map in id_maps:
+        for id_type, values in id_map.items():
+            merged.setdefault(id_type, set()).update(values)
+    return {id_type: sorted(values) for id_type, values in merged.items()}
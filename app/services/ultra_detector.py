@@ -1,7 +1,15 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 import asyncio
 from .advanced_detector import AdvancedAdsDetector
 from .no_api_detector import NoAPIAdsDetector
+from .deadline import Deadline
+from .http_fetcher import ScanResult
+from .signature_db import get_signature_db
+from .id_index import get_id_index
+from .preclassifier import get_preclassifier
+from .result_records import DomainRecord
+from ..config import settings
+from . import scoring
 
 class UltraAdvancedDetector:
     """
@@ -12,18 +20,65 @@ class UltraAdvancedDetector:
         self.basic_detector = NoAPIAdsDetector()
         self.advanced_detector = AdvancedAdsDetector()
     
-    async def analyze_domain_ultra(self, domain: str) -> Dict:
+    async def analyze_domain_ultra(self, domain: str, deadline: Optional[Deadline] = None,
+                                   page: Optional[ScanResult] = None) -> Dict:
         """
-        Análisis ultra-completo combinando todas las técnicas disponibles
+        Análisis ultra-completo combinando todas las técnicas disponibles.
+        Si se pasa un `deadline`, las etapas que no terminan a tiempo se omiten
+        y el score se calcula con las señales disponibles.
+
+        Con un pre-clasificador entrenado en modo 'gate' primero se analiza la
+        home y, si el modelo la descarta, no se lanzan la búsqueda en Facebook
+        Ad Library ni el análisis avanzado (se puntúan con 0). En modo
+        'shadow' se ejecuta todo y solo se anota lo que habría decidido.
+
+        `page` es la home ya descargada (p. ej. por el GET condicional del
+        re-escaneo): el análisis de tracking y el avanzado la reutilizan.
         """
+        deadline = deadline or Deadline()
         try:
+            preclassifier = get_preclassifier()
+            decision = None
+            tracking_task = None
+            gate = preclassifier is not None and settings.PRECLASSIFIER_MODE == 'gate'
+            if gate or page is not None:
+                tracking_task = asyncio.ensure_future(deadline.run(
+                    'website_tracking', self.basic_detector.tracking_detector.analyze_website(domain, deadline, page)
+                ))
+            if gate:
+                try:
+                    decision = preclassifier.decide(await asyncio.shield(tracking_task))
+                except Exception:
+                    decision = preclassifier.decide(None)
+                decision['skipped'] = decision['skip_expensive_stages']
+            skip = bool(decision and decision['skipped'])
+            if skip:
+                deadline.gate('facebook_ad_library', 'advanced_detection')
+            
             # Ejecutar análisis básico y avanzado en paralelo
             basic_result, advanced_result = await asyncio.gather(
-                self.basic_detector.analyze_domain_comprehensive(domain),
-                self.advanced_detector.analyze_domain_advanced(domain),
+                self.basic_detector.analyze_domain_comprehensive(
+                    domain, deadline, tracking_task=tracking_task, skip_facebook=skip
+                ),
+                self._skipped_advanced(domain) if skip else self.advanced_detector.analyze_domain_advanced(
+                    domain, deadline, page
+                ),
                 return_exceptions=True
             )
             
+            # Modo sombra: predicción sobre la misma home, sin cambiar el análisis
+            if preclassifier is not None and decision is None:
+                tracking = None
+                if not isinstance(basic_result, Exception):
+                    tracking = basic_result.get('detailed_analysis', {}).get('website_tracking')
+                decision = preclassifier.decide(tracking)
+                decision['skipped'] = False
+            
+            # IDs de los scripts de tracking (gtm.js, fbevents.js...) al índice invertido
+            if not isinstance(advanced_result, Exception):
+                js_analysis = advanced_result.get('advanced_analysis', {}).get('javascript_analysis', {})
+                await asyncio.to_thread(get_id_index().record, domain, js_analysis.get('tracking_ids', {}))
+            
             # Combinar resultados
             combined_result = {
                 'domain': domain,
@@ -47,21 +102,11 @@ class UltraAdvancedDetector:
             if not isinstance(advanced_result, Exception) and 'risk_score' in advanced_result:
                 advanced_score = advanced_result['risk_score']
             
-            # Fórmula ultra-combinada (básico 60%, avanzado 40%)
-            ultra_score = (basic_score * 0.6) + (advanced_score * 0.4)
-            
-            # Ajuste por concordancia (si ambos métodos coinciden, aumentar confianza)
-            both_high = basic_score >= 50 and advanced_score >= 50
-            both_low = basic_score <= 30 and advanced_score <= 30
-            
-            if both_high:
-                ultra_score = min(100, ultra_score * 1.2)  # Boost si ambos detectan
-                confidence = 'very_high'
-            elif both_low:
-                ultra_score = max(0, ultra_score * 0.8)   # Reducir si ambos no detectan
-                confidence = 'high'
-            else:
-                confidence = 'medium'  # Resultados mixtos
+            # Fórmula ultra-combinada (básico 60%, avanzado 40%) con ajuste por concordancia
+            assessment = scoring.ultra_assessment(basic_score, advanced_score)
+            ultra_score = assessment['ultra_score']
+            confidence = assessment['confidence_level']
+            priority = assessment['priority']
             
             # Recopilar evidencia de ambos análisis
             evidence = []
@@ -84,29 +129,15 @@ class UltraAdvancedDetector:
                 evidence.extend([f"🔬 {e}" for e in adv_evidence[:5]])  # Top 5
             
             # Generar recomendación ultra-inteligente
-            if ultra_score >= 80:
-                recommendation = "🔴 MÁXIMA PRIORIDAD - Múltiples indicadores confirman actividad publicitaria intensa"
-                priority = "CRITICAL"
-            elif ultra_score >= 60:
-                recommendation = "🟠 ALTA PRIORIDAD - Evidencia sólida de actividad publicitaria"
-                priority = "HIGH"
-            elif ultra_score >= 35:
-                recommendation = "🟡 PRIORIDAD MEDIA - Indicadores mixtos, verificar con APIs"
-                priority = "MEDIUM"
-            else:
-                recommendation = "🟢 BAJA PRIORIDAD - Poca evidencia de actividad publicitaria"
-                priority = "LOW"
+            recommendation = {
+                'CRITICAL': "🔴 MÁXIMA PRIORIDAD - Múltiples indicadores confirman actividad publicitaria intensa",
+                'HIGH': "🟠 ALTA PRIORIDAD - Evidencia sólida de actividad publicitaria",
+                'MEDIUM': "🟡 PRIORIDAD MEDIA - Indicadores mixtos, verificar con APIs"
+            }.get(priority, "🟢 BAJA PRIORIDAD - Poca evidencia de actividad publicitaria")
             
             # Construir resultado final
             combined_result.update({
-                'final_assessment': {
-                    'ultra_score': round(ultra_score, 1),
-                    'basic_score': round(basic_score, 1),
-                    'advanced_score': round(advanced_score, 1),
-                    'confidence_level': confidence,
-                    'priority': priority,
-                    'likely_has_ads': ultra_score >= 15  # Reducido de 40 para menos falsos negativos
-                },
+                'final_assessment': assessment,
                 'recommendation': recommendation,
                 'evidence_summary': evidence,
                 'next_steps': self._generate_next_steps(ultra_score, priority),
@@ -115,7 +146,11 @@ class UltraAdvancedDetector:
                                    'sitemap_analysis', 'robots_analysis', 'javascript_analysis',
                                    'structured_data', 'third_party_detection'],
                     'analysis_depth': 'ultra_comprehensive',
-                    'accuracy_estimate': self._estimate_accuracy(confidence, len(evidence))
+                    'accuracy_estimate': self._estimate_accuracy(confidence, len(evidence)),
+                    'signals': deadline.report(),
+                    'signatures_version': get_signature_db().version,
+                    'rules_version': assessment['rules_version'],
+                    'preclassifier': decision
                 }
             })
             
@@ -132,6 +167,16 @@ class UltraAdvancedDetector:
                 }
             }
     
+    async def _skipped_advanced(self, domain: str) -> Dict:
+        """Resultado avanzado vacío de un dominio descartado por el pre-clasificador"""
+        return {
+            'domain': domain,
+            'skipped': 'preclassifier',
+            'confidence_factors': [],
+            'risk_score': 0.0,
+            'evidence_strength': scoring.evidence_strength(0.0)
+        }
+    
     def _generate_next_steps(self, score: float, priority: str) -> List[str]:
         """Genera pasos específicos según el score"""
         if priority == "CRITICAL":
@@ -174,22 +219,34 @@ class UltraAdvancedDetector:
         else:
             return "60-70%"
     
-    async def batch_analyze_ultra(self, domains: List[str], max_concurrent: int = 5) -> List[Dict]:
-        """Análisis ultra-avanzado en lote"""
+    async def batch_analyze_ultra(self, domains: List[str], max_concurrent: int = 5,
+                                  deadline_ms: Optional[int] = None, as_records: bool = False,
+                                  include_details: bool = True) -> List:
+        """
+        Análisis ultra-avanzado en lote (deadline_ms se aplica a cada dominio).
+        Con `as_records` cada resultado se reduce a un `DomainRecord` nada más
+        terminar (el detalle completo solo se conserva con `include_details`).
+        """
         semaphore = asyncio.Semaphore(max_concurrent)
         
         async def analyze_with_semaphore(domain):
             async with semaphore:
-                return await self.analyze_domain_ultra(domain)
+                result = await self.analyze_domain_ultra(domain, Deadline(deadline_ms))
+                if as_records:
+                    return DomainRecord.from_ultra(result, include_details)
+                return result
         
         tasks = [analyze_with_semaphore(domain) for domain in domains]
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Filtrar excepciones y ordenar por score
         valid_results = [r for r in results if not isinstance(r, Exception)]
-        valid_results.sort(
-            key=lambda x: x.get('final_assessment', {}).get('ultra_score', 0), 
-            reverse=True
-        )
+        if as_records:
+            valid_results.sort(key=lambda record: record.ultra_score, reverse=True)
+        else:
+            valid_results.sort(
+                key=lambda x: x.get('final_assessment', {}).get('ultra_score', 0), 
+                reverse=True
+            )
         
         return valid_results
\ No newline at end of file
@@ -0,0 +1,424 @@
+"""
+Seguimiento continuo de una lista de anunciantes (watchlist).
+
+Cada dominio tiene su intervalo de re-escaneo; el siguiente escaneo se
+programa con jitter (± `jitter` del intervalo) y los dominios nuevos se
+reparten al azar dentro de su primer intervalo, así que la carga se
+mantiene plana en lugar de llegar a ráfagas. Cada escaneo pasa por el
+re-escaneo incremental (`IncrementalScanner`) y, si cambia
+`has_ads_detected` o la prioridad ultra respecto al escaneo anterior, se
+emite un evento de cambio. La watchlist, el calendario y los eventos se
+guardan en SQLite, así que sobreviven a los reinicios.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from ..config import settings
+from .feature_store import get_feature_store
+from .result_store import canonical_domain
+
+logger = logging.getLogger(__name__)
+
+# Campos cuyo cambio genera un evento
+WATCHED_FIELDS = ('has_ads_detected', 'priority')
+
+# Etapas de Facebook: sin ellas el escaneo se guarda igual (Facebook bloquea a menudo el scraping)
+FACEBOOK_STAGES = ('facebook_transparency', 'facebook_ad_library')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    domain TEXT PRIMARY KEY,
+    interval_s REAL NOT NULL,
+    added_at REAL NOT NULL,
+    next_scan_at REAL NOT NULL,
+    last_scan_at REAL,
+    has_ads_detected INTEGER,
+    priority TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_watchlist_next ON watchlist (next_scan_at);
+CREATE TABLE IF NOT EXISTS change_events (
+    id INTEGER PRIMARY KEY,
+    domain TEXT NOT NULL,
+    detected_at REAL NOT NULL,
+    field TEXT NOT NULL,
+    before TEXT,
+    after TEXT,
+    run_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_events_detected ON change_events (detected_at);
+CREATE INDEX IF NOT EXISTS idx_events_domain ON change_events (domain, detected_at);
+"""
+
+_WATCH_COLUMNS = (
+    'domain', 'interval_s', 'added_at', 'next_scan_at', 'last_scan_at',
+    'has_ads_detected', 'priority', 'failures', 'last_error'
+)
+_EVENT_COLUMNS = ('id', 'domain', 'detected_at', 'field', 'before', 'after', 'run_id')
+
+
+def _watch_row(row) -> Dict:
+    entry = dict(zip(_WATCH_COLUMNS, row))
+    if entry['has_ads_detected'] is not None:
+        entry['has_ads_detected'] = bool(entry['has_ads_detected'])
+    return entry
+
+
+def _event_row(row) -> Dict:
+    event = dict(zip(_EVENT_COLUMNS, row))
+    event['before'] = json.loads(event['before'])
+    event['after'] = json.loads(event['after'])
+    return event
+
+
+class Watchlist:
+    """Watchlist, calendario de escaneos y eventos de cambio en disco (SQLite, WAL)"""
+
+    def __init__(self, path: str = settings.WATCHLIST_PATH, jitter: float = settings.WATCHLIST_JITTER):
+        self.path = path
+        self.jitter = max(0.0, min(jitter, 1.0))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(self, domains: Iterable[str], interval_s: float) -> int:
+        """
+        Añade dominios (o cambia su intervalo si ya están). Los nuevos se
+        programan en un momento al azar de su primer intervalo.
+        """
+        now = time.time()
+        rows = [
+            (domain, interval_s, now, now + random.uniform(0, interval_s))
+            for domain in {canonical_domain(d) for d in domains} if domain
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO watchlist (domain, interval_s, added_at, next_scan_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(domain) DO UPDATE SET interval_s = excluded.interval_s",
+                rows
+            )
+        return len(rows)
+
+    def remove(self, domain: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM watchlist WHERE domain = ?", (canonical_domain(domain),))
+        return cursor.rowcount > 0
+
+    def get(self, domain: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_WATCH_COLUMNS)} FROM watchlist WHERE domain = ?", (canonical_domain(domain),)
+            ).fetchone()
+        return _watch_row(row) if row else None
+
+    def entries(self, limit: int = 1000, offset: int = 0) -> List[Dict]:
+        """Dominios vigilados, por orden del próximo escaneo"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_WATCH_COLUMNS)} FROM watchlist ORDER BY next_scan_at LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [_watch_row(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watchlist").fetchone()[0]
+
+    def due(self, now: Optional[float] = None, limit: int = 100) -> List[Dict]:
+        """Dominios cuyo escaneo ya toca, los más atrasados primero"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_WATCH_COLUMNS)} FROM watchlist WHERE next_scan_at <= ? "
+                "ORDER BY next_scan_at LIMIT ?",
+                (now or time.time(), limit)
+            ).fetchall()
+        return [_watch_row(row) for row in rows]
+
+    def claim(self, now: Optional[float] = None, limit: int = 100,
+              lease_s: float = settings.WATCHLIST_LEASE_SECONDS) -> List[Dict]:
+        """
+        Reserva los dominios cuyo escaneo ya toca: en la misma transacción se
+        aplaza su próximo escaneo `lease_s` segundos, así que otro worker
+        (u otro proceso de la API) no los vuelve a tomar. El resultado del
+        escaneo (`record_scan` / `record_failure`) reemplaza la reserva; si
+        el worker muere, el dominio vuelve a estar pendiente al caducar.
+        """
+        now = now or time.time()
+        lease_until = time.time() + lease_s
+        with self._lock, self._conn:
+            # BEGIN IMMEDIATE toma el bloqueo de escritura antes del SELECT: ningún otro proceso
+            # puede reservar las mismas filas entre la lectura y el UPDATE (sin UPDATE ... RETURNING,
+            # que requiere SQLite >= 3.35)
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_WATCH_COLUMNS)} FROM watchlist WHERE next_scan_at <= ? "
+                "ORDER BY next_scan_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE watchlist SET next_scan_at = ? WHERE domain = ?",
+                [(lease_until, row[0]) for row in rows]
+            )
+        return [dict(_watch_row(row), next_scan_at=lease_until) for row in rows]
+
+    def next_scan_at(self) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MIN(next_scan_at) FROM watchlist").fetchone()[0]
+
+    def _next_time(self, now: float, interval_s: float) -> float:
+        return now + interval_s * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def record_scan(self, entry: Dict, has_ads_detected: bool, priority: Optional[str],
+                    run_id: Optional[str] = None, compare: bool = True) -> List[Dict]:
+        """
+        Guarda el resultado de un escaneo, programa el siguiente y devuelve
+        los eventos de cambio (ninguno en el primer escaneo del dominio).
+        Con `compare=False` (escaneo sin Facebook) no se generan eventos y
+        los campos vigilados, que dependen del score combinado, solo se
+        guardan si el dominio aún no tenía referencia.
+        """
+        now = time.time()
+        current = {'has_ads_detected': bool(has_ads_detected), 'priority': priority}
+        if not compare and entry['last_scan_at'] is not None:
+            current = {field: entry[field] for field in WATCHED_FIELDS}
+        events = []
+        if compare and entry['last_scan_at'] is not None:
+            for field in WATCHED_FIELDS:
+                if entry[field] != current[field]:
+                    events.append({
+                        'domain': entry['domain'], 'detected_at': now, 'field': field,
+                        'before': entry[field], 'after': current[field], 'run_id': run_id
+                    })
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE watchlist SET next_scan_at = ?, last_scan_at = ?, has_ads_detected = ?, priority = ?, "
+                "failures = 0, last_error = NULL WHERE domain = ?",
+                (self._next_time(now, entry['interval_s']), now, int(current['has_ads_detected']),
+                 current['priority'], entry['domain'])
+            )
+            for event in events:
+                cursor = self._conn.execute(
+                    "INSERT INTO change_events (domain, detected_at, field, before, after, run_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (event['domain'], now, event['field'], json.dumps(event['before']),
+                     json.dumps(event['after']), run_id)
+                )
+                event['id'] = cursor.lastrowid
+        return events
+
+    def record_failure(self, entry: Dict, error: str):
+        """Escaneo fallido: se reintenta con espera exponencial (sin pasar del intervalo)"""
+        failures = entry['failures'] + 1
+        retry = min(entry['interval_s'], settings.WATCHLIST_RETRY_SECONDS * 2 ** (failures - 1))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE watchlist SET next_scan_at = ?, failures = ?, last_error = ? WHERE domain = ?",
+                (self._next_time(time.time(), retry), failures, error[:500], entry['domain'])
+            )
+
+    def events(self, since: Optional[float] = None, domain: Optional[str] = None,
+               field: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Eventos de cambio, del más reciente al más antiguo"""
+        conditions = []
+        params: List = []
+        for clause, value in (
+            ("detected_at >= ?", since),
+            ("domain = ?", canonical_domain(domain) if domain else None),
+            ("field = ?", field)
+        ):
+            if value is not None:
+                conditions.append(clause)
+                params.append(value)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(_EVENT_COLUMNS)} FROM change_events{where} ORDER BY id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [_event_row(row) for row in rows]
+
+
+class WatchlistScheduler:
+    """
+    Worker que escanea los dominios de la watchlist cuando les toca. Se
+    puede arrancar junto a la API (`WATCHLIST_ENABLED`) o desde la línea de
+    comandos (`watchlist.py run`). Los eventos de cambio se guardan, se
+    registran en el log y se pasan a los `listeners` (callables). Los
+    dominios pendientes se reservan antes de escanearlos (`claim`), así que
+    varios workers sobre la misma watchlist (p. ej. un worker por proceso
+    de gunicorn) no escanean dos veces el mismo dominio. Un
+    escaneo degradado cuenta como fallo: no genera eventos y se reintenta
+    con espera exponencial. Si solo faltan las etapas de Facebook el escaneo
+    se guarda (sirve de referencia) pero no se compara con el anterior.
+    """
+
+    def __init__(self, watchlist: Optional[Watchlist] = None, scanner=None,
+                 concurrency: int = settings.WATCHLIST_CONCURRENCY,
+                 poll_seconds: float = settings.WATCHLIST_POLL_SECONDS,
+                 deadline_ms: Optional[int] = settings.WATCHLIST_DEADLINE_MS):
+        self.watchlist = watchlist or get_watchlist()
+        self._scanner = scanner
+        self.concurrency = max(1, concurrency)
+        self.poll_seconds = poll_seconds
+        self.deadline_ms = deadline_ms
+        self.listeners: List[Callable[[Dict], None]] = []
+        self.counters = {'scans': 0, 'failures': 0, 'events': 0}
+        self._current_run_id: Optional[str] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def scanner(self):
+        # Import diferido: el escáner carga todos los detectores
+        if self._scanner is None:
+            from .incremental_scan import IncrementalScanner
+            self._scanner = IncrementalScanner()
+        return self._scanner
+
+    def _run_id(self) -> str:
+        """Run del día en el feature store (se registra una vez por día)"""
+        run_id = f"watch-{datetime.now():%Y%m%d}"
+        if run_id != self._current_run_id:
+            self._current_run_id = get_feature_store().start_run('watchlist', run_id)
+        return run_id
+
+    async def _scan_entry(self, entry: Dict) -> List[Dict]:
+        """Escanea un dominio reservado, guarda el resultado y avisa de los eventos de cambio"""
+        run_id = self._run_id()
+        try:
+            result = await self.scanner.scan(entry['domain'], run_id=run_id, deadline_ms=self.deadline_ms)
+        except Exception as e:
+            logger.warning(f"Watchlist: fallo al escanear {entry['domain']}: {e}")
+            await asyncio.to_thread(self.watchlist.record_failure, entry, f"{type(e).__name__}: {e}")
+            self.counters['failures'] += 1
+            return []
+        degraded = result.get('degraded') or []
+        if set(degraded) - set(FACEBOOK_STAGES):
+            # Sin las etapas principales (red caída, circuito abierto, fuera de tiempo) los
+            # scores salen a cero: no se comparan con el escaneo anterior, se reintenta
+            logger.warning(f"Watchlist: escaneo degradado de {entry['domain']}: {', '.join(degraded)}")
+            await asyncio.to_thread(self.watchlist.record_failure, entry, f"degraded: {', '.join(degraded)}")
+            self.counters['failures'] += 1
+            return []
+        if degraded:
+            logger.info(f"Watchlist: {entry['domain']} escaneado sin Facebook ({', '.join(degraded)}), sin comparar")
+        scores = result['scores']
+        self.counters['scans'] += 1
+        events = await asyncio.to_thread(
+            self.watchlist.record_scan, entry, scores.get('likely_has_ads', False), scores.get('priority'), run_id,
+            not degraded
+        )
+
+        self.counters['events'] += len(events)
+        for event in events:
+            logger.info(f"Watchlist: {event['domain']} {event['field']} {event['before']} → {event['after']}")
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.error(f"Watchlist: error en listener de eventos: {e}")
+        return events
+
+    def _stopping(self) -> bool:
+        return self._stop is not None and self._stop.is_set()
+
+    async def run_once(self, now: Optional[float] = None) -> List[Dict]:
+        """
+        Escanea todos los dominios que ya tocan y devuelve los eventos.
+        Cada uno de los `concurrency` huecos reserva el siguiente dominio en
+        cuanto termina el anterior, así que un escaneo lento no frena al resto.
+        """
+        now = now or time.time()  # Lo que se reprograma durante la pasada queda para la siguiente
+        events: List[Dict] = []
+
+        async def slot():
+            while not self._stopping():
+                claimed = await asyncio.to_thread(self.watchlist.claim, now, 1)
+                if not claimed:
+                    return
+                events.extend(await self._scan_entry(claimed[0]))
+
+        await asyncio.gather(*(slot() for _ in range(self.concurrency)))
+        return events
+
+    async def _slot_forever(self):
+        """Hueco del worker: escanea lo pendiente y duerme hasta el siguiente escaneo (o `poll_seconds`)"""
+        while not self._stopping():
+            try:
+                claimed = await asyncio.to_thread(self.watchlist.claim, None, 1)
+                if claimed:
+                    await self._scan_entry(claimed[0])
+                    continue
+            except Exception as e:
+                logger.error(f"Watchlist: error en el ciclo de escaneo: {e}")
+
+            next_at = self.watchlist.next_scan_at()
+            wait = self.poll_seconds if next_at is None else min(self.poll_seconds, max(0.0, next_at - time.time()))
+            try:
+                await asyncio.wait_for(self._stop.wait(), timeout=max(wait, 0.1))
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_forever(self):
+        """Bucle del worker: `concurrency` huecos que toman dominios a medida que tocan"""
+        self._stop = asyncio.Event()
+        logger.info(f"Watchlist: worker arrancado ({self.watchlist.count()} dominios)")
+        await asyncio.gather(*(self._slot_forever() for _ in range(self.concurrency)))
+        logger.info("Watchlist: worker detenido")
+
+    def start(self) -> asyncio.Task:
+        """Arranca el worker en segundo plano en el loop actual"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run_forever())
+        return self._task
+
+    async def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    def stats(self) -> Dict:
+        next_at = self.watchlist.next_scan_at()
+        return {
+            'domains': self.watchlist.count(),
+            'running': self._task is not None and not self._task.done(),
+            'next_scan_at': datetime.fromtimestamp(next_at).isoformat() if next_at else None,
+            **self.counters
+        }
+
+
+_watchlist: Optional[Watchlist] = None
+_scheduler: Optional[WatchlistScheduler] = None
+
+
+def get_watchlist() -> Watchlist:
+    """Watchlist compartida (se abre la primera vez que se usa)"""
+    global _watchlist
+    if _watchlist is None:
+        _watchlist = Watchlist()
+    return _watchlist
+
+
+def get_watchlist_scheduler() -> WatchlistScheduler:
+    """Worker compartido por la API"""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = WatchlistScheduler()
+    return _scheduler
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Script para exportar solo los dominios que cambiaron entre dos runs
+Compara un run con otro run o con el estado guardado antes (almacén de resultados) y escribe
+los dominios añadidos, eliminados o cambiados con sus valores antes y después - sin red
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from app.services.result_store import ResultStore
+from app.services.result_delta import (
+    CHANGE_TYPES, DEFAULT_DELTA_FIELDS, DELTA_FIELDS, flatten_change, run_delta
+)
+from app.services.result_writers import FORMAT_EXTENSIONS, FORMATS, open_result_writer
+from app.config import settings
+
+
+# Tipo de cada valor comparado (columnas before_/after_)
+FIELD_TYPES = {
+    'likely_has_ads': 'bool',
+    'priority': 'str',
+    'confidence_level': 'str',
+    'score': 'float',
+    'ultra_score': 'float',
+    'basic_score': 'float',
+    'run_id': 'str',
+    'pipeline': 'str',
+    'analyzed_at': 'float'
+}
+
+
+def delta_columns(fields):
+    columns = [("domain", "str"), ("change", "str"), ("changed_fields", "str")]
+    for side in ("before", "after"):
+        columns += [(f"{side}_{name}", FIELD_TYPES[name]) for name in tuple(fields) + ("run_id", "pipeline", "analyzed_at")]
+    return columns
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Exporta los dominios añadidos, eliminados o cambiados entre dos runs',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=f"""
+Ejemplos de uso:
+
+  # Cambios del run frente a lo que se sabía antes de empezarlo
+  python export_delta.py clientes-noviembre
+
+  # Cambios frente a otro run concreto
+  python export_delta.py clientes-noviembre --base-run clientes-octubre
+
+  # Frente al estado guardado en una fecha, en JSON Lines
+  python export_delta.py clientes-noviembre --as-of 2024-10-01 --format jsonl
+
+  # Comparar también el score (cambios de más de 10 puntos)
+  python export_delta.py clientes-noviembre --fields likely_has_ads,priority,score --score-tolerance 10
+
+Campos comparables: {', '.join(DELTA_FIELDS)}
+        """
+    )
+
+    parser.add_argument('run_id', help='Run actual (almacén de resultados)')
+    parser.add_argument('--base-run', default=None,
+                       help='Run con el que comparar (default: estado guardado antes del run)')
+    parser.add_argument('--as-of', default=None,
+                       help='Comparar con el estado guardado en esta fecha (ISO 8601)')
+    parser.add_argument('--fields', default=','.join(DEFAULT_DELTA_FIELDS),
+                       help=f"Campos a comparar, separados por comas (default: {','.join(DEFAULT_DELTA_FIELDS)})")
+    parser.add_argument('--score-tolerance', type=float, default=0.0,
+                       help='Diferencia mínima para que un score cuente como cambio (default: 0)')
+    removed = parser.add_mutually_exclusive_group()
+    removed.add_argument('--removed', dest='include_removed', action='store_true', default=None,
+                        help='Exportar también los dominios que no están en el run actual '
+                             '(default: solo con --base-run)')
+    removed.add_argument('--no-removed', dest='include_removed', action='store_false',
+                        help='No exportar los dominios que no están en el run actual')
+    parser.add_argument('-o', '--output', help='Archivo de salida (default: <run>_delta.<formato>)')
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                       help='Formato de salida: csv, jsonl o parquet (default: csv)')
+    parser.add_argument('--store', default=settings.RESULT_STORE_PATH,
+                       help=f'Almacén de resultados (default: {settings.RESULT_STORE_PATH})')
+
+    args = parser.parse_args()
+
+    if args.base_run and args.as_of:
+        print("❌ Error: use --base-run o --as-of, no ambos")
+        sys.exit(1)
+    fields = [name.strip() for name in args.fields.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in DELTA_FIELDS]
+    if unknown:
+        print(f"❌ Error: campos no comparables: {', '.join(unknown)}")
+        sys.exit(1)
+    try:
+        as_of = datetime.fromisoformat(args.as_of).timestamp() if args.as_of else None
+    except ValueError:
+        print(f"❌ Error: fecha no válida: {args.as_of}")
+        sys.exit(1)
+
+    output_file = args.output or f"{args.run_id}_delta{FORMAT_EXTENSIONS[args.format]}"
+    store = ResultStore(args.store)
+
+    print("=" * 70)
+    print("🔀 Delta entre runs - Ads Checker")
+    print("=" * 70)
+    print(f"🗄️  Run actual: {args.run_id}")
+    if args.base_run:
+        print(f"📌 Base: run {args.base_run}")
+    elif as_of is not None:
+        print(f"📌 Base: estado guardado el {args.as_of}")
+    else:
+        print("📌 Base: estado guardado antes del run")
+    print(f"🔍 Campos: {', '.join(fields)}")
+    print(f"💾 Archivo de salida: {output_file} ({args.format})")
+    print("=" * 70)
+    print()
+
+    try:
+        changes = run_delta(
+            store, args.run_id, base_run_id=args.base_run, as_of=as_of, fields=fields,
+            score_tolerance=args.score_tolerance, include_removed=args.include_removed
+        )
+        writer = open_result_writer(output_file, args.format, delta_columns(fields))
+    except (ValueError, RuntimeError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    counts = dict.fromkeys(CHANGE_TYPES, 0)
+    start_time = datetime.now()
+    with writer:
+        for change in changes:
+            counts[change['change']] += 1
+            writer.write(flatten_change(change, fields))
+    duration = (datetime.now() - start_time).total_seconds()
+
+    print("📊 Estadísticas")
+    print("=" * 70)
+    print(f"Añadidos: {counts['added']}")
+    print(f"Eliminados: {counts['removed']}")
+    print(f"Cambiados: {counts['changed']}")
+    print(f"Tiempo total: {duration:.1f} segundos")
+    print()
+    print(f"✅ {writer.rows_written} cambios guardados en: {output_file}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
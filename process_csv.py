@@ -18,53 +18,164 @@ sys.path.insert(0, str(Path(__file__).parent))
 from app.services.facebook_transparency_advanced import FacebookTransparencyAdvanced
 from app.services.tracking_detector import TrackingDetector
 from app.services.no_api_detector import NoAPIAdsDetector
+from app.services.deadline import Deadline
+from app.services.feature_store import extract_features, get_feature_store
+from app.services.result_store import get_result_store
+from app.services.result_records import EVIDENCE_COUNTS, EVIDENCE_FLAGS, DomainRecord
+from app.services.result_writers import FORMAT_EXTENSIONS, FORMATS, DEFAULT_ROW_GROUP_SIZE, open_result_writer
+from app.services.tracking_ids import ID_TYPES
+
+
+# Columnas de salida (nombre, tipo)
+RESULT_COLUMNS = [
+    ("domain", "str"),
+    ("facebook_url", "str"),
+    ("has_google_ads", "bool"),
+    ("google_confidence", "float"),
+    ("google_tracking", "bool"),
+    ("has_meta_ads", "bool"),
+    ("meta_ads_count", "int"),
+    ("meta_page_id", "str"),
+    ("overall_confidence", "float"),
+    ("likely_has_ads", "bool"),
+    ("platforms", "str"),
+    ("timed_out", "str"),
+    ("status", "str")
+]
+
+# Etapas del detector básico con su tiempo (--timings)
+TIMING_STAGES = ("website_tracking", "facebook_ad_library", "google_transparency")
+TIMING_COLUMNS = [("elapsed_ms", "float")] + [(f"{stage}_ms", "float") for stage in TIMING_STAGES]
+
+# Scores y evidencia por dominio (--features)
+FEATURE_COLUMNS = (
+    [("tracking_score", "float"), ("facebook_score", "float"), ("google_score", "float")]
+    + [(name, "int") for name in EVIDENCE_COUNTS]
+    + [(f"evidence_{flag}", "bool") for flag in EVIDENCE_FLAGS]
+    + [(f"id_{id_type}", "bool") for id_type in ID_TYPES]
+)
 
 
 class CSVProcessor:
-    def __init__(self):
+    def __init__(self, deadline_ms: int = None, run_id: str = None,
+                 include_timings: bool = False, include_features: bool = False):
         self.fb_service = FacebookTransparencyAdvanced()
         self.tracking_service = TrackingDetector()
         self.no_api_detector = NoAPIAdsDetector()
+        self.deadline_ms = deadline_ms
+        self.include_timings = include_timings
+        self.include_features = include_features
+        # Features crudas de cada dominio, para re-puntuar el run con rescore.py
+        self.feature_store = get_feature_store()
+        self.run_id = self.feature_store.start_run('csv', run_id)
+        # Resultados consultables por la API (/api/v1/results) bajo el mismo run
+        self.result_store = get_result_store()
         self.results = []
+        self.writer = None
     
-    async def analyze_domain(self, domain: str, facebook_url: str = None) -> Dict:
-        """Analiza un dominio sin necesidad de APIs"""
+    def columns(self) -> List:
+        """Columnas de salida según las opciones (--timings, --features)"""
+        columns = list(RESULT_COLUMNS)
+        if self.include_timings:
+            columns += TIMING_COLUMNS
+        if self.include_features:
+            columns += FEATURE_COLUMNS
+        return columns
+    
+    def open_output(self, output_file: str, fmt: str = "csv", row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        """Abre la salida: cada resultado se escribe en cuanto termina su dominio"""
+        self.writer = open_result_writer(output_file, fmt, self.columns(), row_group_size)
+    
+    def close_output(self) -> int:
+        """Vuelca las filas pendientes, cierra la salida y devuelve cuántas filas se escribieron"""
+        if not self.writer:
+            return 0
+        self.writer.close()
+        return self.writer.rows_written
+    
+    async def analyze_domain(self, domain: str, facebook_url: str = None) -> DomainRecord:
+        """
+        Analiza un dominio sin necesidad de APIs. Solo se conserva un registro
+        compacto (scores, evidencia en conteos/códigos): el resultado completo
+        se libera al terminar cada dominio.
+        """
         print(f"  📊 Analizando: {domain}...")
         
+        signals = None
+        rules_version = None
         try:
-            # Análisis completo sin APIs
-            result = await self.no_api_detector.analyze_domain_comprehensive(domain)
-            
-            return {
-                "domain": domain,
-                "facebook_url": facebook_url or "",
-                "has_google_ads": result.get("google_ads", {}).get("has_ads", False),
-                "google_confidence": result.get("google_ads", {}).get("confidence", 0),
-                "google_tracking": result.get("google_ads", {}).get("tracking_detected", False),
-                "has_meta_ads": result.get("meta_ads", {}).get("has_ads", False),
-                "meta_ads_count": result.get("meta_ads", {}).get("number_of_ads", 0),
-                "meta_page_id": result.get("meta_ads", {}).get("page_id", ""),
-                "overall_confidence": result.get("summary", {}).get("total_confidence", 0),
-                "likely_has_ads": result.get("summary", {}).get("likely_has_ads", False),
-                "platforms": ", ".join(result.get("summary", {}).get("platforms", [])),
-                "status": "✅ Completado"
-            }
+            # Análisis completo sin APIs (acotado por --deadline-ms si se indicó)
+            deadline = Deadline(self.deadline_ms)
+            result = await self.no_api_detector.analyze_domain_comprehensive(domain, deadline)
+            signals = deadline.report()
+            await asyncio.to_thread(
+                self.feature_store.record, self.run_id, domain, extract_features('basic', result, signals=signals)
+            )
+            record = DomainRecord.from_basic(result, signals)
+            rules_version = result.get('rules_version')
         except Exception as e:
             print(f"    ❌ Error: {str(e)}")
-            return {
-                "domain": domain,
-                "facebook_url": facebook_url or "",
-                "has_google_ads": False,
-                "google_confidence": 0,
-                "google_tracking": False,
-                "has_meta_ads": False,
-                "meta_ads_count": 0,
-                "meta_page_id": "",
-                "overall_confidence": 0,
-                "likely_has_ads": False,
-                "platforms": "",
-                "status": f"❌ Error: {str(e)}"
-            }
+            record = DomainRecord(domain, 'basic')
+            record.error = str(e)
+        
+        record.facebook_url = facebook_url or ""
+        await asyncio.to_thread(self.result_store.record_domain, self.run_id, record, rules_version)
+        if self.writer:
+            self.writer.write(self.result_row(record, signals))
+        return record
+    
+    def result_row(self, record: DomainRecord, signals: Dict = None) -> Dict:
+        """Fila de salida (con tipos) a partir del registro compacto"""
+        has_google_ads = record.has_evidence("google_transparency")
+        google_tracking = bool(
+            record.evidence_count("google_ads_indicators")
+            or record.has_tracking_id("google_ads") or record.has_tracking_id("gtm")
+        )
+        has_meta_ads = record.has_evidence("facebook_library")
+        platforms = [
+            name for name, detected in (("google", has_google_ads or google_tracking), ("meta", has_meta_ads))
+            if detected
+        ]
+        if record.error:
+            status = f"❌ Error: {record.error}"
+        elif record.missing_stages:
+            status = "✅ Completado (parcial)"
+        else:
+            status = "✅ Completado"
+        
+        row = {
+            "domain": record.domain,
+            "facebook_url": record.facebook_url or "",
+            "has_google_ads": has_google_ads,
+            "google_confidence": float(record.google_score),
+            "google_tracking": google_tracking,
+            "has_meta_ads": has_meta_ads,
+            "meta_ads_count": int(record.estimated_ads),
+            "meta_page_id": record.facebook_page or "",
+            "overall_confidence": float(record.basic_score),
+            "likely_has_ads": record.likely_has_ads,
+            "platforms": ", ".join(platforms),
+            "timed_out": ", ".join(record.missing_stages),
+            "status": status
+        }
+        
+        if self.include_timings:
+            timings = (signals or {}).get("stage_timings_ms") or {}
+            row["elapsed_ms"] = (signals or {}).get("elapsed_ms")
+            for stage in TIMING_STAGES:
+                row[f"{stage}_ms"] = timings.get(stage)
+        
+        if self.include_features:
+            row.update({
+                "tracking_score": float(record.tracking_score),
+                "facebook_score": float(record.facebook_score),
+                "google_score": float(record.google_score)
+            })
+            row.update(zip(EVIDENCE_COUNTS, record.evidence_counts))
+            row.update({f"evidence_{flag}": record.has_evidence(flag) for flag in EVIDENCE_FLAGS})
+            row.update({f"id_{id_type}": record.has_tracking_id(id_type) for id_type in ID_TYPES})
+        
+        return row
     
     async def process_batch(self, domains: List[Dict], max_concurrent: int = 5):
         """Procesa múltiples dominios concurrentemente"""
@@ -135,34 +246,6 @@ class CSVProcessor:
                     })
         
         return domains
-    
-    def write_csv(self, output_file: str):
-        """Escribe los resultados a un CSV"""
-        if not self.results:
-            print("❌ No hay resultados para guardar")
-            return
-        
-        fieldnames = [
-            "domain",
-            "facebook_url",
-            "has_google_ads",
-            "google_confidence",
-            "google_tracking",
-            "has_meta_ads",
-            "meta_ads_count",
-            "meta_page_id",
-            "overall_confidence",
-            "likely_has_ads",
-            "platforms",
-            "status"
-        ]
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(self.results)
-        
-        print(f"✅ Resultados guardados en: {output_file}")
 
 
 async def main():
@@ -183,6 +266,21 @@ Ejemplos de uso:
   # Procesar con más concurrencia (más rápido pero más intensivo)
   python process_csv.py input.csv -c 10
 
+  # Limitar cada dominio a 3 segundos (resultados parciales si no alcanza)
+  python process_csv.py input.csv --deadline-ms 3000
+
+  # Guardar las features bajo un run con nombre (re-puntuable con rescore.py)
+  python process_csv.py input.csv --run-id clientes-octubre
+
+  # Salida en Parquet (requiere pyarrow) con tiempos por etapa y features
+  python process_csv.py input.csv --format parquet --timings --features
+
+  # Salida en JSON Lines (una fila por dominio, con tipos)
+  python process_csv.py input.csv --format jsonl
+
+Las filas de salida se escriben según terminan los dominios (orden de finalización,
+no el del CSV de entrada); la columna "domain" permite cruzarlas con la entrada.
+
 Formato del CSV de entrada:
   - Debe tener una columna con dominios (puede llamarse: domain, website, url, site)
   - Opcionalmente puede tener una columna de Facebook (facebook_url, fb, meta)
@@ -196,9 +294,23 @@ Ejemplo:
     )
     
     parser.add_argument('input', help='Archivo CSV de entrada')
-    parser.add_argument('-o', '--output', help='Archivo CSV de salida (default: input_results.csv)')
+    parser.add_argument('-o', '--output',
+                       help='Archivo de salida, en orden de finalización (default: input_results.<formato>)')
     parser.add_argument('-c', '--concurrent', type=int, default=5, 
                        help='Número de requests concurrentes (default: 5)')
+    parser.add_argument('--deadline-ms', type=int, default=None,
+                       help='Presupuesto de tiempo por dominio en ms (default: sin límite)')
+    parser.add_argument('--run-id', default=None,
+                       help='Id del run en el feature store (default: generado)')
+    parser.add_argument('--format', choices=FORMATS, default='csv',
+                       help='Formato de salida: csv, jsonl o parquet (default: csv)')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                       help=f'Filas por row group de Parquet (default: {DEFAULT_ROW_GROUP_SIZE}); '
+                            f'CSV y JSONL se escriben fila a fila')
+    parser.add_argument('--timings', action='store_true',
+                       help='Incluir el tiempo de cada etapa (ms)')
+    parser.add_argument('--features', action='store_true',
+                       help='Incluir scores, conteos de evidencia e IDs de tracking')
     
     args = parser.parse_args()
     
@@ -212,39 +324,56 @@ Ejemplo:
         output_file = args.output
     else:
         input_path = Path(args.input)
-        output_file = f"{input_path.stem}_results{input_path.suffix}"
+        suffix = input_path.suffix if args.format == 'csv' else FORMAT_EXTENSIONS[args.format]
+        output_file = f"{input_path.stem}_results{suffix}"
     
     print("=" * 70)
     print("🚀 Procesador de CSV - Ads Checker")
     print("=" * 70)
     print(f"📄 Archivo de entrada: {args.input}")
-    print(f"💾 Archivo de salida: {output_file}")
+    print(f"💾 Archivo de salida: {output_file} ({args.format})")
     print(f"⚡ Concurrencia: {args.concurrent} requests simultáneos")
+    if args.deadline_ms:
+        print(f"⏱️  Presupuesto por dominio: {args.deadline_ms} ms")
     print("=" * 70)
     print()
     
-    processor = CSVProcessor()
+    processor = CSVProcessor(
+        deadline_ms=args.deadline_ms, run_id=args.run_id,
+        include_timings=args.timings, include_features=args.features
+    )
+    print(f"🗄️  Run en el feature store: {processor.run_id}")
     
-    # Leer CSV
+    # Leer CSV (antes de abrir la salida: un CSV no válido no borra resultados anteriores)
     print("📖 Leyendo CSV...")
     domains = processor.read_csv(args.input)
     print(f"✅ {len(domains)} dominios encontrados")
     print()
     
-    # Procesar
+    try:
+        processor.open_output(output_file, args.format, args.row_group_size)
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    
+    # Procesar (cada resultado se escribe en cuanto termina su dominio)
     print(f"⚙️  Procesando {len(domains)} dominios...")
     print()
     
     start_time = datetime.now()
-    processor.results = await processor.process_batch(domains, args.concurrent)
+    try:
+        processor.results = await processor.process_batch(domains, args.concurrent)
+    finally:
+        rows_written = processor.close_output()
     end_time = datetime.now()
     
     duration = (end_time - start_time).total_seconds()
     
-    # Guardar resultados
     print()
-    print("💾 Guardando resultados...")
-    processor.write_csv(output_file)
+    print(f"✅ {rows_written} resultados guardados en: {output_file}")
+    if not processor.results:
+        print("❌ No hay resultados")
+        return
     
     # Estadísticas
     print()
@@ -253,10 +382,10 @@ Ejemplo:
     print("=" * 70)
     
     total = len(processor.results)
-    with_google = sum(1 for r in processor.results if r["has_google_ads"])
-    with_meta = sum(1 for r in processor.results if r["has_meta_ads"])
-    with_any = sum(1 for r in processor.results if r["likely_has_ads"])
-    errors = sum(1 for r in processor.results if "Error" in r["status"])
+    with_google = sum(1 for r in processor.results if r.has_evidence("google_transparency"))
+    with_meta = sum(1 for r in processor.results if r.has_evidence("facebook_library"))
+    with_any = sum(1 for r in processor.results if r.likely_has_ads)
+    errors = sum(1 for r in processor.results if r.error)
     
     print(f"Total procesados: {total}")
     print(f"Con Google Ads: {with_google} ({with_google/total*100:.1f}%)")
@@ -267,6 +396,7 @@ Ejemplo:
     print(f"Promedio: {duration/total:.1f} seg/dominio")
     print()
     print(f"✅ Proceso completado - Resultados en: {output_file}")
+    print(f"🔁 Re-puntuar sin red: python rescore.py {processor.run_id}")
     print("=" * 70)
 
 
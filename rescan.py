@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Script para re-escanear una lista de dominios ya analizados (modo monitor)
+Revalida la home con un GET condicional (ETag / Last-Modified / hash del contenido) y solo
+vuelve a analizar a fondo los dominios que cambiaron; del resto reutiliza las features guardadas
+"""
+
+import asyncio
+import csv
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).parent))
+from app.services.feature_store import get_feature_store
+from app.services.incremental_scan import IncrementalScanner
+from app.config import settings
+
+
+# Columnas en las que se busca el dominio (en este orden)
+DOMAIN_COLUMNS = ('domain', 'website', 'site', 'company_domain', 'url')
+
+
+def read_domains(input_file: str) -> List[str]:
+    """Dominios del CSV de entrada (primera columna reconocida)"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = {field.lower(): field for field in reader.fieldnames or []}
+        domain_col = next((columns[name] for name in DOMAIN_COLUMNS if name in columns), None)
+        if not domain_col:
+            print("❌ Error: No se encontró columna de dominio")
+            print(f"Columnas disponibles: {', '.join(reader.fieldnames or [])}")
+            sys.exit(1)
+        print(f"✅ Columna de dominio detectada: '{domain_col}'")
+        return [row[domain_col].strip() for row in reader if (row.get(domain_col) or '').strip()]
+
+
+async def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Re-escanea dominios reutilizando las features de los que no cambiaron',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+
+  # Re-escaneo semanal de la lista de clientes
+  python rescan.py clientes.csv
+
+  # Con un run con nombre (consultable en /api/v1/results?run_id=...)
+  python rescan.py clientes.csv --run-id semana-42
+
+  # Refrescar la transparencia de Facebook si tiene más de 6 horas
+  python rescan.py clientes.csv --facebook-ttl-hours 6
+
+  # Análisis completo de todos los dominios (ignora el estado guardado)
+  python rescan.py clientes.csv --force
+
+Cada dominio se resuelve de una de estas formas:
+  - full:          análisis completo (dominio nuevo, home cambiada o features antiguas)
+  - not_modified:  la home respondió 304, se reutilizan las features
+  - same_content:  la home tiene el mismo hash, se reutilizan las features
+
+Un análisis completo degradado (etapas fallidas o fuera de tiempo, home inaccesible,
+Facebook no disponible) no se guarda en el run y se repite en la siguiente pasada.
+        """
+    )
+
+    parser.add_argument('input', help='Archivo CSV con dominios')
+    parser.add_argument('-c', '--concurrent', type=int, default=5,
+                       help='Número de dominios en paralelo (default: 5)')
+    parser.add_argument('--run-id', default=None,
+                       help='Id del run en el feature store y el almacén de resultados (default: generado)')
+    parser.add_argument('--deadline-ms', type=int, default=None,
+                       help='Presupuesto de tiempo por dominio en ms (default: sin límite)')
+    parser.add_argument('--facebook-ttl-hours', type=float, default=settings.RESCAN_FACEBOOK_TTL_HOURS,
+                       help=f'Horas antes de volver a consultar la transparencia de Facebook '
+                            f'(default: {settings.RESCAN_FACEBOOK_TTL_HOURS:g})')
+    parser.add_argument('--max-age-days', type=float, default=settings.RESCAN_MAX_AGE_DAYS,
+                       help=f'Días tras los que se repite el análisis completo aunque la home no cambie '
+                            f'(default: {settings.RESCAN_MAX_AGE_DAYS:g})')
+    parser.add_argument('--force', action='store_true',
+                       help='Análisis completo de todos los dominios')
+
+    args = parser.parse_args()
+
+    if not Path(args.input).exists():
+        print(f"❌ Error: Archivo '{args.input}' no encontrado")
+        sys.exit(1)
+
+    run_id = get_feature_store().start_run('rescan', args.run_id)
+    scanner = IncrementalScanner(
+        facebook_ttl=args.facebook_ttl_hours * 3600,
+        max_age=args.max_age_days * 86400
+    )
+
+    print("=" * 70)
+    print("🔁 Re-escaneo incremental - Ads Checker")
+    print("=" * 70)
+    print(f"📄 Archivo de entrada: {args.input}")
+    print(f"🗄️  Run: {run_id}")
+    print(f"⚡ Concurrencia: {args.concurrent} dominios simultáneos")
+    print(f"📘 TTL transparencia de Facebook: {args.facebook_ttl_hours:g} h")
+    if args.force:
+        print("⚠️  Modo forzado: análisis completo de todos los dominios")
+    print("=" * 70)
+    print()
+
+    domains = read_domains(args.input)
+    print(f"✅ {len(domains)} dominios encontrados")
+    print()
+
+    semaphore = asyncio.Semaphore(args.concurrent)
+    errors = []
+
+    async def rescan_one(index: int, domain: str):
+        async with semaphore:
+            try:
+                result = await scanner.scan(domain, run_id=run_id, deadline_ms=args.deadline_ms, force=args.force)
+            except Exception as e:
+                errors.append(domain)
+                print(f"[{index}/{len(domains)}] ❌ {domain}: {e}")
+                return
+            scores = result['scores']
+            refreshed = " 📘" if result['facebook_refreshed'] and result['mode'] != 'full' else ""
+            degraded = f" ⚠️  degradado: {', '.join(result['degraded'])}" if result['degraded'] else ""
+            print(f"[{index}/{len(domains)}] {domain}: {result['mode']}{refreshed} "
+                  f"→ {scores.get('priority')} ({scores.get('overall_score', 0):.0f}){degraded}")
+
+    start_time = datetime.now()
+    await asyncio.gather(*(rescan_one(i, domain) for i, domain in enumerate(domains, 1)))
+    duration = (datetime.now() - start_time).total_seconds()
+
+    counters = scanner.counters
+    total = counters['full'] + counters['not_modified'] + counters['same_content']
+
+    print()
+    print("=" * 70)
+    print("📊 Estadísticas")
+    print("=" * 70)
+    print(f"Total re-escaneados: {total}")
+    if total:
+        reused = counters['not_modified'] + counters['same_content']
+        print(f"Análisis completos: {counters['full']} ({counters['full']/total*100:.1f}%)")
+        print(f"Sin cambios (304): {counters['not_modified']}")
+        print(f"Sin cambios (mismo hash): {counters['same_content']}")
+        print(f"Transparencia de Facebook refrescada: {counters['facebook_refreshed']}")
+        print(f"Análisis degradados (se repiten en la próxima pasada): {counters['degraded']}")
+        print(f"Análisis completos evitados: {reused/total*100:.1f}%")
+    print(f"Errores: {len(errors)}")
+    print(f"Tiempo total: {duration:.1f} segundos")
+    print()
+    print(f"✅ Proceso completado - Resultados en el run: {run_id}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
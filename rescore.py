@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script para re-puntuar un run guardado en el feature store
+Aplica las reglas de scoring vigentes (app/data/scoring_rules.json) a las features crudas
+de cada dominio (vectorizado con NumPy) - no hace ninguna petición de red
+"""
+
+import csv
+import sys
+import time
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+from app.services.feature_store import FeatureStore
+from app.services.batch_scoring import PIPELINES, FeatureBatch, score_batch
+from app.services.scoring_rules import ScoringRules
+from app.config import settings
+
+
+# Score principal de cada pipeline (el que decide likely_has_ads)
+MAIN_SCORE = {
+    'basic': 'basic_score',
+    'ultra': 'ultra_score',
+    'unified': 'overall_score'
+}
+
+
+def list_runs(store: FeatureStore):
+    runs = store.runs()
+    if not runs:
+        print("❌ No hay runs en el feature store")
+        return
+    for run in runs:
+        created = datetime.fromtimestamp(run['created_at']).strftime('%Y-%m-%d %H:%M')
+        print(f"{run['run_id']:<40} {run['source']:<6} {created}  {run['domains']:>7} dominios  "
+              f"reglas {run['scoring_version']}  firmas {run['signatures_version']}")
+
+
+def rescore_run(store: FeatureStore, run_id: str, output_file: str = None, rules: ScoringRules = None):
+    # Carga el run en columnas y lo puntúa entero de una vez
+    start = time.perf_counter()
+    batch = FeatureBatch(rules)
+    domains = []
+    previous_scores = []
+    previous_likely = []
+    for domain, features, previous in store.iter_run(run_id):
+        batch.add(features)
+        domains.append(domain)
+        pipeline = features.get('pipeline', 'basic')
+        previous_scores.append(previous.get(MAIN_SCORE.get(pipeline, 'basic_score'), 0))
+        previous_likely.append(bool(previous.get('likely_has_ads')))
+
+    total = len(domains)
+    if not total:
+        print(f"❌ El run '{run_id}' no existe o no tiene dominios")
+        sys.exit(1)
+
+    rules = batch.rules
+    scores = score_batch(batch)
+    pipelines = batch.arrays()['pipeline'].astype(int)
+    main = np.choose(pipelines, [scores[MAIN_SCORE[p]] for p in PIPELINES])
+    likely = scores['likely_has_ads']
+    previous_likely = np.asarray(previous_likely)
+    changed = likely != previous_likely
+    has_priority = pipelines != PIPELINES.index('basic')
+    priorities = np.bincount(scores['priority'][has_priority], minlength=len(rules.ultra_priority_names))
+    duration = time.perf_counter() - start
+
+    if output_file:
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([
+                "domain", "pipeline", "score", "likely_has_ads", "priority",
+                "previous_score", "previous_likely_has_ads", "changed"
+            ])
+            for i, domain in enumerate(domains):
+                writer.writerow([
+                    domain,
+                    PIPELINES[pipelines[i]],
+                    float(main[i]),
+                    bool(likely[i]),
+                    rules.ultra_priority_names[scores['priority'][i]] if has_priority[i] else '',
+                    previous_scores[i],
+                    bool(previous_likely[i]),
+                    bool(changed[i])
+                ])
+
+    print("=" * 70)
+    print(f"🔁 Re-puntuación del run {run_id} (reglas {rules.version})")
+    print("=" * 70)
+    print(f"Dominios: {total}")
+    print(f"Con ads (antes): {previous_likely.sum()} ({previous_likely.mean()*100:.1f}%)")
+    print(f"Con ads (ahora): {likely.sum()} ({likely.mean()*100:.1f}%)")
+    print(f"Decisiones que cambian: {changed.sum()}")
+    print(f"Score medio: {main.mean():.1f}")
+    if has_priority.any():
+        print("Prioridades: " + ", ".join(
+            f"{name}={priorities[i]}" for i, name in reversed(list(enumerate(rules.ultra_priority_names)))
+        ))
+    print(f"Tiempo: {duration:.2f} segundos")
+    if output_file:
+        print(f"✅ Resultados en: {output_file}")
+    print("=" * 70)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Re-puntúa un run del feature store con las reglas de scoring vigentes (sin red)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+
+  # Ver los runs guardados
+  python rescore.py --list
+
+  # Re-puntuar un run y ver cuántas decisiones cambian
+  python rescore.py csv-20261019-101500-a1b2c3
+
+  # Guardar los nuevos scores por dominio
+  python rescore.py csv-20261019-101500-a1b2c3 -o rescored.csv
+
+  # Probar unas reglas candidatas antes de publicarlas
+  python rescore.py csv-20261019-101500-a1b2c3 --rules nuevas_reglas.json
+        """
+    )
+    parser.add_argument('run_id', nargs='?', help='Run a re-puntuar')
+    parser.add_argument('-o', '--output', help='CSV de salida con los scores nuevos y anteriores')
+    parser.add_argument('--list', action='store_true', help='Lista los runs guardados')
+    parser.add_argument('--rules', help='Fichero de reglas de scoring a probar (default: las vigentes)')
+    parser.add_argument('--store', default=settings.FEATURE_STORE_PATH,
+                        help=f'Ruta del feature store (default: {settings.FEATURE_STORE_PATH})')
+
+    args = parser.parse_args()
+
+    if not Path(args.store).exists():
+        print(f"❌ Error: Feature store '{args.store}' no encontrado")
+        sys.exit(1)
+    store = FeatureStore(args.store)
+
+    if args.list or not args.run_id:
+        list_runs(store)
+        return
+
+    rules = ScoringRules.load(args.rules) if args.rules else None
+    rescore_run(store, args.run_id, args.output, rules)
+
+
+if __name__ == "__main__":
+    main()
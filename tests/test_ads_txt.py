@@ -0,0 +1,90 @@
+from app.services.ads_txt import AdsTxtParser
+
+ADS_TXT = (
+    b"# ads.txt de ejemplo\n"
+    b"google.com, pub-1234567890, DIRECT, f08c47fec0942fa0\n"
+    b"AppNexus.com, 7890, RESELLER # comentario al final\n"
+    b"contact=ads@example.com\n"
+    b"OWNERDOMAIN = example.com\n"
+    b"google.com, pub-999, reseller\n"
+)
+
+
+def parse(*chunks, close=True):
+    parser = AdsTxtParser()
+    for chunk in chunks:
+        assert parser.feed(chunk) is False
+    if close:
+        parser.close()
+    return parser
+
+
+def summary(parser):
+    return {
+        system: [(r.publisher_id, r.relationship, r.cert_id) for r in records]
+        for system, records in parser.records.items()
+    }
+
+
+EXPECTED = {
+    'google.com': [('pub-1234567890', 'DIRECT', 'f08c47fec0942fa0'), ('pub-999', 'RESELLER', None)],
+    'appnexus.com': [('7890', 'RESELLER', None)]
+}
+
+
+def test_whole_file():
+    parser = parse(ADS_TXT)
+    assert summary(parser) == EXPECTED
+    assert parser.variables == {'CONTACT': ['ads@example.com'], 'OWNERDOMAIN': ['example.com']}
+    assert parser.line_count == 6
+    assert parser.invalid_lines == 0
+
+
+def test_split_at_every_offset():
+    for offset in range(1, len(ADS_TXT)):
+        parser = parse(ADS_TXT[:offset], ADS_TXT[offset:])
+        assert summary(parser) == EXPECTED, offset
+        assert parser.line_count == 6, offset
+
+
+def test_split_inside_multibyte_character():
+    data = "contact=añadir@example.com\n".encode('utf-8')
+    offset = data.index('ñ'.encode('utf-8')) + 1
+    parser = parse(data[:offset], data[offset:])
+    assert parser.variables == {'CONTACT': ['añadir@example.com']}
+
+
+def test_invalid_lines():
+    parser = parse(
+        b"google.com, pub-1\n"            # Faltan campos
+        b"google.com, pub-1, OWNER\n"     # Relación desconocida
+        b", pub-1, DIRECT\n"              # Sin sistema de ads
+        b"foo=bar\n"                      # Variable que no es de la especificación
+        b"\n# solo comentario\n"
+    )
+    assert parser.records == {}
+    assert parser.variables == {}
+    assert parser.invalid_lines == 4
+    assert parser.line_count == 6
+
+
+def test_last_line_without_newline_needs_close():
+    parser = parse(b"google.com, pub-1, DIRECT\ngoogle.com, pub-2, DIRECT", close=False)
+    assert [r.publisher_id for r in parser.records['google.com']] == ['pub-1']
+    parser.close()
+    assert [r.publisher_id for r in parser.records['google.com']] == ['pub-1', 'pub-2']
+
+
+def test_truncated_tail_is_dropped():
+    # Descarga cortada: sin close() la línea a medias no se parsea
+    parser = parse(b"google.com, pub-1, DIRECT\ngoogle.com, pub-2, DIR", close=False)
+    assert summary(parser) == {'google.com': [('pub-1', 'DIRECT', None)]}
+    assert parser.invalid_lines == 0
+
+
+def test_accepts_only_non_html_200():
+    parser = AdsTxtParser()
+    assert parser.accepts(200, {'content-type': 'text/plain'})
+    assert parser.accepts(200, {})
+    assert not parser.accepts(200, {'content-type': 'text/HTML; charset=utf-8'})
+    assert not parser.accepts(404, {'content-type': 'text/plain'})
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from app.services import batch_scoring, scoring
+from app.services.scoring_rules import get_scoring_rules
+
+SAMPLES = 2000
+
+
+def random_library(rng):
+    if rng.random() < 0.2:
+        return None
+    return {
+        'has_ads': rng.random() < 0.5,
+        'advertiser_found': rng.random() < 0.5,
+        'confidence': rng.choice([None, 0, rng.randint(1, 100)])
+    }
+
+
+def random_features(rng, rules):
+    features = {'pipeline': rng.choice(batch_scoring.PIPELINES)}
+    if rng.random() < 0.9:
+        tracking = {name: rng.randint(0, 2) for name in rules.tracking_family_points}
+        tracking.update({name: rng.randint(0, 6) for name in rules.tracking_count_points})
+        features['tracking'] = tracking
+    features['facebook_library'] = random_library(rng)
+    features['google_transparency'] = random_library(rng)
+    if rng.random() < 0.8:
+        features['advanced'] = {
+            'analysis_scores': {f'analysis_{i}': rng.uniform(0, 100) for i in range(rng.randint(0, 7))}
+        }
+    if rng.random() < 0.5:
+        features['facebook_transparency'] = {'ads_in_circulation': rng.random() < 0.5}
+    return features
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_score_batch_matches_score_features(seed):
+    rules = get_scoring_rules()
+    rng = random.Random(seed)
+    features_list = [random_features(rng, rules) for _ in range(SAMPLES)]
+
+    batch = batch_scoring.FeatureBatch(rules)
+    batch.extend(features_list)
+    vector = batch_scoring.score_batch(batch)
+
+    for i, features in enumerate(features_list):
+        expected = scoring.score_features(features, rules)
+        assert vector['tracking_score'][i] == pytest.approx(expected['tracking_score']), features
+        assert vector['basic_score'][i] == pytest.approx(expected['basic_score']), features
+        assert bool(vector['likely_has_ads'][i]) == expected['likely_has_ads'], features
+        if features['pipeline'] == 'basic':
+            continue
+        assert vector['ultra_score'][i] == pytest.approx(expected['ultra_score']), features
+        assert rules.ultra_priority_names[vector['priority'][i]] == expected['priority'], features
+        assert rules.confidence_names[vector['confidence'][i]] == expected['confidence_level'], features
+        if features['pipeline'] == 'unified':
+            assert vector['overall_score'][i] == pytest.approx(expected['overall_score']), features
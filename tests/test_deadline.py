@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.deadline import Deadline
+
+
+async def value(result, delay=0.0):
+    await asyncio.sleep(delay)
+    return result
+
+
+async def boom():
+    raise RuntimeError('boom')
+
+
+def test_without_budget_runs_everything():
+    async def main():
+        deadline = Deadline()
+        assert await deadline.run('a', value(1, 0.01)) == 1
+        assert deadline.remaining() is None and not deadline.expired()
+        assert deadline.timeout(7) == 7
+        return deadline.report()
+
+    report = asyncio.run(main())
+    assert report['deadline_ms'] is None
+    assert report['computed'] == ['a']
+    assert not report['partial']
+    assert set(report['stage_timings_ms']) == {'a'}
+
+
+def test_timeout_returns_default_and_reports_partial():
+    async def main():
+        deadline = Deadline(50)
+        fast = await deadline.run('fast', value('ok'))
+        slow = await deadline.run('slow', value('late', 1), default='default')
+        return fast, slow, deadline.report()
+
+    fast, slow, report = asyncio.run(main())
+    assert (fast, slow) == ('ok', 'default')
+    assert report['computed'] == ['fast']
+    assert report['timed_out'] == ['slow']
+    assert report['partial']
+    assert report['elapsed_ms'] < 1000
+
+
+def test_expired_budget_skips_and_closes_coroutine():
+    async def main():
+        deadline = Deadline(1)
+        await asyncio.sleep(0.01)
+        coro = value('never')
+        result = await deadline.run('late', coro, default={})
+        # La corrutina se cierra sin ejecutarse (sin aviso de "never awaited")
+        assert coro.cr_frame is None
+        return result, deadline.report()
+
+    result, report = asyncio.run(main())
+    assert result == {}
+    assert report['skipped'] == ['late']
+    assert report['computed'] == [] and report['timed_out'] == []
+    assert report['partial']
+    assert 'late' not in report['stage_timings_ms']
+
+
+def test_failed_stage_is_reported_and_reraised():
+    async def main():
+        deadline = Deadline(1000)
+        with pytest.raises(RuntimeError):
+            await deadline.run('broken', boom())
+        return deadline.report()
+
+    report = asyncio.run(main())
+    assert report['failed'] == ['broken']
+    assert report['computed'] == []
+    # Un fallo no es falta de tiempo
+    assert not report['partial']
+    assert 'broken' in report['stage_timings_ms']
+
+
+def test_gated_stages_are_not_partial():
+    deadline = Deadline(1000)
+    deadline.gate('tracking', 'advanced')
+    report = deadline.report()
+    assert report['gated'] == ['tracking', 'advanced']
+    assert not report['partial']
+
+
+def test_timeout_is_capped_by_remaining_budget():
+    deadline = Deadline(200)
+    assert deadline.timeout(0.05) == 0.05
+    assert deadline.timeout(10) <= 0.2
+    deadline.expires_at = time.monotonic() - 1
+    assert deadline.expired()
+    assert deadline.remaining() == 0.0
+    # Agotado el presupuesto, el timeout queda en el mínimo (nunca 0 ni negativo)
+    assert deadline.timeout(10) == 0.001
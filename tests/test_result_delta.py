@@ -0,0 +1,87 @@
+import pytest
+
+from app.services.result_delta import flatten_change, iter_delta, latest_per_domain
+
+
+def row(domain, likely_has_ads=True, priority='HIGH', score=50.0, run_id='r1'):
+    return {'domain': domain, 'likely_has_ads': likely_has_ads, 'priority': priority, 'score': score,
+            'run_id': run_id, 'pipeline': 'ultra', 'analyzed_at': 0.0}
+
+
+def changes(before, after, **kwargs):
+    return [(c['domain'], c['change'], c['changed_fields']) for c in iter_delta(before, after, **kwargs)]
+
+
+BEFORE = [row('a.com'), row('b.com'), row('d.com', likely_has_ads=False, priority='LOW'), row('f.com')]
+AFTER = [row('b.com'), row('c.com'), row('d.com', likely_has_ads=True, priority='LOW'), row('e.com')]
+
+
+def test_merge_join():
+    assert changes(BEFORE, AFTER) == [
+        ('a.com', 'removed', []),
+        ('c.com', 'added', []),
+        ('d.com', 'changed', ['likely_has_ads']),
+        ('e.com', 'added', []),
+        ('f.com', 'removed', [])
+    ]
+
+
+def test_without_removed():
+    assert changes(BEFORE, AFTER, include_removed=False) == [
+        ('c.com', 'added', []),
+        ('d.com', 'changed', ['likely_has_ads']),
+        ('e.com', 'added', [])
+    ]
+
+
+def test_empty_sides():
+    assert changes([], []) == []
+    assert changes([], AFTER[:1]) == [('b.com', 'added', [])]
+    assert changes(BEFORE[:1], []) == [('a.com', 'removed', [])]
+
+
+def test_consumes_iterators_lazily():
+    after = iter(AFTER)
+    delta = iter_delta(iter(BEFORE), after)
+    assert next(delta)['domain'] == 'a.com'
+    # Solo se ha leído la primera fila del lado nuevo
+    assert next(after)['domain'] == 'c.com'
+
+
+def test_score_tolerance():
+    before, after = [row('a.com', score=50.0)], [row('a.com', score=50.4)]
+    fields = ('likely_has_ads', 'score')
+    assert changes(before, after, fields=fields) == [('a.com', 'changed', ['score'])]
+    assert changes(before, after, fields=fields, score_tolerance=0.5) == []
+
+
+def test_bool_fields_ignore_tolerance():
+    before, after = [row('a.com', likely_has_ads=False)], [row('a.com', likely_has_ads=True)]
+    assert changes(before, after, fields=('likely_has_ads',), score_tolerance=5) == [
+        ('a.com', 'changed', ['likely_has_ads'])
+    ]
+
+
+def test_unknown_field():
+    with pytest.raises(ValueError):
+        list(iter_delta([], [], fields=('likely_has_ads', 'domain')))
+
+
+def test_before_and_after_values():
+    change = next(iter_delta([row('a.com', priority='LOW', run_id='r1')], [row('a.com', run_id='r2')]))
+    assert change['before'] == {'likely_has_ads': True, 'priority': 'LOW', 'run_id': 'r1',
+                                'pipeline': 'ultra', 'analyzed_at': 0.0}
+    assert change['after']['priority'] == 'HIGH' and change['after']['run_id'] == 'r2'
+
+    flat = flatten_change(change)
+    assert flat['changed_fields'] == 'priority'
+    assert (flat['before_priority'], flat['after_priority']) == ('LOW', 'HIGH')
+
+
+def test_latest_per_domain():
+    rows = [row('a.com', run_id='1'), row('a.com', run_id='2'), row('b.com', run_id='3'),
+            row('c.com', run_id='4'), row('c.com', run_id='5')]
+    assert [(r['domain'], r['run_id']) for r in latest_per_domain(rows)] == [
+        ('a.com', '2'), ('b.com', '3'), ('c.com', '5')
+    ]
+    assert list(latest_per_domain([])) == []
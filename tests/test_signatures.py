@@ -0,0 +1,41 @@
+from app.services.signatures import FEED_SLICE_BYTES
+from app.services.tracking_ids import create_id_scanner, extract_ids
+
+PAGE = (
+    b"<html><head><script>gtag('config', 'AW-123456789');"
+    b"fbq('init', '123456789012345');</script>"
+    b"<script src=\"https://www.googletagmanager.com/gtm.js?id=GTM-ABC123\"></script></head></html>"
+)
+
+EXPECTED = {'google_ads': ['AW-123456789'], 'gtm': ['GTM-ABC123'], 'meta_pixel': ['123456789012345']}
+
+
+def scan(*chunks):
+    scanner = create_id_scanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    scanner.close()
+    return extract_ids(scanner)
+
+
+def test_whole_document():
+    assert scan(PAGE) == EXPECTED
+
+
+def test_split_at_every_offset():
+    for offset in range(1, len(PAGE)):
+        assert scan(PAGE[:offset], PAGE[offset:]) == EXPECTED, offset
+
+
+def test_split_across_feed_slices():
+    for shift in range(1, 40):
+        padding = b" " * (FEED_SLICE_BYTES - shift)
+        assert scan(padding + PAGE) == EXPECTED, shift
+
+
+def test_id_at_end_of_document_needs_close():
+    scanner = create_id_scanner()
+    scanner.feed(b"gtag('config', 'AW-123456789")
+    assert extract_ids(scanner) == {}
+    scanner.close()
+    assert extract_ids(scanner) == {'google_ads': ['AW-123456789']}
@@ -0,0 +1,179 @@
+import asyncio
+import gzip
+from types import SimpleNamespace
+
+from app.services import sitemap_crawler
+from app.services.sitemap_crawler import SitemapCrawler, SitemapStreamParser, _CrawlState
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+def urlset(*urls):
+    entries = ''.join(f'<url><loc>{url}</loc><lastmod>2026-01-01</lastmod></url>' for url in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="{NS}">{entries}</urlset>'.encode()
+
+
+def sitemapindex(*urls):
+    entries = ''.join(f'<sitemap><loc>{url}</loc></sitemap>' for url in urls)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="{NS}">{entries}</sitemapindex>'.encode()
+
+
+URLSET = urlset(
+    'https://example.com/',
+    'https://example.com/promo/verano',
+    'https://example.com/lp/oferta?utm_source=x',
+    'https://example.com/blog/post'
+)
+
+
+def state(max_urls=1000, max_bytes=1_000_000, max_files=10):
+    return _CrawlState(max_files, max_urls, max_bytes)
+
+
+def parse(*chunks, **limits):
+    parser = SitemapStreamParser(state(**limits))
+    stopped = False
+    for chunk in chunks:
+        stopped = parser.feed(chunk)
+        if stopped:
+            break
+    return parser, stopped
+
+
+def test_urlset():
+    parser, stopped = parse(URLSET)
+    assert not stopped and not parser.error
+    assert parser.urls == 4
+    assert parser.child_sitemaps == []
+    assert parser.state.campaign_paths == {'/promo': 1, '/lp/': 1}
+    assert parser.state.utm_urls == 1
+    assert parser.state.bytes_parsed == len(URLSET)
+
+
+def test_urlset_split_at_every_offset():
+    for offset in range(1, len(URLSET), 7):
+        parser, _ = parse(URLSET[:offset], URLSET[offset:])
+        assert parser.urls == 4, offset
+
+
+def test_gzip_without_content_encoding():
+    body = gzip.compress(URLSET)
+    for offset in (1, 2, 10, len(body) // 2):
+        parser, stopped = parse(body[:offset], body[offset:])
+        assert not stopped and not parser.error, offset
+        assert parser.urls == 4, offset
+        # El tope de bytes cuenta lo descomprimido
+        assert parser.state.bytes_parsed == len(URLSET), offset
+
+
+def test_index_collects_child_sitemaps():
+    parser, _ = parse(sitemapindex('https://example.com/a.xml', 'https://example.com/b.xml.gz'))
+    assert parser.child_sitemaps == ['https://example.com/a.xml', 'https://example.com/b.xml.gz']
+    assert parser.urls == 0
+
+
+def test_url_cap():
+    parser, stopped = parse(URLSET, max_urls=2)
+    assert stopped
+    assert parser.stop_reason == 'url_cap'
+    assert parser.urls == 2
+    assert parser.state.truncated
+    assert parser.feed(b'<url>') is True
+
+
+def test_byte_cap():
+    parser, stopped = parse(URLSET, max_bytes=len(URLSET) // 2)
+    assert stopped
+    assert parser.stop_reason == 'byte_cap'
+    assert parser.state.bytes_parsed == len(URLSET) // 2
+    assert parser.state.truncated
+    assert 0 < parser.urls < 4
+
+
+def test_gzip_bomb_stops_at_byte_cap():
+    body = gzip.compress(urlset(*[f'https://example.com/p/{i}' for i in range(5000)]))
+    parser, stopped = parse(body, max_bytes=4096)
+    assert stopped
+    assert parser.stop_reason == 'byte_cap'
+    assert parser.state.bytes_parsed == 4096
+
+
+def test_parse_error():
+    parser, stopped = parse(b'<urlset><url><loc>x</url></urlset>')
+    assert stopped and parser.error
+    assert parser.stop_reason == 'parse_error'
+    assert parser.state.errors == 1
+
+
+class FakeFetcher:
+    """Sirve ficheros de sitemap desde memoria con el contrato de HttpFetcher.scan"""
+
+    def __init__(self, files, chunk_size=64):
+        self.files = files
+        self.chunk_size = chunk_size
+        self.requested = []
+
+    async def scan(self, url, parser, **kwargs):
+        self.requested.append(url)
+        body = self.files.get(url)
+        if body is None:
+            return SimpleNamespace(status_code=404, stop_reason='rejected')
+        for start in range(0, len(body), self.chunk_size):
+            if parser.feed(body[start:start + self.chunk_size]):
+                return SimpleNamespace(status_code=200, stop_reason=parser.stop_reason)
+        return SimpleNamespace(status_code=200, stop_reason='eof')
+
+
+def crawl(monkeypatch, files, **limits):
+    fetcher = FakeFetcher(files)
+    monkeypatch.setattr(sitemap_crawler, 'http_fetcher', fetcher)
+    result = asyncio.run(SitemapCrawler(**limits).crawl('example.com'))
+    return result, fetcher
+
+
+def test_crawl_nested_index(monkeypatch):
+    files = {
+        'https://example.com/sitemap.xml': sitemapindex('https://example.com/posts.xml', 'https://example.com/more.xml'),
+        'https://example.com/posts.xml': URLSET,
+        'https://example.com/more.xml': sitemapindex('https://example.com/deep.xml.gz'),
+        'https://example.com/deep.xml.gz': gzip.compress(urlset('https://example.com/sale/1', 'https://example.com/sale/2'))
+    }
+    result, fetcher = crawl(monkeypatch, files)
+    assert result['files_fetched'] == 4
+    assert result['urls_seen'] == 6
+    assert result['campaign_paths'] == {'/promo': 1, '/lp/': 1, '/sale': 2}
+    assert not result['truncated']
+    assert fetcher.requested[0] == 'https://example.com/sitemap.xml'
+
+
+def test_crawl_stops_below_max_index_depth(monkeypatch):
+    files = {
+        'https://example.com/sitemap.xml': sitemapindex('https://example.com/1.xml'),
+        'https://example.com/1.xml': sitemapindex('https://example.com/2.xml'),
+        'https://example.com/2.xml': sitemapindex('https://example.com/3.xml'),
+        'https://example.com/3.xml': URLSET
+    }
+    result, fetcher = crawl(monkeypatch, files)
+    assert 'https://example.com/3.xml' not in fetcher.requested
+    assert result['urls_seen'] == 0
+    assert result['truncated']
+
+
+def test_crawl_file_cap(monkeypatch):
+    children = [f'https://example.com/{i}.xml' for i in range(5)]
+    files = {'https://example.com/sitemap.xml': sitemapindex(*children)}
+    files.update({url: URLSET for url in children})
+    result, _ = crawl(monkeypatch, files, max_files=3)
+    assert result['files_fetched'] == 3
+    assert result['urls_seen'] == 8
+    assert result['truncated']
+
+
+def test_crawl_falls_back_to_other_candidates(monkeypatch):
+    result, fetcher = crawl(monkeypatch, {'https://www.example.com/sitemap.xml': URLSET})
+    assert result['found'] and result['urls_seen'] == 4
+    assert fetcher.requested == [
+        'https://example.com/sitemap.xml',
+        'https://example.com/sitemap_index.xml',
+        'https://www.example.com/sitemap.xml'
+    ]
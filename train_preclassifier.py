@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Script para entrenar y evaluar el pre-clasificador de la home
+Aprende (regresión logística, NumPy) qué dominios acaban en la prioridad más baja usando
+solo las features de la home guardadas en el feature store - no hace ninguna petición de red
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent))
+from app.services.feature_store import FeatureStore
+from app.services.batch_scoring import FeatureBatch, score_batch
+from app.services.preclassifier import FEATURE_NAMES, PreClassifier, homepage_vector, save_model
+from app.services.scoring_rules import ScoringRules
+from app.config import settings
+
+
+# Solo estos pipelines ejecutan las etapas caras que decide el pre-clasificador
+GATED_PIPELINES = ('ultra', 'unified')
+
+
+def load_dataset(store: FeatureStore, run_ids, rules: ScoringRules = None):
+    """
+    Features de la home, etiqueta (1 si la prioridad ultra no es la más baja
+    o el pipeline da anuncios detectados, con las reglas dadas) y tiempos de
+    cada dominio. Se descartan los dominios en los que el pre-clasificador
+    ya omitió etapas: su etiqueta no sale del pipeline completo.
+    """
+    batch = FeatureBatch(rules)
+    vectors = []
+    timings = []
+    for run_id in run_ids:
+        for domain, features, _ in store.iter_run(run_id):
+            if features.get('pipeline') not in GATED_PIPELINES:
+                continue
+            if (features.get('preclassifier') or {}).get('skipped'):
+                continue
+            batch.add(features)
+            vectors.append(homepage_vector(features.get('tracking'), features.get('tracking_ids')))
+            timings.append(features.get('signals') or {})
+
+    X = np.asarray(vectors, dtype=np.float64).reshape(len(vectors), len(FEATURE_NAMES))
+    if len(batch):
+        # El gate también omite Facebook Ad Library, que por sí sola marca anuncios en el endpoint
+        # unificado (smart_OR) aunque la prioridad ultra sea la más baja: también es un positivo
+        scores = score_batch(batch)
+        y = ((scores['priority'] > 0) | scores['likely_has_ads']).astype(np.float64)
+    else:
+        y = np.zeros(0)
+    return X, y, timings, batch.rules
+
+
+def sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 0.01, iterations: int = 2000, learning_rate: float = 0.5):
+    """Regresión logística con L2 por descenso de gradiente; devuelve pesos y bias sobre X sin estandarizar"""
+    mean = X.mean(axis=0)
+    std = X.std(axis=0)
+    std[std == 0] = 1.0
+    Z = (X - mean) / std
+
+    weights = np.zeros(Z.shape[1])
+    bias = 0.0
+    for _ in range(iterations):
+        p = sigmoid(Z @ weights + bias)
+        error = p - y
+        weights -= learning_rate * (Z.T @ error / len(y) + l2 * weights)
+        bias -= learning_rate * error.mean()
+
+    # Plegar la estandarización en los pesos: predecir es un solo producto escalar
+    folded = weights / std
+    return folded, bias - float(folded @ mean)
+
+
+def choose_threshold(probabilities: np.ndarray, y: np.ndarray, min_recall: float) -> float:
+    """Umbral más alto que mantiene al menos `min_recall` de los positivos por encima"""
+    positives = np.sort(probabilities[y > 0])
+    if not len(positives):
+        return 0.0
+    allowed_misses = int(np.floor((1 - min_recall) * len(positives)))
+    return float(positives[allowed_misses])
+
+
+def evaluate(probabilities: np.ndarray, y: np.ndarray, threshold: float) -> dict:
+    skip = probabilities < threshold
+    positives = y > 0
+    return {
+        'domains': int(len(y)),
+        'skip_rate': float(skip.mean()) if len(y) else 0.0,
+        'skip_precision': float((~positives[skip]).mean()) if skip.any() else 1.0,
+        'recall': float((~skip[positives]).mean()) if positives.any() else 1.0,
+        'positives_lost': int((skip & positives).sum())
+    }
+
+
+def train(store: FeatureStore, run_ids, output: str, min_recall: float, rules: ScoringRules = None,
+          validation: float = 0.2, holdout: float = 0.2, seed: int = 42):
+    """
+    Pesos con el conjunto de entrenamiento, umbral con el de validación y
+    métricas finales con el holdout, que no se usa para nada más.
+    """
+    start = time.perf_counter()
+    X, y, _, rules = load_dataset(store, run_ids, rules)
+    if len(y) < 50 or y.min() == y.max():
+        print(f"❌ Datos insuficientes para entrenar: {len(y)} dominios, {int(y.sum())} positivos")
+        sys.exit(1)
+
+    order = np.random.default_rng(seed).permutation(len(y))
+    train_cut = int(len(y) * (1 - validation - holdout))
+    validation_cut = int(len(y) * (1 - holdout))
+    train_idx, validation_idx, test_idx = order[:train_cut], order[train_cut:validation_cut], order[validation_cut:]
+
+    weights, bias = fit_logistic(X[train_idx], y[train_idx])
+    model_probabilities = sigmoid(X @ weights + bias)
+    threshold = choose_threshold(model_probabilities[validation_idx], y[validation_idx], min_recall)
+    metrics = {
+        'train': evaluate(model_probabilities[train_idx], y[train_idx], threshold),
+        'validation': evaluate(model_probabilities[validation_idx], y[validation_idx], threshold),
+        'holdout': evaluate(model_probabilities[test_idx], y[test_idx], threshold),
+        'min_recall': min_recall,
+        'runs': list(run_ids)
+    }
+    data = save_model(output, weights, bias, threshold, rules.version, metrics)
+
+    holdout_metrics = metrics['holdout']
+    print("=" * 70)
+    print(f"🧠 Pre-clasificador {data['version']} (reglas {rules.version})")
+    print("=" * 70)
+    print(f"Dominios: {len(y)} ({int(y.sum())} con prioridad sobre {rules.ultra_lowest_priority} o anuncios)")
+    print(f"Umbral: {threshold:.4f} (recall mínimo {min_recall:.0%} en validación)")
+    print(f"Holdout: descarta {holdout_metrics['skip_rate']*100:.1f}%, "
+          f"precisión {holdout_metrics['skip_precision']*100:.1f}%, "
+          f"recall {holdout_metrics['recall']*100:.1f}%, "
+          f"positivos perdidos {holdout_metrics['positives_lost']}")
+    print(f"Tiempo: {time.perf_counter() - start:.2f} segundos")
+    print(f"✅ Modelo en: {output}")
+    print("=" * 70)
+
+
+def report(store: FeatureStore, run_ids, model_path: str, rules: ScoringRules = None):
+    """
+    Evaluación en sombra: compara lo que habría decidido el modelo con el
+    pipeline completo (ya ejecutado) y estima el tiempo ahorrado.
+    """
+    model = PreClassifier.load(model_path)
+    X, y, signals, rules = load_dataset(store, run_ids, rules)
+    if not len(y):
+        print("❌ No hay dominios ultra/unified en esos runs")
+        sys.exit(1)
+
+    probabilities = sigmoid(X @ np.asarray(model.weights) + model.bias)
+    metrics = evaluate(probabilities, y, model.threshold)
+    skip = probabilities < model.threshold
+
+    # Con el gate, un dominio descartado solo espera a la home + Google Transparency
+    # (la transparencia de Facebook del endpoint unificado sigue en paralelo)
+    saved_ms = []
+    added_ms = []
+    for i, report_signals in enumerate(signals):
+        timings = report_signals.get('stage_timings_ms') or {}
+        elapsed = report_signals.get('elapsed_ms')
+        if elapsed is None:
+            continue
+        tracking = timings.get('website_tracking', 0)
+        if skip[i]:
+            gated = max(timings.get('facebook_transparency', 0), tracking + timings.get('google_transparency', 0))
+            saved_ms.append(max(0.0, elapsed - gated))
+        else:
+            # Las etapas caras arrancan cuando termina la home (cota superior)
+            added_ms.append(tracking)
+
+    total_ms = sum(s.get('elapsed_ms') or 0 for s in signals)
+    print("=" * 70)
+    print(f"🌗 Evaluación en sombra del pre-clasificador {model.version} (reglas {rules.version})")
+    print("=" * 70)
+    print(f"Dominios: {metrics['domains']} ({int(y.sum())} con prioridad sobre {rules.ultra_lowest_priority} o anuncios)")
+    print(f"Descartados: {int(skip.sum())} ({metrics['skip_rate']*100:.1f}%)")
+    print(f"Precisión de los descartes: {metrics['skip_precision']*100:.1f}%")
+    print(f"Recall: {metrics['recall']*100:.1f}% (positivos perdidos: {metrics['positives_lost']})")
+    if saved_ms:
+        print(f"Tiempo ahorrado: {sum(saved_ms)/1000:.1f} s "
+              f"({sum(saved_ms)/total_ms*100 if total_ms else 0:.1f}% del total, {np.mean(saved_ms):.0f} ms por descarte)")
+    if added_ms:
+        print(f"Latencia añadida a los no descartados: hasta {np.mean(added_ms):.0f} ms de media")
+    if model.rules_version != rules.version:
+        print(f"⚠️  El modelo se entrenó con las reglas {model.rules_version}")
+    print("=" * 70)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Entrena y evalúa el pre-clasificador de la home con el feature store (sin red)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+
+  # Entrenar con todos los runs guardados
+  python train_preclassifier.py train
+
+  # Entrenar con runs concretos y un recall mínimo del 99%
+  python train_preclassifier.py train --runs api-20261018 api-20261019 --min-recall 0.99
+
+  # Evaluación en sombra sobre el run de hoy (PRECLASSIFIER_MODE=shadow)
+  python train_preclassifier.py report --runs api-20261019
+        """
+    )
+    parser.add_argument('command', choices=['train', 'report'], help='Entrenar un modelo o evaluarlo en sombra')
+    parser.add_argument('--runs', nargs='+', help='Runs a usar (default: todos)')
+    parser.add_argument('--model', default=settings.PRECLASSIFIER_MODEL_PATH,
+                        help=f'Fichero del modelo (default: {settings.PRECLASSIFIER_MODEL_PATH})')
+    parser.add_argument('--min-recall', type=float, default=settings.PRECLASSIFIER_MIN_RECALL,
+                        help=f'Recall mínimo de los dominios con prioridad (default: {settings.PRECLASSIFIER_MIN_RECALL})')
+    parser.add_argument('--rules', help='Fichero de reglas de scoring para las etiquetas (default: las vigentes)')
+    parser.add_argument('--store', default=settings.FEATURE_STORE_PATH,
+                        help=f'Ruta del feature store (default: {settings.FEATURE_STORE_PATH})')
+
+    args = parser.parse_args()
+
+    if not Path(args.store).exists():
+        print(f"❌ Error: Feature store '{args.store}' no encontrado")
+        sys.exit(1)
+    store = FeatureStore(args.store)
+    run_ids = args.runs or [run['run_id'] for run in store.runs()]
+    rules = ScoringRules.load(args.rules) if args.rules else None
+
+    if args.command == 'train':
+        train(store, run_ids, args.model, args.min_recall, rules)
+    else:
+        if not Path(args.model).exists():
+            print(f"❌ Error: Modelo '{args.model}' no encontrado (entrena primero)")
+            sys.exit(1)
+        report(store, run_ids, args.model, rules)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Script para gestionar la watchlist de anunciantes y ejecutar su worker
+Los dominios vigilados se re-escanean cada cierto intervalo (con jitter) y se registra un
+evento cada vez que cambia su detección de anuncios o su prioridad
+"""
+
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from app.services.watchlist import WATCHED_FIELDS, WatchlistScheduler, get_watchlist
+from app.config import settings
+from rescan import read_domains
+
+
+def print_event(event):
+    detected = datetime.fromtimestamp(event['detected_at']).strftime('%Y-%m-%d %H:%M')
+    print(f"🔔 {detected} {event['domain']}: {event['field']} {event['before']} → {event['after']}")
+
+
+def cmd_add(args):
+    domains = list(args.domains)
+    if args.csv:
+        domains += read_domains(args.csv)
+    if not domains:
+        print("❌ Error: indique dominios o un CSV (--csv)")
+        sys.exit(1)
+    added = get_watchlist().add(domains, args.interval_hours * 3600)
+    print(f"✅ {added} dominios vigilados cada {args.interval_hours:g} h (± {settings.WATCHLIST_JITTER:.0%})")
+
+
+def cmd_remove(args):
+    watchlist = get_watchlist()
+    for domain in args.domains:
+        print(f"{'🗑️ ' if watchlist.remove(domain) else '⚠️  no vigilado:'} {domain}")
+
+
+def cmd_list(args):
+    watchlist = get_watchlist()
+    print(f"👀 {watchlist.count()} dominios vigilados")
+    print("=" * 70)
+    for entry in watchlist.entries(args.limit):
+        next_scan = datetime.fromtimestamp(entry['next_scan_at']).strftime('%Y-%m-%d %H:%M')
+        state = "sin escanear" if entry['last_scan_at'] is None else (
+            f"ads={entry['has_ads_detected']} prioridad={entry['priority']}"
+        )
+        failures = f" ❌ {entry['failures']} fallos" if entry['failures'] else ""
+        print(f"{entry['domain']:<40} próximo: {next_scan}  {state}{failures}")
+
+
+def cmd_events(args):
+    since = datetime.now().timestamp() - args.days * 86400 if args.days else None
+    events = get_watchlist().events(since, args.domain, args.field, args.limit)
+    if not events:
+        print("Sin eventos de cambio")
+    for event in events:
+        print_event(event)
+
+
+async def cmd_run(args):
+    scheduler = WatchlistScheduler(concurrency=args.concurrent, deadline_ms=args.deadline_ms)
+    scheduler.listeners.append(print_event)
+
+    print("=" * 70)
+    print("👀 Worker de la watchlist - Ads Checker")
+    print("=" * 70)
+    print(f"📋 Dominios vigilados: {scheduler.watchlist.count()}")
+    print(f"⚡ Concurrencia: {scheduler.concurrency} dominios simultáneos")
+    print("=" * 70)
+    print()
+
+    if args.once:
+        events = await scheduler.run_once()
+        stats = scheduler.stats()
+        print(f"✅ {stats['scans']} escaneos, {stats['failures']} fallos, {len(events)} eventos")
+        return
+
+    print("⏳ Esperando escaneos pendientes (Ctrl+C para detener)...")
+    try:
+        await scheduler.run_forever()
+    except asyncio.CancelledError:
+        pass
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Gestiona la watchlist de anunciantes y ejecuta su worker de re-escaneo',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+
+  # Vigilar los dominios de un CSV cada semana
+  python watchlist.py add --csv anunciantes.csv --interval-hours 168
+
+  # Vigilar un par de dominios cada día
+  python watchlist.py add nike.com adidas.com --interval-hours 24
+
+  # Ejecutar el worker (o arrancar la API con WATCHLIST_ENABLED=true)
+  python watchlist.py run
+
+  # Escanear solo lo pendiente ahora y salir (p. ej. desde cron)
+  python watchlist.py run --once
+
+  # Cambios de los últimos 7 días
+  python watchlist.py events --days 7
+        """
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add = subparsers.add_parser('add', help='Añadir dominios (o cambiar su intervalo)')
+    add.add_argument('domains', nargs='*', help='Dominios a vigilar')
+    add.add_argument('--csv', help='CSV con una columna de dominios')
+    add.add_argument('--interval-hours', type=float, default=settings.WATCHLIST_DEFAULT_INTERVAL_HOURS,
+                     help=f'Horas entre re-escaneos (default: {settings.WATCHLIST_DEFAULT_INTERVAL_HOURS:g})')
+
+    remove = subparsers.add_parser('remove', help='Dejar de vigilar dominios')
+    remove.add_argument('domains', nargs='+', help='Dominios')
+
+    listing = subparsers.add_parser('list', help='Dominios vigilados y su próximo escaneo')
+    listing.add_argument('--limit', type=int, default=100, help='Dominios a mostrar (default: 100)')
+
+    events = subparsers.add_parser('events', help='Eventos de cambio')
+    events.add_argument('--days', type=float, default=None, help='Solo los últimos N días')
+    events.add_argument('--domain', default=None, help='Solo un dominio')
+    events.add_argument('--field', choices=WATCHED_FIELDS, default=None, help='Solo un campo')
+    events.add_argument('--limit', type=int, default=100, help='Eventos a mostrar (default: 100)')
+
+    run = subparsers.add_parser('run', help='Ejecutar el worker de re-escaneo')
+    run.add_argument('--once', action='store_true', help='Escanear solo lo pendiente y salir')
+    run.add_argument('-c', '--concurrent', type=int, default=settings.WATCHLIST_CONCURRENCY,
+                     help=f'Dominios en paralelo (default: {settings.WATCHLIST_CONCURRENCY})')
+    run.add_argument('--deadline-ms', type=int, default=settings.WATCHLIST_DEADLINE_MS,
+                     help='Presupuesto de tiempo por dominio en ms (default: sin límite)')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        try:
+            asyncio.run(cmd_run(args))
+        except KeyboardInterrupt:
+            print("\n🛑 Worker detenido")
+    else:
+        {'add': cmd_add, 'remove': cmd_remove, 'list': cmd_list, 'events': cmd_events}[args.command](args)
+
+
+if __name__ == "__main__":
+    main()